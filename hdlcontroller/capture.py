@@ -0,0 +1,274 @@
+"""
+Wire capture and replay.
+
+A capture file starts with a header made of the ``HDLCCAP`` magic string, a
+format version byte and the wall-clock time at which the capture started.
+It is followed by records made of a fixed-size header (timestamp, record
+kind, frame type, sequence number and data length) and the data itself.
+Timestamps come from the clock of the capture writer and are only meaningful
+relative to each other.
+"""
+
+from collections import deque
+from struct import Struct
+from threading import Event, Thread
+from time import time as wall_time
+from typing import BinaryIO, Callable, Deque, Iterator, List, NamedTuple, Tuple, Union
+
+from hdlcontroller.clock import Clock
+
+MAGIC = b"HDLCCAP"
+VERSION = 1
+
+HEADER = Struct("<7sBd")
+RECORD_HEADER = Struct("<dBBBI")
+
+# Raw bytes returned by the read function.
+RECORD_READ = 0
+# Raw bytes given to the write function.
+RECORD_WRITE = 1
+# HDLC frame decoded by the receiver.
+RECORD_FRAME = 2
+
+Record = Tuple[float, int, int, int, bytes]
+
+
+class CaptureRecord(NamedTuple):
+    """
+    One record of a capture file.
+    """
+
+    timestamp: float
+    kind: int
+    frame_type: int
+    seq_no: int
+    data: bytes
+
+
+class CaptureWriter:
+    """
+    Records the traffic of an HDLC controller into a capture file.
+
+    Recording only appends a tuple to an in-memory queue. Records are encoded
+    and written to the file by a background thread, so capturing does not
+    slow down the read and write paths of the controller.
+
+    :param file: Path of the capture file, or binary file object to write to.
+    :param clock: Clock used to timestamp the records. It should be the one
+        of the controller.
+    :param flush_interval: Maximum time in seconds records stay in memory
+        before being written.
+    """
+
+    def __init__(
+        self,
+        file: Union[str, BinaryIO],
+        clock: Union[Clock, None] = None,
+        flush_interval: float = 0.1,
+    ):
+        if isinstance(file, str):
+            self.file: BinaryIO = open(file, "wb")
+            self.close_file: bool = True
+        else:
+            self.file = file
+            self.close_file = False
+
+        self.clock: Clock = clock if clock is not None else Clock()
+        self.flush_interval: float = flush_interval
+
+        # Appending to and popping from a deque are atomic operations, so
+        # the hot path does not need any lock.
+        self.records: Deque[Record] = deque()
+
+        self.file.write(HEADER.pack(MAGIC, VERSION, wall_time()))
+
+        self.stop_writer: Event = Event()
+        self.writer: Thread = Thread(target=self.__run, daemon=True)
+        self.writer.start()
+
+    def record(
+        self,
+        kind: int,
+        data: bytes,
+        frame_type: int = 0,
+        seq_no: int = 0,
+    ) -> None:
+        """
+        Queues a new record.
+        """
+
+        self.records.append((self.clock.time(), kind, frame_type, seq_no, data))
+
+    def tap_read(self, read_func: Callable[[], bytes]) -> Callable[[], bytes]:
+        """
+        Returns a read function recording what ``read_func`` returns.
+        """
+
+        record = self.record
+
+        def read() -> bytes:
+            data = read_func()
+
+            if data:
+                record(RECORD_READ, data)
+
+            return data
+
+        return read
+
+    def tap_write(
+        self, write_func: Callable[[bytes], Union[int, None]]
+    ) -> Callable[[bytes], Union[int, None]]:
+        """
+        Returns a write function recording what is given to ``write_func``.
+        """
+
+        record = self.record
+
+        def write(data: bytes) -> Union[int, None]:
+            record(RECORD_WRITE, data)
+
+            return write_func(data)
+
+        return write
+
+    def close(self) -> None:
+        """
+        Writes the pending records and closes the capture.
+        """
+
+        self.stop_writer.set()
+        self.writer.join()
+        self.__flush()
+
+        if self.close_file:
+            self.file.close()
+        else:
+            self.file.flush()
+
+    def __run(self) -> None:
+        while not self.stop_writer.wait(self.flush_interval):
+            self.__flush()
+
+    def __flush(self) -> None:
+        """
+        Encodes and writes all the queued records.
+        """
+
+        records = self.records
+        pack = RECORD_HEADER.pack
+        chunks: List[bytes] = []
+
+        while records:
+            timestamp, kind, frame_type, seq_no, data = records.popleft()
+            chunks.append(pack(timestamp, kind, frame_type, seq_no, len(data)))
+            chunks.append(bytes(data))
+
+        if chunks:
+            self.file.write(b"".join(chunks))
+
+
+def read_capture(file: Union[str, BinaryIO]) -> Iterator[CaptureRecord]:
+    """
+    Iterates over the records of a capture file.
+    """
+
+    if isinstance(file, str):
+        with open(file, "rb") as capture:
+            yield from read_capture(capture)
+
+        return
+
+    header = file.read(HEADER.size)
+
+    if len(header) < HEADER.size:
+        raise ValueError("Truncated capture header")
+
+    magic, version, _ = HEADER.unpack(header)
+
+    if magic != MAGIC:
+        raise ValueError("Not a capture file")
+
+    if version != VERSION:
+        raise ValueError("Unsupported capture version: {0}".format(version))
+
+    while True:
+        record_header = file.read(RECORD_HEADER.size)
+
+        if len(record_header) < RECORD_HEADER.size:
+            # End of the capture, or record truncated by a crash.
+            return
+
+        timestamp, kind, frame_type, seq_no, length = RECORD_HEADER.unpack(
+            record_header
+        )
+        data = file.read(length)
+
+        if len(data) < length:
+            return
+
+        yield CaptureRecord(timestamp, kind, frame_type, seq_no, data)
+
+
+class CaptureReplayer:
+    """
+    Read function feeding the raw chunks read during a capture back to an
+    HDLC controller.
+
+    At original speed, each chunk becomes available at the same time offset
+    as during the capture. At maximum speed, each call returns the next chunk.
+    :py:attr:`finished` is set once all the chunks have been returned.
+
+    :param file: Path of the capture file, or binary file object to read from.
+    :param max_speed: Whether to ignore the original timing.
+    :param clock: Clock used to pace the chunks at original speed.
+    """
+
+    def __init__(
+        self,
+        file: Union[str, BinaryIO],
+        max_speed: bool = False,
+        clock: Union[Clock, None] = None,
+    ):
+        self.chunks: List[Tuple[float, bytes]] = [
+            (record.timestamp, record.data)
+            for record in read_capture(file)
+            if record.kind == RECORD_READ
+        ]
+        self.max_speed: bool = max_speed
+        self.clock: Clock = clock if clock is not None else Clock()
+
+        self.index: int = 0
+        self.start: Union[float, None] = None
+        self.finished: Event = Event()
+
+        if not self.chunks:
+            self.finished.set()
+
+    def read(self) -> bytes:
+        """
+        Returns the next chunk(s) of the capture, or an empty bytes object if
+        none is due yet.
+        """
+
+        if self.index >= len(self.chunks):
+            self.finished.set()
+            return b""
+
+        if self.max_speed:
+            self.index += 1
+            return self.chunks[self.index - 1][1]
+
+        now = self.clock.time()
+
+        if self.start is None:
+            self.start = now
+
+        # Time offset of the capture being replayed.
+        due = self.chunks[0][0] + now - self.start
+        first = self.index
+
+        while self.index < len(self.chunks) and self.chunks[self.index][0] <= due:
+            self.index += 1
+
+        return b"".join(chunk for _, chunk in self.chunks[first : self.index])
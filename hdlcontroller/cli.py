@@ -5,11 +5,19 @@ CLI module.
 from argparse import ArgumentParser
 from sys import exit as sys_exit
 from sys import stderr, stdout
+from threading import Event, Thread
 from time import sleep
 
 import serial
 
-from hdlcontroller.hdlcontroller import HDLController
+from hdlcontroller.capture import CaptureReplayer, CaptureWriter
+from hdlcontroller.fec import FEC
+from hdlcontroller.gateway import PROTOCOL_TCP, PROTOCOL_UDP, Gateway, parse_endpoint
+from hdlcontroller.hdlcontroller import HDLController, LinkDownError
+from hdlcontroller.load import LoadGenerator, parse_size_range
+from hdlcontroller.pacing import Pacer
+from hdlcontroller.profiling import Profiler
+from hdlcontroller.tuning import Tuner
 
 
 def get_arg_parser():
@@ -24,6 +32,33 @@ def get_arg_parser():
         """,
     )
 
+    arg_parser.add_argument(
+        "-c",
+        "--capture",
+        help="record the traffic into a capture file (default: none)",
+    )
+
+    arg_parser.add_argument(
+        "-A",
+        "--piggyback-acks",
+        action="store_true",
+        help="""
+        carry the acknowledgements in the DATA frames sent, which the other
+        end must support as well (default: false)
+        """,
+    )
+
+    arg_parser.add_argument(
+        "-a",
+        "--ack-delay",
+        type=float,
+        default="0.01",
+        help="""
+        maximum delay in seconds before sending a standalone ACK frame when
+        piggybacking acknowledgements (default: 0.01)
+        """,
+    )
+
     arg_parser.add_argument(
         "-b",
         "--baudrate",
@@ -39,6 +74,46 @@ def get_arg_parser():
         help="serial device to use (default: /dev/ttyACM0)",
     )
 
+    arg_parser.add_argument(
+        "-e",
+        "--fec",
+        type=int,
+        help="""
+        protect the frames with the given number of Reed-Solomon parity bytes
+        per block, the other end must enable it too (default: none)
+        """,
+    )
+
+    arg_parser.add_argument(
+        "-E",
+        "--adaptive-fec",
+        action="store_true",
+        help="""
+        adjust the number of parity bytes of -e from the errors found in the
+        frames received (default: false)
+        """,
+    )
+
+    arg_parser.add_argument(
+        "-f",
+        "--max-frame-size",
+        type=int,
+        help="""
+        size in bytes above which the frames received are dropped
+        (default: none)
+        """,
+    )
+
+    arg_parser.add_argument(
+        "-g",
+        "--negotiate",
+        action="store_true",
+        help="""
+        negotiate the window, the maximum frame size and the ACK piggybacking
+        with the other end, which must enable it too (default: false)
+        """,
+    )
+
     arg_parser.add_argument(
         "-i",
         "--interval",
@@ -49,6 +124,35 @@ def get_arg_parser():
         """,
     )
 
+    arg_parser.add_argument(
+        "-k",
+        "--pace",
+        action="store_true",
+        help="""
+        pace the writes to the baud rate of the serial port (default: false)
+        """,
+    )
+
+    arg_parser.add_argument(
+        "-K",
+        "--pace-rate",
+        type=float,
+        help="""
+        pace the writes to the given rate in bytes per second
+        (default: none)
+        """,
+    )
+
+    arg_parser.add_argument(
+        "-L",
+        "--keepalive",
+        type=float,
+        help="""
+        interval in seconds after which an idle link is polled, the link being
+        down after three intervals without any frame received (default: none)
+        """,
+    )
+
     arg_parser.add_argument(
         "-m",
         "--message",
@@ -56,6 +160,16 @@ def get_arg_parser():
         help="test message to send (default: test)",
     )
 
+    arg_parser.add_argument(
+        "-n",
+        "--max-retries",
+        type=int,
+        help="""
+        number of times a frame is sent again before the link is declared down
+        (default: unlimited)
+        """,
+    )
+
     arg_parser.add_argument(
         "-N",
         "--no-fcs-nack",
@@ -66,6 +180,25 @@ def get_arg_parser():
         """,
     )
 
+    arg_parser.add_argument(
+        "-p",
+        "--profile",
+        action="store_true",
+        help="""
+        measure the send and receive phases and display a summary when
+        exiting (default: false)
+        """,
+    )
+
+    arg_parser.add_argument(
+        "-P",
+        "--trace",
+        help="""
+        write the profiling measurements as a Chrome/Perfetto trace file
+        (default: none)
+        """,
+    )
+
     arg_parser.add_argument(
         "-q",
         "--quiet",
@@ -83,6 +216,16 @@ def get_arg_parser():
         help="queue size for data frames received (default: 0)",
     )
 
+    arg_parser.add_argument(
+        "-r",
+        "--reconnect",
+        action="store_true",
+        help="""
+        open the serial port again when it fails, keeping the frames not
+        acknowledged yet (default: false)
+        """,
+    )
+
     arg_parser.add_argument(
         "-t",
         "--serial-timeout",
@@ -99,6 +242,16 @@ def get_arg_parser():
         help="HDLC sending timeout value in seconds (default: 2.0)",
     )
 
+    arg_parser.add_argument(
+        "-u",
+        "--auto-tune",
+        action="store_true",
+        help="""
+        adjust the window and the HDLC sending timeout from the live link
+        statistics, starting from the values of -w and -T (default: false)
+        """,
+    )
+
     arg_parser.add_argument(
         "-w",
         "--window",
@@ -107,14 +260,403 @@ def get_arg_parser():
         help="sending window (default: 3)",
     )
 
+    arg_parser.add_argument(
+        "-W",
+        "--receive-window",
+        type=int,
+        help="""
+        receive window used to discard the retransmitted data frames already
+        received, at least the sending window of the other end (default: none)
+        """,
+    )
+
     arg_parser.set_defaults(
+        auto_tune=False,
+        adaptive_fec=False,
+        negotiate=False,
+        pace=False,
+        piggyback_acks=False,
         quiet=False,
+        reconnect=False,
         no_fcs_nack=False,
+        profile=False,
+    )
+
+    subparsers = arg_parser.add_subparsers(
+        dest="command",
+        title="commands",
+        description="""
+        without any command, sends the test message at regular intervals
+        """,
+    )
+
+    replay_parser = subparsers.add_parser(
+        "replay",
+        help="feed a capture file back through the HDLC controller",
+        description="""
+        Feeds the data read during a capture back through an HDLC controller
+        and displays the frames received. The serial device is not used.
+        """,
+    )
+
+    replay_parser.add_argument(
+        "capture_file",
+        help="capture file recorded with the --capture option",
+    )
+
+    replay_parser.add_argument(
+        "-M",
+        "--max-speed",
+        action="store_true",
+        help="""
+        replay as fast as possible instead of at the original speed
+        (default: false)
+        """,
+    )
+
+    load_parser = subparsers.add_parser(
+        "load",
+        help="drive a configurable load through the HDLC controller",
+        description="""
+        Sends frames at a configured offered load and displays the
+        throughput, the ACK latency, the retransmissions and the window
+        stalls at regular intervals.
+        """,
+    )
+
+    load_group = load_parser.add_mutually_exclusive_group(required=True)
+
+    load_group.add_argument(
+        "-r",
+        "--rate",
+        type=float,
+        help="offered load in frames per second",
+    )
+
+    load_group.add_argument(
+        "-R",
+        "--byte-rate",
+        type=float,
+        help="offered load in payload bytes per second",
+    )
+
+    load_group.add_argument(
+        "-M",
+        "--max",
+        action="store_true",
+        help="send as fast as the window allows to saturate the link",
+    )
+
+    load_parser.add_argument(
+        "-s",
+        "--size",
+        default="32",
+        help="""
+        payload size in bytes, or MIN-MAX for uniformly distributed sizes
+        (default: 32)
+        """,
+    )
+
+    load_parser.add_argument(
+        "-B",
+        "--burst",
+        type=int,
+        default="1",
+        help="number of frames sent back to back (default: 1)",
+    )
+
+    load_parser.add_argument(
+        "-j",
+        "--producers",
+        type=int,
+        default="1",
+        help="number of producer threads (default: 1)",
+    )
+
+    load_parser.add_argument(
+        "-D",
+        "--duration",
+        type=float,
+        help="load duration in seconds (default: until interrupted)",
+    )
+
+    load_parser.add_argument(
+        "-I",
+        "--report-interval",
+        type=float,
+        default="1.0",
+        help="interval between two reports in seconds (default: 1.0)",
+    )
+
+    load_parser.add_argument(
+        "-S",
+        "--seed",
+        type=int,
+        help="seed of the payload generator (default: random)",
+    )
+
+    gateway_parser = subparsers.add_parser(
+        "gateway",
+        help="forward frames between the HDLC link and a UDP or TCP endpoint",
+        description="""
+        Forwards the frames received on the HDLC link to a UDP or TCP
+        endpoint, and sends the messages received from the endpoint on the
+        HDLC link. With TCP, each message is prefixed with its length as a
+        big-endian 16-bit integer. Use a bounded queue size (-Q) for the
+        back-pressure of the endpoint to reach the HDLC link.
+        """,
+    )
+
+    gateway_parser.add_argument(
+        "endpoint",
+        help="endpoint to connect to, as HOST:PORT",
+    )
+
+    gateway_parser.add_argument(
+        "-p",
+        "--protocol",
+        choices=(PROTOCOL_UDP, PROTOCOL_TCP),
+        default=PROTOCOL_UDP,
+        help="protocol of the endpoint (default: udp)",
+    )
+
+    gateway_parser.add_argument(
+        "-B",
+        "--batch-size",
+        type=int,
+        default="64",
+        help="maximum number of frames forwarded at once (default: 64)",
     )
 
     return arg_parser
 
 
+def print_profile(profiler):
+    """
+    Displays the summary of the profiling measurements.
+    """
+
+    stdout.write(
+        "[*] {0:<16} {1:>8} {2:>10} {3:>10} {4:>10} {5:>10}\n".format(
+            "phase", "count", "mean (µs)", "p50 (µs)", "p99 (µs)", "max (µs)"
+        )
+    )
+
+    for phase, stats in sorted(profiler.get_stats().items()):
+        stdout.write(
+            "[*] {0:<16} {1:>8} {2:>10.1f} {3:>10.1f} {4:>10.1f} {5:>10.1f}\n".format(
+                phase,
+                stats.count,
+                stats.mean / 1000,
+                stats.p50 / 1000,
+                stats.p99 / 1000,
+                stats.maximum / 1000,
+            )
+        )
+
+
+def print_pacer_stats(pacer):
+    """
+    Displays how long the writes waited in the pacer.
+    """
+
+    stats = pacer.get_stats()
+
+    stdout.write(
+        "[*] Pacer: {0} of {1} writes delayed, {2:.3f}s in total, "
+        "p50/p99/max {3:.1f}/{4:.1f}/{5:.1f} ms\n".format(
+            stats.delayed_writes,
+            stats.writes,
+            stats.wait_time,
+            stats.wait_p50 * 1000,
+            stats.wait_p99 * 1000,
+            stats.wait_max * 1000,
+        )
+    )
+
+
+def print_fec_stats(fec):
+    """
+    Displays how many frames have been corrected by the FEC layer.
+    """
+
+    stats = fec.get_stats()
+
+    stdout.write(
+        "[*] FEC: {0} of {1} frames corrected, {2} bytes corrected, "
+        "{3} frames uncorrectable, parity {4}\n".format(
+            stats.frames_corrected,
+            stats.frames_decoded,
+            stats.bytes_corrected,
+            stats.frames_uncorrectable,
+            stats.parity,
+        )
+    )
+
+
+def print_tuner_state(tuner):
+    """
+    Displays the window and the sending timeout reached by the tuner.
+    """
+
+    state = tuner.get_state()
+
+    stdout.write(
+        "[*] Tuner: window {0}, sending timeout {1:.3f}s, "
+        "{2} losses, {3} window decreases\n".format(
+            state.window,
+            state.timeout,
+            state.losses,
+            state.window_decreases,
+        )
+    )
+
+
+def replay(args):
+    """
+    Feeds a capture file back through an HDLC controller.
+    """
+
+    try:
+        replayer = CaptureReplayer(args["capture_file"], max_speed=args["max_speed"])
+    except (OSError, ValueError) as err:
+        stderr.write("[x] Cannot read the capture: {0}\n".format(err))
+        sys_exit(1)
+
+    def discard(_):
+        pass
+
+    def receive_callback(data):
+        print("< {0}".format(data))
+
+    hdlc_c = HDLController(
+        replayer.read,
+        discard,
+        window=args["window"],
+        frames_queue_size=args["queue_size"],
+        fcs_nack=not (args["no_fcs_nack"]),
+        piggyback_acks=args["piggyback_acks"],
+        ack_delay=args["ack_delay"],
+        receive_window=args["receive_window"],
+    )
+    hdlc_c.set_receive_callback(receive_callback)
+
+    stdout.write("[*] Replaying {0}...\n".format(args["capture_file"]))
+
+    try:
+        hdlc_c.start()
+        replayer.finished.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        hdlc_c.stop()
+
+    stdout.write("[*] Bye!\n")
+
+
+def print_load_report(report):
+    """
+    Displays a load report.
+    """
+
+    stdout.write(
+        "[*] {0:7.1f}s: {1:.1f} frames/s, {2:.0f} B/s, "
+        "latency p50/p99/max {3:.1f}/{4:.1f}/{5:.1f} ms, "
+        "{6} retransmissions, {7} window stalls ({8:.2f}s)\n".format(
+            report.elapsed,
+            report.frames_per_second,
+            report.bytes_per_second,
+            report.latency_p50 * 1000,
+            report.latency_p99 * 1000,
+            report.latency_max * 1000,
+            report.retransmissions,
+            report.window_stalls,
+            report.window_stall_time,
+        )
+    )
+
+
+def load(hdlc_c, args):
+    """
+    Drives a configurable load through an HDLC controller.
+    """
+
+    try:
+        min_size, max_size = parse_size_range(args["size"])
+        generator = LoadGenerator(
+            hdlc_c,
+            rate=args["rate"],
+            byte_rate=args["byte_rate"],
+            min_size=min_size,
+            max_size=max_size,
+            burst=args["burst"],
+            producers=args["producers"],
+            seed=args["seed"],
+        )
+    except ValueError as err:
+        stderr.write("[x] {0}\n".format(err))
+        return
+
+    def drain():
+        # Received frames are discarded so that the queue does not grow.
+        while True:
+            hdlc_c.get_data()
+
+    hdlc_c.start()
+    Thread(target=drain, daemon=True).start()
+
+    generator.run(
+        duration=args["duration"],
+        interval=args["report_interval"],
+        callback=print_load_report,
+    )
+
+
+def gateway(hdlc_c, args):
+    """
+    Forwards frames between an HDLC controller and a UDP or TCP endpoint.
+    """
+
+    try:
+        host, port = parse_endpoint(args["endpoint"])
+        bridge = Gateway(
+            hdlc_c,
+            host,
+            port,
+            protocol=args["protocol"],
+            batch_size=args["batch_size"],
+        )
+    except ValueError as err:
+        stderr.write("[x] {0}\n".format(err))
+        return
+
+    hdlc_c.start()
+    bridge.start()
+
+    stdout.write(
+        "[*] Forwarding frames to {0}:{1} over {2}...\n".format(
+            host, port, args["protocol"].upper()
+        )
+    )
+
+    try:
+        while True:
+            sleep(1.0)
+    finally:
+        bridge.stop(timeout=1.0)
+        stats = bridge.get_stats()
+
+        stdout.write(
+            "[*] {0} frames forwarded to the endpoint in {1} writes, "
+            "{2} frames forwarded to the HDLC link, {3} dropped\n".format(
+                stats.frames_to_socket,
+                stats.socket_writes,
+                stats.frames_to_serial,
+                stats.frames_dropped,
+            )
+        )
+
+
 def main():
     """
     Entry point of the command-line tool.
@@ -122,6 +664,10 @@ def main():
 
     args = vars(get_arg_parser().parse_args())
 
+    if args["command"] == "replay":
+        replay(args)
+        return
+
     # Serial port configuration
     ser = serial.Serial()
     ser.port = args["device"]
@@ -145,6 +691,56 @@ def main():
     def receive_callback(data):
         print("< {0}".format(data))
 
+    def link_state_callback(up):
+        stdout.write("[*] Link {0}\n".format("up" if up else "down"))
+
+    port_failed = Event()
+
+    def port_error_callback(err):
+        stderr.write("[x] Serial port problem: {0}\n".format(err))
+        port_failed.set()
+
+    def reconnect_uart():
+        while True:
+            port_failed.wait()
+            port_failed.clear()
+            ser.close()
+
+            while True:
+                try:
+                    ser.open()
+                    break
+                except serial.SerialException:
+                    sleep(0.5)
+
+            hdlc_c.reconnect(read_uart, ser.write)
+            stdout.write("[*] Reconnected\n")
+
+    capture = None
+    profiler = None
+    pacer = None
+    tuner = Tuner() if args["auto_tune"] else None
+    fec = None
+
+    if args["fec"] is not None:
+        fec = FEC(parity=args["fec"], adaptive=args["adaptive_fec"])
+
+    if args["pace_rate"] is not None:
+        pacer = Pacer(byte_rate=args["pace_rate"])
+    elif args["pace"]:
+        pacer = Pacer(baudrate=args["baudrate"])
+
+    if args["profile"] or args["trace"] is not None:
+        profiler = Profiler(trace=args["trace"] is not None)
+
+    if args["capture"] is not None:
+        try:
+            capture = CaptureWriter(args["capture"])
+        except OSError as err:
+            stderr.write("[x] Cannot create the capture: {0}\n".format(err))
+            ser.close()
+            sys_exit(1)
+
     try:
         hdlc_c = HDLController(
             read_uart,
@@ -153,20 +749,68 @@ def main():
             sending_timeout=args["sending_timeout"],
             frames_queue_size=args["queue_size"],
             fcs_nack=not (args["no_fcs_nack"]),
+            capture=capture,
+            profiler=profiler,
+            piggyback_acks=args["piggyback_acks"],
+            ack_delay=args["ack_delay"],
+            receive_window=args["receive_window"],
+            pacer=pacer,
+            tuner=tuner,
+            keepalive=args["keepalive"],
+            max_retries=args["max_retries"],
+            max_frame_size=args["max_frame_size"],
+            negotiate=args["negotiate"],
+            fec=fec,
         )
-        hdlc_c.set_send_callback(send_callback)
-        hdlc_c.set_receive_callback(receive_callback)
-        hdlc_c.start()
 
-        while True:
-            if not args["quiet"]:
-                hdlc_c.send(args["message"])
+        hdlc_c.set_link_state_callback(link_state_callback)
+
+        if args["reconnect"]:
+            hdlc_c.set_port_error_callback(port_error_callback)
+            Thread(target=reconnect_uart, daemon=True).start()
 
-            sleep(args["interval"])
+        if args["command"] == "load":
+            load(hdlc_c, args)
+        elif args["command"] == "gateway":
+            gateway(hdlc_c, args)
+        else:
+            hdlc_c.set_send_callback(send_callback)
+            hdlc_c.set_receive_callback(receive_callback)
+            hdlc_c.start()
+
+            while True:
+                if not args["quiet"]:
+                    try:
+                        hdlc_c.send(args["message"])
+                    except LinkDownError:
+                        pass
+
+                sleep(args["interval"])
     except KeyboardInterrupt:
         stdout.write("[*] Bye!\n")
     finally:
         if "hdlc_c" in locals():
             hdlc_c.stop()  # type: ignore
 
+        if capture is not None:
+            capture.close()
+
         ser.close()
+
+        if pacer is not None:
+            print_pacer_stats(pacer)
+
+        if tuner is not None:
+            print_tuner_state(tuner)
+
+        if fec is not None:
+            print_fec_stats(fec)
+
+        if args["profile"]:
+            print_profile(profiler)
+
+        if args["trace"] is not None:
+            try:
+                profiler.write_trace(args["trace"])  # type: ignore
+            except OSError as err:
+                stderr.write("[x] Cannot write the trace: {0}\n".format(err))
@@ -0,0 +1,135 @@
+"""
+Clocks used by the HDLC controller for its timers and deadlines.
+"""
+
+from threading import Condition, Event, Lock, get_ident
+from time import monotonic, sleep
+from typing import Set, Union
+
+
+class Clock:
+    """
+    Real-time clock based on :py:func:`time.monotonic`, which is not affected
+    by system clock adjustments.
+
+    Every timer of the HDLC controller goes through a clock: events to wait
+    on are created with :py:meth:`event`, and waiting is done with
+    :py:meth:`wait` or :py:meth:`sleep`. Replacing the clock changes how time
+    flows for the whole controller.
+    """
+
+    def time(self) -> float:
+        """
+        Returns the current time in seconds.
+        """
+
+        return monotonic()
+
+    def event(self) -> Event:
+        """
+        Returns a new event that can be waited on with :py:meth:`wait`.
+        """
+
+        return Event()
+
+    def wait(self, event: Event, timeout: Union[float, None] = None) -> bool:
+        """
+        Blocks until the event is set or the timeout expires.
+
+        Returns the state of the event.
+        """
+
+        return event.wait(timeout)
+
+    def sleep(self, seconds: float) -> None:
+        """
+        Blocks for the given duration.
+        """
+
+        sleep(seconds)
+
+
+class VirtualClock(Clock):
+    """
+    Clock whose time only moves forward when :py:meth:`advance` is called.
+
+    Threads waiting on the clock are released as soon as the virtual time
+    reaches their deadline, so scenarios involving several seconds of timeouts
+    run in a few milliseconds. Events given to :py:meth:`wait` must have been
+    created by :py:meth:`event`.
+    """
+
+    class ClockEvent(Event):
+        """
+        Event waking up the threads waiting on a virtual clock when set.
+        """
+
+        def __init__(self, clock: "VirtualClock"):
+            super().__init__()
+            self.clock: VirtualClock = clock
+
+        def set(self) -> None:
+            super().set()
+
+            with self.clock.lock:
+                self.clock.ticks.notify_all()
+
+    def __init__(self, start: float = 0.0):
+        self.now: float = start
+        # Threads waiting on the clock which have seen the current time.
+        self.waiters: Set[int] = set()
+
+        self.lock: Lock = Lock()
+        # Notified when the time moves forward or when an event is set.
+        self.ticks: Condition = Condition(self.lock)
+        # Notified when a thread starts waiting on the clock.
+        self.idle: Condition = Condition(self.lock)
+
+    def time(self) -> float:
+        return self.now
+
+    def event(self) -> Event:
+        return self.ClockEvent(self)
+
+    def wait(self, event: Event, timeout: Union[float, None] = None) -> bool:
+        ident = get_ident()
+
+        with self.lock:
+            deadline = None if timeout is None else self.now + timeout
+
+            try:
+                while not event.is_set() and (deadline is None or self.now < deadline):
+                    self.waiters.add(ident)
+                    self.idle.notify_all()
+                    self.ticks.wait()
+            finally:
+                self.waiters.discard(ident)
+
+            return event.is_set()
+
+    def sleep(self, seconds: float) -> None:
+        self.wait(Event(), seconds)
+
+    def advance(self, seconds: float) -> None:
+        """
+        Moves the time forward and releases the threads whose deadline has
+        been reached.
+        """
+
+        with self.lock:
+            self.now += seconds
+            self.waiters.clear()
+            self.ticks.notify_all()
+
+    def wait_for_waiters(self, count: int, timeout: float = 1.0) -> bool:
+        """
+        Blocks, in real time, until at least ``count`` threads are waiting on
+        the clock and have seen its current time.
+
+        This is meant to let the threads of the controller settle before
+        moving the time forward again. Returns ``False`` if the timeout
+        expired.
+        """
+
+        with self.lock:
+            return self.idle.wait_for(lambda: len(self.waiters) >= count, timeout)
@@ -0,0 +1,486 @@
+"""
+Forward error correction.
+
+On noisy links, each frame corrupted by a few bit errors fails its FCS check
+and costs an NACK and a full retransmission. An :py:class:`FEC` layer sits
+between an HDLC controller and the link and protects each frame with
+Reed-Solomon parity bytes, so that the receiving end corrects the errors
+before the FCS is checked.
+
+The frames produced by the controller are unescaped, cut into blocks of at
+most 255 bytes including ``parity`` parity bytes, and framed again with
+their own flag sequences. Each block corrects up to ``parity / 2`` corrupted
+bytes. The parity used is written three times at the start of each frame,
+so that both ends do not need to use the same one. Errors hitting a flag
+sequence or an escape sequence break the framing itself and cannot be
+corrected.
+
+In adaptive mode, the parity of the frames sent follows the errors found in
+the frames received, assuming that both directions of the link are equally
+noisy: it is doubled as soon as a frame cannot be corrected, and brought
+down step by step to twice the largest number of errors found in a block,
+plus a margin.
+"""
+
+from threading import Lock
+from typing import Callable, Dict, List, NamedTuple, Tuple, Union
+
+from hdlcontroller.framing import FLAG_SEQUENCE, MIN_FRAME_SIZE, FrameScanner
+
+ReadFunction = Callable[[], bytes]
+WriteFunction = Callable[[bytes], Union[int, None]]
+
+BLOCK_SIZE = 255
+MAX_PARITY = 64
+# Copies of the parity at the start of each frame.
+HEADER_SIZE = 3
+# Errors which can still be corrected on top of the largest number found.
+PARITY_MARGIN = 2
+
+FLAG = bytes((FLAG_SEQUENCE,))
+
+# Exponentials and logarithms in GF(2^8), with 0x11D as primitive polynomial.
+GF_EXP: List[int] = [0] * 512
+GF_LOG: List[int] = [0] * 256
+
+
+def _init_tables() -> None:
+    x = 1
+
+    for i in range(255):
+        GF_EXP[i] = x
+        GF_LOG[x] = i
+        x <<= 1
+
+        if x & 0x100:
+            x ^= 0x11D
+
+    for i in range(255, 512):
+        GF_EXP[i] = GF_EXP[i - 255]
+
+
+_init_tables()
+
+
+class UncorrectableError(ValueError):
+    """
+    Raised when a block holds more errors than its parity can correct.
+    """
+
+
+def _gf_mul(x: int, y: int) -> int:
+    if x == 0 or y == 0:
+        return 0
+
+    return GF_EXP[GF_LOG[x] + GF_LOG[y]]
+
+
+def _gf_pow(x: int, power: int) -> int:
+    return GF_EXP[(GF_LOG[x] * power) % 255]
+
+
+def _gf_inverse(x: int) -> int:
+    return GF_EXP[255 - GF_LOG[x]]
+
+
+def _poly_scale(p: List[int], x: int) -> List[int]:
+    return [_gf_mul(coef, x) for coef in p]
+
+
+def _poly_add(p: List[int], q: List[int]) -> List[int]:
+    result = [0] * max(len(p), len(q))
+
+    for i, coef in enumerate(p):
+        result[i + len(result) - len(p)] = coef
+
+    for i, coef in enumerate(q):
+        result[i + len(result) - len(q)] ^= coef
+
+    return result
+
+
+def _poly_mul(p: List[int], q: List[int]) -> List[int]:
+    result = [0] * (len(p) + len(q) - 1)
+
+    for j, q_coef in enumerate(q):
+        for i, p_coef in enumerate(p):
+            result[i + j] ^= _gf_mul(p_coef, q_coef)
+
+    return result
+
+
+def _poly_eval(p: List[int], x: int) -> int:
+    y = p[0]
+
+    for coef in p[1:]:
+        y = _gf_mul(y, x) ^ coef
+
+    return y
+
+
+_generators: Dict[int, List[int]] = {}
+
+
+def _generator(parity: int) -> List[int]:
+    """
+    Returns the generator polynomial for a number of parity bytes.
+    """
+
+    if parity not in _generators:
+        generator = [1]
+
+        for i in range(parity):
+            generator = _poly_mul(generator, [1, GF_EXP[i]])
+
+        _generators[parity] = generator
+
+    return _generators[parity]
+
+
+def rs_encode(data: bytes, parity: int) -> bytes:
+    """
+    Returns a Reed-Solomon block made of ``data`` followed by ``parity``
+    parity bytes. The block must not exceed 255 bytes.
+    """
+
+    generator = _generator(parity)
+    remainder = list(data) + [0] * parity
+
+    for i in range(len(data)):
+        coef = remainder[i]
+
+        if coef:
+            log_coef = GF_LOG[coef]
+
+            for j in range(1, len(generator)):
+                if generator[j]:
+                    remainder[i + j] ^= GF_EXP[log_coef + GF_LOG[generator[j]]]
+
+    return bytes(data) + bytes(remainder[len(data) :])
+
+
+def rs_decode(block: bytes, parity: int) -> Tuple[bytes, int]:
+    """
+    Corrects a Reed-Solomon block, and returns its data along with the
+    number of bytes corrected. Raises :py:exc:`UncorrectableError` if there
+    are more errors than the parity can correct.
+    """
+
+    message = list(block)
+    syndromes = [0] + [_poly_eval(message, GF_EXP[i]) for i in range(parity)]
+
+    if not any(syndromes):
+        return bytes(block[:-parity]), 0
+
+    # Berlekamp-Massey algorithm.
+    locator = [1]
+    old_locator = [1]
+
+    for i in range(parity):
+        delta = syndromes[i + 1]
+
+        for j in range(1, len(locator)):
+            delta ^= _gf_mul(locator[-(j + 1)], syndromes[i + 1 - j])
+
+        old_locator = old_locator + [0]
+
+        if delta:
+            if len(old_locator) > len(locator):
+                new_locator = _poly_scale(old_locator, delta)
+                old_locator = _poly_scale(locator, _gf_inverse(delta))
+                locator = new_locator
+
+            locator = _poly_add(locator, _poly_scale(old_locator, delta))
+
+    while locator and locator[0] == 0:
+        del locator[0]
+
+    errors = len(locator) - 1
+
+    if errors * 2 > parity:
+        raise UncorrectableError("Too many errors to correct")
+
+    # Chien search.
+    reversed_locator = locator[::-1]
+    positions = [
+        len(message) - 1 - i
+        for i in range(len(message))
+        if _poly_eval(reversed_locator, _gf_pow(2, i)) == 0
+    ]
+
+    if len(positions) != errors:
+        raise UncorrectableError("Errors cannot be located")
+
+    # Forney algorithm.
+    coef_positions = [len(message) - 1 - position for position in positions]
+    errata_locator = [1]
+
+    for coef_position in coef_positions:
+        errata_locator = _poly_mul(
+            errata_locator, _poly_add([1], [_gf_pow(2, coef_position), 0])
+        )
+
+    product = _poly_mul(syndromes[::-1], errata_locator)
+    evaluator = product[len(product) - len(errata_locator) :][::-1]
+    roots = [_gf_pow(2, coef_position) for coef_position in coef_positions]
+
+    for i, root in enumerate(roots):
+        root_inverse = _gf_inverse(root)
+        derivative = 1
+
+        for j, other_root in enumerate(roots):
+            if j != i:
+                derivative = _gf_mul(derivative, 1 ^ _gf_mul(root_inverse, other_root))
+
+        if derivative == 0:
+            raise UncorrectableError("Errors cannot be evaluated")
+
+        y = _gf_mul(root, _poly_eval(evaluator[::-1], root_inverse))
+        message[positions[i]] ^= _gf_mul(y, _gf_inverse(derivative))
+
+    if any(_poly_eval(message, GF_EXP[i]) for i in range(parity)):
+        raise UncorrectableError("Errors not corrected")
+
+    return bytes(message[:-parity]), errors
+
+
+def protected_size(frame_size: int) -> int:
+    """
+    Returns the largest size of an HDLC frame of ``frame_size`` bytes once
+    protected with any parity, flag and escape sequences included.
+    """
+
+    content = max(frame_size, MIN_FRAME_SIZE) - 2
+    blocks = -(-content // (BLOCK_SIZE - MAX_PARITY))
+
+    # Every byte but the flags may have to be escaped.
+    return 2 * (HEADER_SIZE + content + blocks * MAX_PARITY) + 2
+
+
+def _escape(data: bytes) -> bytes:
+    return data.replace(b"\x7d", b"\x7d\x5d").replace(b"\x7e", b"\x7d\x5e")
+
+
+def _unescape(data: bytes) -> bytes:
+    return data.replace(b"\x7d\x5e", b"\x7e").replace(b"\x7d\x5d", b"\x7d")
+
+
+class FECStats(NamedTuple):
+    """
+    Counters of an FEC layer. ``parity`` is the number of parity bytes
+    currently added to each block sent.
+    """
+
+    frames_encoded: int
+    frames_decoded: int
+    frames_corrected: int
+    bytes_corrected: int
+    frames_uncorrectable: int
+    parity: int
+
+
+class FEC:
+    """
+    Reed-Solomon forward error correction between an HDLC controller and
+    the link. Both ends of the link must use it.
+
+    :param parity: Number of parity bytes per block of at most 255 bytes,
+        each block correcting up to half of this number of bytes. In
+        adaptive mode, this is the initial value.
+    :param adaptive: Whether the parity follows the errors found in the
+        frames received.
+    :param min_parity: Smallest parity in adaptive mode.
+    :param max_parity: Largest parity in adaptive mode.
+    :param adapt_interval: Number of frames received between two adjustments
+        of the parity, unless a frame cannot be corrected.
+    """
+
+    def __init__(
+        self,
+        parity: int = 8,
+        adaptive: bool = False,
+        min_parity: int = 2,
+        max_parity: int = 32,
+        adapt_interval: int = 32,
+    ):
+        if not 1 <= min_parity <= max_parity <= MAX_PARITY:
+            raise ValueError(
+                "Parity bounds must verify 1 <= min <= max <= {0}".format(MAX_PARITY)
+            )
+
+        if not 1 <= parity <= MAX_PARITY:
+            raise ValueError("'parity' must be between 1 and {0}".format(MAX_PARITY))
+
+        if adapt_interval < 1:
+            raise ValueError("'adapt_interval' must be at least 1")
+
+        self.parity: int = parity
+        self.adaptive: bool = adaptive
+        self.min_parity: int = min_parity
+        self.max_parity: int = max_parity
+        self.adapt_interval: int = adapt_interval
+
+        # Protects the counters and the parity, as frames are encoded and
+        # decoded by different threads.
+        self.lock: Lock = Lock()
+        self.frames_encoded: int = 0
+        self.frames_decoded: int = 0
+        self.frames_corrected: int = 0
+        self.bytes_corrected: int = 0
+        self.frames_uncorrectable: int = 0
+
+        # Errors found since the last adjustment of the parity.
+        self.interval_frames: int = 0
+        self.interval_max_errors: int = 0
+
+    def wrap_read(
+        self, read_func: ReadFunction, max_frame_size: Union[int, None] = None
+    ) -> ReadFunction:
+        """
+        Returns a read function correcting the frames read by ``read_func``.
+
+        With a ``max_frame_size``, the protected frames which cannot hold an
+        HDLC frame of this size are dropped while scanning.
+        """
+
+        scanner = FrameScanner(
+            protected_size(max_frame_size) if max_frame_size is not None else None
+        )
+        decode = self.decode
+
+        def read() -> bytes:
+            return b"".join(decode(frame) for frame in scanner.feed(read_func()))
+
+        return read
+
+    def wrap_write(self, write_func: WriteFunction) -> WriteFunction:
+        """
+        Returns a write function protecting the frames given to
+        ``write_func``.
+        """
+
+        scanner = FrameScanner()
+        encode = self.encode
+
+        def write(data: bytes) -> Union[int, None]:
+            return write_func(b"".join(encode(frame) for frame in scanner.feed(data)))
+
+        return write
+
+    def encode(self, frame: bytes) -> bytes:
+        """
+        Protects an HDLC frame, flag sequences included.
+        """
+
+        parity = self.parity
+        content = _unescape(frame[1:-1])
+        data_size = BLOCK_SIZE - parity
+        blocks = [
+            rs_encode(content[i : i + data_size], parity)
+            for i in range(0, len(content), data_size)
+        ]
+
+        with self.lock:
+            self.frames_encoded += 1
+
+        return FLAG + _escape(bytes((parity,)) * HEADER_SIZE + b"".join(blocks)) + FLAG
+
+    def decode(self, frame: bytes) -> bytes:
+        """
+        Corrects a protected frame, flag sequences included, and returns the
+        HDLC frame. The frames which cannot be corrected are returned as
+        received, without their parity bytes, so that their FCS check fails.
+        """
+
+        content = _unescape(frame[1:-1])
+
+        if len(content) <= HEADER_SIZE:
+            return b""
+
+        first, second, third = content[:HEADER_SIZE]
+        # Bitwise majority vote.
+        parity = (first & second) | (first & third) | (second & third)
+        content = content[HEADER_SIZE:]
+
+        data = []
+        corrected = 0
+        max_errors = 0
+        uncorrectable = not 1 <= parity <= MAX_PARITY
+
+        if uncorrectable:
+            data.append(content)
+        else:
+            for i in range(0, len(content), BLOCK_SIZE):
+                block = content[i : i + BLOCK_SIZE]
+
+                try:
+                    if len(block) <= parity:
+                        raise UncorrectableError("Block without data")
+
+                    block_data, errors = rs_decode(block, parity)
+                except UncorrectableError:
+                    uncorrectable = True
+                    block_data, errors = block[:-parity], 0
+
+                data.append(block_data)
+                corrected += errors
+                max_errors = max(max_errors, errors)
+
+        self.__account(corrected, max_errors, uncorrectable)
+
+        return FLAG + _escape(b"".join(data)) + FLAG
+
+    def get_stats(self) -> FECStats:
+        """
+        Returns the counters of the FEC layer.
+        """
+
+        with self.lock:
+            return FECStats(
+                self.frames_encoded,
+                self.frames_decoded,
+                self.frames_corrected,
+                self.bytes_corrected,
+                self.frames_uncorrectable,
+                self.parity,
+            )
+
+    def __account(self, corrected: int, max_errors: int, uncorrectable: bool) -> None:
+        """
+        Counts the errors found in a frame received, and adjusts the parity
+        in adaptive mode.
+        """
+
+        with self.lock:
+            self.frames_decoded += 1
+
+            if uncorrectable:
+                self.frames_uncorrectable += 1
+            elif corrected:
+                self.frames_corrected += 1
+                self.bytes_corrected += corrected
+
+            if not self.adaptive:
+                return
+
+            if uncorrectable:
+                self.parity = min(2 * self.parity, self.max_parity)
+                self.interval_frames = 0
+                self.interval_max_errors = 0
+                return
+
+            self.interval_frames += 1
+            self.interval_max_errors = max(self.interval_max_errors, max_errors)
+
+            if self.interval_frames >= self.adapt_interval:
+                needed = 2 * self.interval_max_errors + PARITY_MARGIN
+
+                if needed > self.parity:
+                    self.parity = needed
+                else:
+                    # Decreases slowly, as the errors come in bursts.
+                    self.parity = max(needed, self.parity - PARITY_MARGIN)
+
+                self.parity = min(max(self.parity, self.min_parity), self.max_parity)
+                self.interval_frames = 0
+                self.interval_max_errors = 0
@@ -0,0 +1,85 @@
+"""
+HDLC framing helpers.
+"""
+
+from typing import List, Union
+
+FLAG_SEQUENCE = 0x7E
+# Two flags, the address, the control field and a 16-bit FCS.
+MIN_FRAME_SIZE = 6
+
+
+class FrameScanner:
+    """
+    Splits a raw byte stream into HDLC frames.
+
+    Bytes can be fed in chunks of any size: a frame split across several
+    reads is reassembled and several frames received in one read are all
+    returned. Each frame returned includes its opening and closing flag
+    sequences, which is what ``yahdlc.get_data`` expects.
+
+    With a ``max_frame_size``, frames larger than this size in bytes, flags
+    and escape sequences included, are dropped and counted in
+    ``oversized_frames``. The scanning buffer then never holds more than one
+    read beyond this size, whatever is received.
+    """
+
+    def __init__(self, max_frame_size: Union[int, None] = None):
+        if max_frame_size is not None and max_frame_size < MIN_FRAME_SIZE:
+            raise ValueError(
+                "'max_frame_size' must be at least {0}".format(MIN_FRAME_SIZE)
+            )
+
+        self.buffer: bytearray = bytearray()
+        self.max_frame_size: Union[int, None] = max_frame_size
+        self.oversized_frames: int = 0
+
+    def feed(self, data: bytes) -> List[bytes]:
+        """
+        Appends new data to the scanning buffer and returns the complete
+        frames found so far.
+        """
+
+        buf = self.buffer
+        buf += data
+        frames: List[bytes] = []
+
+        start = buf.find(FLAG_SEQUENCE)
+
+        if start < 0:
+            # No frame can start in what has been received so far.
+            buf.clear()
+            return frames
+
+        while True:
+            end = buf.find(FLAG_SEQUENCE, start + 1)
+
+            if end < 0:
+                break
+
+            # Two consecutive flags delimit nothing.
+            if end > start + 1:
+                if self.max_frame_size is None or end - start < self.max_frame_size:
+                    frames.append(bytes(buf[start : end + 1]))
+                else:
+                    self.oversized_frames += 1
+
+            # The closing flag can also be the opening flag of the next frame.
+            start = end
+
+        del buf[:start]
+
+        if self.max_frame_size is not None and len(buf) > self.max_frame_size:
+            # The frame being received is already too large. Its end is
+            # skipped up to the next flag, which opens the next frame.
+            self.oversized_frames += 1
+            buf.clear()
+
+        return frames
+
+    def reset(self) -> None:
+        """
+        Drops any partial frame kept in the scanning buffer.
+        """
+
+        self.buffer.clear()
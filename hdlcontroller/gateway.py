@@ -0,0 +1,343 @@
+"""
+Gateway between an HDLC controller and a UDP or TCP endpoint.
+
+Each DATA frame received by the controller is forwarded to the endpoint, and
+each message received from the endpoint is sent as a DATA frame. With UDP,
+one datagram carries one frame. With TCP, each frame is prefixed with its
+length as a big-endian 16-bit integer.
+
+Frames are forwarded in batches: all the frames waiting in the receive queue
+of the controller are taken at once, and with TCP they are written with a
+single call. Python's socket module does not expose ``sendmmsg``, so with
+UDP the datagrams of a batch are still sent one by one, back to back.
+
+Back-pressure goes through both sides. A slow TCP endpoint blocks the
+gateway, which stops emptying the receive queue of the controller: once the
+queue is full, the frames received are not acknowledged and the peer sends
+them again later. Likewise, the gateway stops reading the socket while the
+sending window of the controller is full, which lets TCP flow control slow
+the endpoint down. UDP has no flow control, so datagrams are dropped by the
+operating system when the gateway cannot keep up. The messages received
+while the HDLC link is down are dropped, as well as the ones too large to
+be sent in a frame.
+"""
+
+from select import select
+from socket import SHUT_RDWR, SOCK_DGRAM, SOCK_STREAM, socket
+from struct import Struct
+from threading import Event, Lock, Thread
+from typing import List, NamedTuple, Tuple, Union
+
+from hdlcontroller.hdlcontroller import HDLController, LinkDownError
+
+LENGTH = Struct(">H")
+
+PROTOCOL_UDP = "udp"
+PROTOCOL_TCP = "tcp"
+
+
+def parse_endpoint(spec: str) -> Tuple[str, int]:
+    """
+    Parses an endpoint given as ``HOST:PORT``.
+    """
+
+    host, _, port = spec.rpartition(":")
+
+    try:
+        return host or "127.0.0.1", int(port)
+    except ValueError as err:
+        raise ValueError("Invalid endpoint: '{0}'".format(spec)) from err
+
+
+class GatewayStats(NamedTuple):
+    """
+    Counters of a gateway.
+    """
+
+    frames_to_socket: int
+    socket_writes: int
+    frames_to_serial: int
+    socket_reads: int
+    frames_dropped: int
+    connections: int
+
+
+class Gateway:
+    """
+    Forwards frames between an HDLC controller and a UDP or TCP endpoint.
+
+    The gateway connects to the endpoint when started and keeps the same
+    connection for as long as it works. A TCP connection which fails is
+    opened again after ``reconnect_delay`` seconds, the frames being
+    forwarded when it failed are sent again on the new connection.
+
+    The controller has to be started separately. A bounded receive queue
+    (``frames_queue_size``) is needed for the back-pressure to reach the
+    HDLC link.
+
+    :param controller: HDLC controller to bridge.
+    :param host: Host of the endpoint.
+    :param port: Port of the endpoint.
+    :param protocol: ``"udp"`` or ``"tcp"``.
+    :param batch_size: Maximum number of frames forwarded at once.
+    :param reconnect_delay: Delay in seconds between two connection
+        attempts.
+    """
+
+    def __init__(
+        self,
+        controller: HDLController,
+        host: str,
+        port: int,
+        protocol: str = PROTOCOL_UDP,
+        batch_size: int = 64,
+        reconnect_delay: float = 1.0,
+    ):
+        if protocol not in (PROTOCOL_UDP, PROTOCOL_TCP):
+            raise ValueError("Unknown protocol: '{0}'".format(protocol))
+
+        if batch_size < 1:
+            raise ValueError("'batch_size' must be at least 1")
+
+        self.controller: HDLController = controller
+        self.address = (host, port)
+        self.protocol: str = protocol
+        self.batch_size: int = batch_size
+        self.reconnect_delay: float = reconnect_delay
+
+        # Protects the connection, shared by the two forwarding threads.
+        self.lock: Lock = Lock()
+        self.sock: Union[socket, None] = None
+
+        self.frames_to_socket: int = 0
+        self.socket_writes: int = 0
+        self.frames_to_serial: int = 0
+        self.socket_reads: int = 0
+        self.frames_dropped: int = 0
+        self.connections: int = 0
+
+        self.stop_gateway: Event = Event()
+        self.threads: List[Thread] = [
+            Thread(target=self.__forward_to_socket, daemon=True),
+            Thread(target=self.__forward_to_serial, daemon=True),
+        ]
+
+    def start(self) -> None:
+        """
+        Starts the forwarding threads.
+        """
+
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self, timeout: Union[float, None] = None) -> None:
+        """
+        Stops the forwarding threads and closes the connection.
+
+        A thread blocked by a full sending window only stops once the window
+        has room again, so a timeout can be given to wait for each thread.
+        """
+
+        self.stop_gateway.set()
+
+        with self.lock:
+            if self.sock is not None:
+                if self.protocol == PROTOCOL_TCP:
+                    try:
+                        # Unblocks a thread waiting for the endpoint.
+                        self.sock.shutdown(SHUT_RDWR)
+                    except OSError:
+                        pass
+
+                self.sock.close()
+                self.sock = None
+
+        for thread in self.threads:
+            thread.join(timeout)
+
+    def get_stats(self) -> GatewayStats:
+        """
+        Returns the counters of the gateway.
+        """
+
+        return GatewayStats(
+            self.frames_to_socket,
+            self.socket_writes,
+            self.frames_to_serial,
+            self.socket_reads,
+            self.frames_dropped,
+            self.connections,
+        )
+
+    def __connection(self) -> Union[socket, None]:
+        """
+        Returns the current connection, opening a new one if needed.
+
+        Returns ``None`` once the gateway is stopped.
+        """
+
+        while not self.stop_gateway.is_set():
+            with self.lock:
+                if self.sock is not None:
+                    return self.sock
+
+                sock = socket(
+                    type=SOCK_DGRAM if self.protocol == PROTOCOL_UDP else SOCK_STREAM
+                )
+
+                try:
+                    sock.connect(self.address)
+                except OSError:
+                    sock.close()
+                else:
+                    self.sock = sock
+                    self.connections += 1
+                    return sock
+
+            self.stop_gateway.wait(self.reconnect_delay)
+
+        return None
+
+    def __disconnect(self, sock: socket) -> None:
+        """
+        Closes a connection which failed, unless it has already been
+        replaced.
+        """
+
+        with self.lock:
+            if self.sock is sock:
+                self.sock = None
+
+        sock.close()
+
+    def __forward_to_socket(self) -> None:
+        """
+        Forwards the frames received by the controller to the endpoint.
+        """
+
+        frames: List[bytes] = []
+
+        while not self.stop_gateway.is_set():
+            if not frames:
+                frames = self.controller.get_data_batch(self.batch_size, timeout=0.1)
+
+                if not frames:
+                    continue
+
+            sock = self.__connection()
+
+            if sock is None:
+                break
+
+            try:
+                if self.protocol == PROTOCOL_UDP:
+                    for frame in frames:
+                        sock.send(frame)
+
+                    self.socket_writes += len(frames)
+                else:
+                    sock.sendall(
+                        b"".join(LENGTH.pack(len(frame)) + frame for frame in frames)
+                    )
+                    self.socket_writes += 1
+            except OSError:
+                if self.protocol == PROTOCOL_TCP:
+                    # The batch is sent again on the next connection.
+                    self.__disconnect(sock)
+                    continue
+
+                # Generally, an ICMP error reported for an earlier datagram.
+                self.frames_dropped += len(frames)
+                frames = []
+                continue
+
+            self.frames_to_socket += len(frames)
+            frames = []
+
+    def __forward_to_serial(self) -> None:
+        """
+        Sends the messages received from the endpoint through the
+        controller.
+        """
+
+        buffer = bytearray()
+
+        while not self.stop_gateway.is_set():
+            sock = self.__connection()
+
+            if sock is None:
+                break
+
+            try:
+                if not select([sock], [], [], 0.1)[0]:
+                    continue
+
+                if self.protocol == PROTOCOL_UDP:
+                    frames = self.__receive_datagrams(sock)
+                else:
+                    frames = self.__receive_stream(sock, buffer)
+            except (OSError, ValueError):
+                # ValueError is raised by select when the socket has just
+                # been closed by the other thread.
+                if self.protocol == PROTOCOL_TCP:
+                    self.__disconnect(sock)
+                    buffer.clear()
+
+                continue
+
+            if self.stop_gateway.is_set():
+                break
+
+            for frame in frames:
+                try:
+                    # Blocks while the sending window is full.
+                    self.controller.send(frame)
+                except (LinkDownError, ValueError):
+                    # The link is down or the message does not fit in a
+                    # frame.
+                    self.frames_dropped += 1
+                else:
+                    self.frames_to_serial += 1
+
+    def __receive_datagrams(self, sock: socket) -> List[bytes]:
+        """
+        Reads the datagrams available, up to the batch size.
+        """
+
+        frames = [sock.recv(65535)]
+        self.socket_reads += 1
+
+        while len(frames) < self.batch_size and select([sock], [], [], 0)[0]:
+            frames.append(sock.recv(65535))
+            self.socket_reads += 1
+
+        return frames
+
+    def __receive_stream(self, sock: socket, buffer: bytearray) -> List[bytes]:
+        """
+        Reads the stream and returns the complete messages received so far.
+        """
+
+        data = sock.recv(65536)
+        self.socket_reads += 1
+
+        if not data:
+            raise ConnectionResetError("Connection closed by the endpoint")
+
+        buffer += data
+        frames = []
+        offset = 0
+
+        while len(buffer) - offset >= LENGTH.size:
+            (length,) = LENGTH.unpack_from(buffer, offset)
+            end = offset + LENGTH.size + length
+
+            if end > len(buffer):
+                break
+
+            frames.append(bytes(buffer[offset + LENGTH.size : end]))
+            offset = end
+
+        del buffer[:offset]
+
+        return frames
@@ -1,7 +1,6 @@
-from queue import Full, Queue
-from threading import Event, Lock, Thread
-from time import sleep, time
-from typing import Callable, Dict, NewType, Union
+from queue import Empty, Full, Queue
+from threading import Condition, Event, Lock, Thread
+from typing import Callable, Dict, List, NamedTuple, NewType, Tuple, Union
 
 from yahdlc import (
     FRAME_ACK,
@@ -11,8 +10,33 @@ from yahdlc import (
     MessageError,
     frame_data,
     get_data,
+    get_data_reset,
 )
 
+from hdlcontroller.capture import RECORD_FRAME, CaptureWriter
+from hdlcontroller.clock import Clock
+from hdlcontroller.fec import FEC
+from hdlcontroller.framing import MIN_FRAME_SIZE, FrameScanner
+from hdlcontroller.negotiation import (
+    FEATURE_PIGGYBACK_ACKS,
+    XID_MAGIC,
+    Capabilities,
+    decode_xid,
+    encode_xid,
+    settle,
+)
+from hdlcontroller.pacing import Pacer
+from hdlcontroller.profiling import (
+    PHASE_DECODE,
+    PHASE_ENCODE,
+    PHASE_RECEIVE_CALLBACK,
+    PHASE_SEND_CALLBACK,
+    PHASE_WRITE,
+    Profiler,
+)
+from hdlcontroller.ring import FrameRing
+from hdlcontroller.tuning import Tuner
+
 SequenceNumber = NewType("SequenceNumber", int)
 Timeout = NewType("Timeout", float)
 
@@ -20,15 +44,284 @@ ReadFunction = Callable[[], bytes]
 WriteFunction = Callable[[bytes], Union[int, None]]
 
 Callback = Callable[[bytes], None]
+AckCallback = Callable[[bytes, float], None]
+LinkStateCallback = Callable[[bool], None]
+PortErrorCallback = Callable[[OSError], None]
+
+
+class LinkDownError(ConnectionError):
+    """
+    Raised when a frame cannot be sent because the link is down.
+    """
+
+
+class Stats(NamedTuple):
+    """
+    Counters of an HDLC controller.
+    """
+
+    frames_sent: int
+    retransmissions: int
+    frames_acked: int
+    nacks_received: int
+    acks_sent: int
+    acks_piggybacked: int
+    window_stalls: int
+    window_stall_time: float
+    frames_received: int
+    duplicates_received: int
+    duplicate_bytes: int
+    fcs_errors: int
+    keepalives_sent: int
+    frames_failed: int
+    link_downs: int
+    oversized_frames: int
+    port_errors: int
+    frames_rejected: int
+
+
+class Counters:
+    """
+    Mutable counters shared by the threads of an HDLC controller.
+    """
+
+    __slots__ = Stats._fields
+
+    def __init__(self):
+        for field in self.__slots__:
+            setattr(self, field, 0)
+
+    def snapshot(self) -> Stats:
+        """
+        Returns the current value of the counters.
+        """
+
+        return Stats(*(getattr(self, field) for field in self.__slots__))
+
+
+class PendingAcks:
+    """
+    Acknowledgements of received DATA frames not sent yet.
+
+    Bit ``i`` of the bitmap is set when the DATA frame with the sequence
+    number ``i`` has to be acknowledged. It is protected by the send lock.
+    """
+
+    __slots__ = ("bitmap", "deadline")
+
+    def __init__(self):
+        self.bitmap: int = 0
+        self.deadline: float = 0.0
+
+    def take(self) -> int:
+        """
+        Returns the pending acknowledgements and clears them.
+        """
+
+        bitmap = self.bitmap
+        self.bitmap = 0
+
+        return bitmap
+
+
+class LinkState:
+    """
+    Liveness of the link, shared by the threads of an HDLC controller.
+
+    The state is protected by the window condition, the times are only
+    written by one thread each.
+    """
+
+    __slots__ = ("up", "last_received", "last_sent")
+
+    def __init__(self, now: float):
+        self.up: bool = True
+        self.last_received: float = now
+        self.last_sent: float = now
+
+
+class Port:
+    """
+    Read and write functions of the link, shared by the threads of an HDLC
+    controller, which can be swapped while it is running.
+
+    An :py:exc:`OSError` raised by either function, such as a serial device
+    gone, disconnects the port and is given to ``error_callback``. Until the
+    port is connected again, nothing is read and the frames written are
+    dropped. The state is protected by the window condition.
+    """
+
+    __slots__ = ("read_func", "write_func", "connected", "error_callback")
+
+    def __init__(
+        self,
+        read_func: ReadFunction,
+        write_func: WriteFunction,
+        error_callback: PortErrorCallback,
+    ):
+        self.read_func: ReadFunction = read_func
+        self.write_func: WriteFunction = write_func
+        self.connected: bool = True
+        self.error_callback: PortErrorCallback = error_callback
+
+    def read(self) -> bytes:
+        """
+        Reads the data available, if any.
+        """
+
+        if not self.connected:
+            return b""
+
+        try:
+            return self.read_func()
+        except OSError as err:
+            self.error_callback(err)
+            return b""
+
+    def write(self, data: bytes) -> Union[int, None]:
+        """
+        Writes data, which is dropped if the port is disconnected.
+        """
+
+        if not self.connected:
+            return None
+
+        try:
+            return self.write_func(data)
+        except OSError as err:
+            self.error_callback(err)
+            return None
+
+
+class FrameRecord:
+    """
+    DATA frame received, along with its metadata.
+
+    The timestamp is given by the clock of the controller when the frame is
+    decoded. A frame is flagged as a duplicate when it has already been
+    delivered, which is only detected with a receive window, and as a
+    retransmission when it is a duplicate or when an NACK has been sent for
+    its sequence number.
+    """
+
+    __slots__ = ("data", "timestamp", "seq_no", "duplicate", "retransmission")
+
+    def __init__(
+        self,
+        data: bytes,
+        timestamp: float,
+        seq_no: int,
+        duplicate: bool = False,
+        retransmission: bool = False,
+    ):
+        self.data: bytes = data
+        self.timestamp: float = timestamp
+        self.seq_no: int = seq_no
+        self.duplicate: bool = duplicate
+        self.retransmission: bool = retransmission
+
+    def __repr__(self) -> str:
+        return (
+            "FrameRecord(data={0!r}, timestamp={1}, seq_no={2}, "
+            "duplicate={3}, retransmission={4})".format(
+                self.data,
+                self.timestamp,
+                self.seq_no,
+                self.duplicate,
+                self.retransmission,
+            )
+        )
 
 
 class HDLController:
     """
     An HDLC controller based on python4yahdlc.
+
+    With ``piggyback_acks`` enabled, the acknowledgements of the DATA frames
+    received are carried by the next DATA frame sent, in a one-byte bitmap
+    prepended to its payload. A standalone ACK frame is only sent when no
+    DATA frame has left within ``ack_delay`` seconds. Both ends of the link
+    must enable this option.
+
+    With a ``receive_window``, DATA frames retransmitted because their ACK
+    has been lost are acknowledged again but not delivered twice. The
+    receive window must be at least the sending window of the other end and
+    at most half of ``MAX_SEQ_NO``. The DATA frames beyond the receive
+    window are dropped without being acknowledged, and are sent again by the
+    other end once the window has moved. When the other end drops its frames
+    as its link goes down, the window follows its next sequence number.
+
+    The sending window spans from the oldest frame not acknowledged yet, so
+    that a frame is only sent once the frame sent ``window`` frames earlier
+    has been acknowledged, and the receive window of the other end can tell
+    a retransmitted frame from a new one.
+
+    With a ``pacer``, the frames and the ACKs are written at the rate the
+    link can drain them instead of as soon as they are ready.
+
+    With a ``tuner``, the window and the sending timeout given are only the
+    initial values, adjusted at runtime from the ACK latency and the losses.
+    The effective values are returned by :py:meth:`get_window` and
+    :py:meth:`get_sending_timeout`.
+
+    With ``frame_records`` enabled, the frames received are queued and given
+    to the receive callback as :py:class:`FrameRecord` objects, which also
+    carry their receive timestamp and sequence number. The duplicates
+    detected by the receive window are then delivered too, flagged as such.
+
+    The link is declared down when a frame has been sent again
+    ``max_retries`` times without being acknowledged, or when nothing has
+    been received for ``KEEPALIVE_MISSES`` times the ``keepalive`` interval.
+    The frames not acknowledged yet are then dropped, the callers blocked in
+    :py:meth:`send` and the next ones get a :py:exc:`LinkDownError`, and the
+    link state callback is called. The link is up again as soon as a valid
+    frame is received. A DATA frame whose payload is ``RESET_MAGIC`` is then
+    sent, so that the other end expects the sequence number it carries
+    instead of the ones of the frames dropped. Such frames are never
+    acknowledged nor delivered. With a ``keepalive`` interval, an NACK frame is sent
+    whenever nothing has been written for this long, which does not trigger
+    any retransmission on the other end unless a frame is actually missing.
+    Both ends of the link must enable the keepalive, otherwise an idle link
+    is declared down.
+
+    With a ``frames_ring``, the frames received are published into this
+    shared-memory ring instead of the receive queue, to be consumed by other
+    processes. :py:meth:`get_data` then takes them from the ring too.
+
+    With a ``max_frame_size``, the frames received larger than this size in
+    bytes, as sent on the line, are dropped while scanning, and
+    :py:meth:`send` refuses the frames which could be larger. With a bounded
+    receive queue, the memory held by the frames received is then bounded
+    too.
+
+    With ``negotiate`` enabled, :py:meth:`start` first exchanges the
+    parameters of both ends and settles on the largest window and maximum
+    frame size they both support, and on the optional features enabled on
+    both sides, such as ``piggyback_acks``. The parameters given to the
+    controller are then the best ones it supports. It blocks until the
+    other end has answered, and raises :py:exc:`TimeoutError` if it has not
+    within ``negotiation_timeout`` seconds. Both ends of the link must enable
+    this option.
+
+    With an ``fec`` layer, the frames are protected with parity bytes so
+    that the errors can be corrected before the FCS is checked, instead of
+    being sent again. Both ends of the link must use it.
+
+    When the read or write function raises an :py:exc:`OSError`, the port is
+    disconnected and the port error callback is called. The frames not
+    acknowledged yet and the sequence numbers are kept, the frames sent in
+    the meantime wait in the window, and the keepalive is suspended. Once the
+    device has been opened again, :py:meth:`reconnect` swaps in its read and
+    write functions and the frames waiting are sent at once.
     """
 
     MAX_SEQ_NO = 8
+    # Largest payload accepted by python4yahdlc.
+    MAX_DATA_SIZE = 512
     MIN_SENDING_TIMEOUT = 0.5
+    KEEPALIVE_MISSES = 3
+    # Payload of the DATA frames sent when the link is up again.
+    RESET_MAGIC = b"\xffRST"
 
     def __init__(
         self,
@@ -38,6 +331,22 @@ class HDLController:
         window: int = 3,
         frames_queue_size: int = 0,
         fcs_nack: bool = True,
+        clock: Union[Clock, None] = None,
+        capture: Union[CaptureWriter, None] = None,
+        profiler: Union[Profiler, None] = None,
+        piggyback_acks: bool = False,
+        ack_delay: Timeout = Timeout(0.01),
+        receive_window: Union[int, None] = None,
+        pacer: Union[Pacer, None] = None,
+        tuner: Union[Tuner, None] = None,
+        frame_records: bool = False,
+        keepalive: Union[Timeout, None] = None,
+        max_retries: Union[int, None] = None,
+        frames_ring: Union[FrameRing, None] = None,
+        max_frame_size: Union[int, None] = None,
+        negotiate: bool = False,
+        negotiation_timeout: Timeout = Timeout(5.0),
+        fec: Union[FEC, None] = None,
     ):
         if not callable(read_func):
             raise TypeError("'read_func' is not callable")
@@ -45,36 +354,121 @@ class HDLController:
         if not callable(write_func):
             raise TypeError("'write_func' is not callable")
 
-        self.read: ReadFunction = read_func
-        self.write: WriteFunction = write_func
+        if receive_window is not None and not (
+            1 <= receive_window <= HDLController.MAX_SEQ_NO // 2
+        ):
+            raise ValueError(
+                "'receive_window' must be between 1 and {0}".format(
+                    HDLController.MAX_SEQ_NO // 2
+                )
+            )
+
+        if max_frame_size is not None and max_frame_size < MIN_FRAME_SIZE:
+            raise ValueError(
+                "'max_frame_size' must be at least {0}".format(MIN_FRAME_SIZE)
+            )
+
+        if frames_ring is not None and frame_records:
+            raise ValueError("Frame records cannot be published into a frames ring")
+
+        if (
+            frames_ring is not None
+            and max_frame_size is not None
+            and frames_ring.slot_size < max_frame_size
+        ):
+            raise ValueError(
+                "The slots of the frames ring must hold frames of 'max_frame_size'"
+            )
+
+        self.capture: Union[CaptureWriter, None] = capture
+        self.clock: Clock = clock if clock is not None else Clock()
+        self.keepalive: Union[Timeout, None] = keepalive
+        self.max_retries: Union[int, None] = max_retries
+        self.link: Union[LinkState, None] = None
+
+        if keepalive is not None or max_retries is not None:
+            self.link = LinkState(self.clock.time())
+
+        self.pacer: Union[Pacer, None] = pacer
+        self.fec: Union[FEC, None] = fec
+        self.max_frame_size: Union[int, None] = max_frame_size
+        self.port: Port = Port(
+            *self.__wrap_port(read_func, write_func), self.__port_failed
+        )
 
         self.window: int = window
+        self.tuner: Union[Tuner, None] = tuner
         self.fcs_nack: bool = fcs_nack
+        self.profiler: Union[Profiler, None] = profiler
         self.senders: Dict[SequenceNumber, HDLController.Sender] = {}
         self.send_lock: Lock = Lock()
+        # Protects the senders list and the sequence number on the send side,
+        # and is notified when a room becomes available in the window.
+        self.window_condition: Condition = Condition()
         self.new_seq_no: SequenceNumber = SequenceNumber(0)
+        self.counters: Counters = Counters()
+        self.ack_delay: Timeout = ack_delay
+        self.receive_window: Union[int, None] = receive_window
+        self.frame_records: bool = frame_records
+        self.negotiate: bool = negotiate
+        self.negotiation_timeout: Timeout = negotiation_timeout
+        self.capabilities: Union[Capabilities, None] = None
+        self.xid_reply: Union[bytes, None] = None
+        self.pending_acks: Union[PendingAcks, None] = (
+            PendingAcks() if piggyback_acks else None
+        )
 
         self.send_callback: Union[Callback, None] = None
         self.receive_callback: Union[Callback, None] = None
+        self.ack_callback: Union[AckCallback, None] = None
+        self.link_state_callback: Union[LinkStateCallback, None] = None
+        self.port_error_callback: Union[PortErrorCallback, None] = None
 
         self.set_sending_timeout(sending_timeout)
 
+        if tuner is not None:
+            tuner.configure(window, self.sending_timeout)
+
         self.receiver: Union[HDLController.Receiver, None] = None
-        self.frames_received: Queue = Queue(maxsize=frames_queue_size)
+        self.frames_received: Union[Queue, FrameRing] = (
+            frames_ring if frames_ring is not None else Queue(maxsize=frames_queue_size)
+        )
 
     def start(self) -> None:
         """
-        Starts HDLC controller's threads.
+        Starts HDLC controller's threads, once the link parameters have been
+        negotiated if needed.
         """
 
+        if self.negotiate:
+            self.__negotiate()
+
         self.receiver = self.Receiver(
-            self.read,
-            self.write,
+            self.port.read,
+            self.port.write,
             self.send_lock,
             self.senders,
             self.frames_received,
             callback=self.receive_callback,
             fcs_nack=self.fcs_nack,
+            clock=self.clock,
+            capture=self.capture,
+            profiler=self.profiler,
+            window_condition=self.window_condition,
+            counters=self.counters,
+            ack_callback=self.ack_callback,
+            pending_acks=self.pending_acks,
+            ack_delay=self.ack_delay,
+            receive_window=self.receive_window,
+            tuner=self.tuner,
+            frame_records=self.frame_records,
+            link=self.link,
+            set_link_state=self.__set_link_state,
+            keepalive=self.keepalive,
+            max_frame_size=self.max_frame_size,
+            xid_reply=self.xid_reply,
+            port=self.port,
+            resume_port=self.__resume_port,
         )
 
         self.receiver.start()
@@ -108,7 +502,9 @@ class HDLController:
         """
         Sets the receive callback function.
 
-        This method has to be called before starting the HDLC controller.
+        The callback is called with the data of each frame received, or with
+        its :py:class:`FrameRecord` if ``frame_records`` is enabled. This
+        method has to be called before starting the HDLC controller.
         """
 
         if not callable(callback):
@@ -116,6 +512,75 @@ class HDLController:
 
         self.receive_callback = callback
 
+    def set_ack_callback(self, callback: AckCallback) -> None:
+        """
+        Sets the ACK callback function.
+
+        The callback is called with the data of each frame acknowledged and
+        the delay in seconds between its first transmission and its ACK.
+        This method has to be called before starting the HDLC controller.
+        """
+
+        if not callable(callback):
+            raise TypeError("'callback' is not callable")
+
+        self.ack_callback = callback
+
+    def set_link_state_callback(self, callback: LinkStateCallback) -> None:
+        """
+        Sets the link state callback function.
+
+        The callback is called with ``False`` when the link goes down and
+        with ``True`` when it is up again. This method has to be called
+        before starting the HDLC controller.
+        """
+
+        if not callable(callback):
+            raise TypeError("'callback' is not callable")
+
+        self.link_state_callback = callback
+
+    def set_port_error_callback(self, callback: PortErrorCallback) -> None:
+        """
+        Sets the port error callback function.
+
+        The callback is called with the :py:exc:`OSError` raised by the read
+        or write function when the port is disconnected. It is called from
+        the thread which has hit the error, so it must not block nor call
+        :py:meth:`reconnect` itself. This method has to be called before
+        starting the HDLC controller.
+        """
+
+        if not callable(callback):
+            raise TypeError("'callback' is not callable")
+
+        self.port_error_callback = callback
+
+    def reconnect(self, read_func: ReadFunction, write_func: WriteFunction) -> None:
+        """
+        Swaps in new read and write functions, typically once the serial
+        device has been opened again after a reset.
+
+        The frames not acknowledged yet are sent again at once through the
+        new port, with their sequence numbers, and the partial frame read
+        from the previous port is dropped. If the HDLC controller is running,
+        the swap is completed by its receiving thread within a polling
+        interval.
+        """
+
+        if not callable(read_func):
+            raise TypeError("'read_func' is not callable")
+
+        if not callable(write_func):
+            raise TypeError("'write_func' is not callable")
+
+        read_func, write_func = self.__wrap_port(read_func, write_func)
+
+        if self.receiver is not None and self.receiver.is_alive():
+            self.receiver.reconnect(read_func, write_func)
+        else:
+            self.__resume_port(read_func, write_func)
+
     def set_sending_timeout(self, sending_timeout: Timeout) -> None:
         """
         Sets the sending timeout.
@@ -124,6 +589,48 @@ class HDLController:
         if sending_timeout >= HDLController.MIN_SENDING_TIMEOUT:
             self.sending_timeout = sending_timeout
 
+    def get_window(self) -> int:
+        """
+        Returns the effective sending window.
+        """
+
+        if self.tuner is not None:
+            return self.tuner.window
+
+        return self.window
+
+    def get_sending_timeout(self) -> float:
+        """
+        Returns the effective sending timeout.
+        """
+
+        if self.tuner is not None:
+            return self.tuner.timeout
+
+        return self.sending_timeout
+
+    def is_link_up(self) -> bool:
+        """
+        Returns whether the link is up.
+        """
+
+        return self.link is None or self.link.up
+
+    def is_connected(self) -> bool:
+        """
+        Returns whether the port is connected.
+        """
+
+        return self.port.connected
+
+    def get_capabilities(self) -> Union[Capabilities, None]:
+        """
+        Returns the parameters settled with the other end, or ``None`` if
+        they have not been negotiated.
+        """
+
+        return self.capabilities
+
     def get_senders_number(self) -> int:
         """
         Returns the number of active senders.
@@ -131,30 +638,103 @@ class HDLController:
 
         return len(self.senders)
 
-    def send(self, data: bytes) -> None:
+    def get_stats(self) -> Stats:
+        """
+        Returns the counters of the HDLC controller.
+        """
+
+        if self.receiver is not None:
+            # Counted by the frame scanner of the receiver.
+            self.counters.oversized_frames = self.receiver.scanner.oversized_frames
+
+        return self.counters.snapshot()
+
+    def send(self, data: Union[bytes, str]) -> None:
         """
         Sends a new data frame.
 
         This method will block until a new room is available for a new sender.
-        This limit is determined by the size of the window.
+        This limit is determined by the size of the window. It can be called
+        from several threads at once. It raises :py:exc:`LinkDownError` if
+        the link is down, or goes down while waiting, and
+        :py:exc:`ValueError` if the frame is larger than ``max_frame_size``
+        or its payload larger than ``MAX_DATA_SIZE``, in which case it is
+        counted in ``frames_rejected``. Text is sent encoded in UTF-8.
         """
 
-        while len(self.senders) >= self.window:
-            pass
-
-        self.senders[self.new_seq_no] = self.Sender(
-            self.write,
-            self.send_lock,
-            data,
-            self.new_seq_no,
-            timeout=self.sending_timeout,
-            callback=self.send_callback,
-        )
-
-        self.senders[self.new_seq_no].start()
-        self.new_seq_no = SequenceNumber(
-            (self.new_seq_no + 1) % HDLController.MAX_SEQ_NO
-        )
+        if isinstance(data, str):
+            # The ACK bitmap and the frame size are computed on bytes.
+            data = data.encode()
+
+        max_data_size = HDLController.MAX_DATA_SIZE
+
+        if self.pending_acks is not None:
+            # Leaves room for the ACK bitmap.
+            max_data_size -= 1
+
+        if len(data) > max_data_size:
+            self.counters.frames_rejected += 1
+            raise ValueError(
+                "The payload takes {0} bytes, more than {1}".format(
+                    len(data), max_data_size
+                )
+            )
+
+        if self.max_frame_size is not None:
+            # Two flags, the address, the control field and the FCS, whose
+            # bytes may have to be escaped, plus the escaped payload and the
+            # ACK bitmap.
+            size = 8 + len(data) + data.count(0x7E) + data.count(0x7D)
+
+            if self.pending_acks is not None:
+                size += 2
+
+            if size > self.max_frame_size:
+                self.counters.frames_rejected += 1
+                raise ValueError(
+                    "The frame would take {0} bytes, more than {1}".format(
+                        size, self.max_frame_size
+                    )
+                )
+
+        with self.window_condition:
+            if not self.is_link_up():
+                raise LinkDownError("The link is down")
+
+            if not self.__has_room():
+                stall_start = self.clock.time()
+                self.counters.window_stalls += 1
+
+                self.window_condition.wait_for(
+                    lambda: self.__has_room() or not self.is_link_up()
+                )
+
+                self.counters.window_stall_time += self.clock.time() - stall_start
+
+                if not self.is_link_up():
+                    raise LinkDownError("The link is down")
+
+            self.senders[self.new_seq_no] = self.Sender(
+                self.port.write,
+                self.send_lock,
+                data,
+                self.new_seq_no,
+                timeout=self.sending_timeout,
+                callback=self.send_callback,
+                clock=self.clock,
+                profiler=self.profiler,
+                counters=self.counters,
+                pending_acks=self.pending_acks,
+                tuner=self.tuner,
+                max_retries=self.max_retries,
+                set_link_state=self.__set_link_state,
+                port=self.port,
+            )
+
+            self.senders[self.new_seq_no].start()
+            self.new_seq_no = SequenceNumber(
+                (self.new_seq_no + 1) % HDLController.MAX_SEQ_NO
+            )
 
     def get_data(self) -> bytes:
         """
@@ -163,8 +743,283 @@ class HDLController:
         This method will block until a new data frame is available.
         """
 
+        if self.frame_records:
+            return self.frames_received.get().data
+
         return self.frames_received.get()
 
+    def get_frame(self) -> FrameRecord:
+        """
+        Gets the next frame received along with its metadata.
+
+        The controller must have been created with ``frame_records``
+        enabled. This method will block until a new data frame is available.
+        """
+
+        return self.frames_received.get()
+
+    def get_data_batch(
+        self, max_frames: int, timeout: Union[float, None] = None
+    ) -> List[bytes]:
+        """
+        Gets up to ``max_frames`` frames received at once.
+
+        This method will block until at least one data frame is available,
+        or until the timeout expires, in which case the list returned is
+        empty.
+        """
+
+        try:
+            frames = [self.frames_received.get(timeout=timeout)]
+        except Empty:
+            return []
+
+        while len(frames) < max_frames:
+            try:
+                frames.append(self.frames_received.get_nowait())
+            except Empty:
+                break
+
+        if self.frame_records:
+            return [record.data for record in frames]
+
+        return frames
+
+    def __has_room(self) -> bool:
+        """
+        Tells whether a new frame fits in the sending window, which starts
+        at the oldest frame not acknowledged yet.
+        """
+
+        if not self.senders:
+            return True
+
+        span = max(
+            (self.new_seq_no - seq_no) % HDLController.MAX_SEQ_NO
+            for seq_no in self.senders
+        )
+
+        return span < self.get_window()
+
+    def __negotiate(self) -> None:
+        """
+        Exchanges the capabilities of both ends and applies the parameters
+        settled.
+        """
+
+        own = Capabilities(
+            # With a tuner, the window can grow up to its maximum.
+            self.tuner.max_window if self.tuner is not None else self.window,
+            FEATURE_PIGGYBACK_ACKS if self.pending_acks is not None else 0,
+            self.max_frame_size,
+        )
+        other: Union[Capabilities, None] = None
+        scanner = FrameScanner(self.max_frame_size)
+        stop_negotiation = self.clock.event()
+        deadline = self.clock.time() + self.negotiation_timeout
+        next_xid = self.clock.time()
+        answer = frame_data(encode_xid(own, True), FRAME_DATA, 0)
+        answered = False
+        done = False
+
+        while not done:
+            now = self.clock.time()
+
+            if now >= deadline:
+                raise TimeoutError("The other end has not answered the negotiation")
+
+            if now >= next_xid:
+                self.port.write(frame_data(encode_xid(own, False), FRAME_DATA, 0))
+                next_xid = now + self.sending_timeout
+
+            for frame in scanner.feed(self.port.read()):
+                try:
+                    data, ftype, _ = get_data(frame)
+                except MessageError:
+                    get_data_reset()
+                    continue
+                except FCSError:
+                    continue
+
+                if ftype != FRAME_DATA:
+                    continue
+
+                xid = decode_xid(data)
+
+                if xid is None:
+                    # The other end only sends data once it has received
+                    # our capabilities along with the fact that we have
+                    # received its own, so our last frame has been lost.
+                    done = other is not None
+                elif xid[1]:
+                    other = xid[0]
+
+                    if not answered:
+                        # Tells the other end that its capabilities have
+                        # been received too.
+                        self.port.write(answer)
+
+                    done = True
+                else:
+                    other = xid[0]
+                    self.port.write(answer)
+                    answered = True
+
+                if done:
+                    break
+
+            if not done:
+                # 200 µs.
+                self.clock.wait(stop_negotiation, 200 / 1000000.0)
+
+        self.capabilities = settle(own, other)  # type: ignore
+        self.xid_reply = answer
+        self.window = min(self.window, self.capabilities.window)
+
+        if self.capabilities.max_frame_size != self.max_frame_size:
+            self.max_frame_size = self.capabilities.max_frame_size
+
+            if self.fec is not None:
+                # Bounds the frames scanned by the FEC layer with the size
+                # settled. A frame being read is lost and sent again.
+                self.port.read_func, self.port.write_func = self.__wrap_port(
+                    *self.port_funcs
+                )
+
+        if not self.capabilities.features & FEATURE_PIGGYBACK_ACKS:
+            self.pending_acks = None
+
+        if self.tuner is not None:
+            self.tuner.max_window = self.capabilities.window
+            self.tuner.min_window = min(self.tuner.min_window, self.window)
+            self.tuner.configure(self.window, self.sending_timeout)
+
+    def __wrap_port(
+        self, read_func: ReadFunction, write_func: WriteFunction
+    ) -> Tuple[ReadFunction, WriteFunction]:
+        """
+        Returns the read and write functions of a port wrapped by the
+        capture, the keepalive, the pacer and the FEC layer.
+
+        The functions given are kept, to wrap them again once the maximum
+        frame size has been negotiated.
+        """
+
+        self.port_funcs: Tuple[ReadFunction, WriteFunction] = (read_func, write_func)
+
+        if self.capture is not None:
+            read_func = self.capture.tap_read(read_func)
+            write_func = self.capture.tap_write(write_func)
+
+        if self.link is not None:
+            write_func = self.__tap_write(write_func)
+
+        if self.pacer is not None:
+            # Paces the writes after the capture, so that the writes are
+            # recorded when they actually happen.
+            write_func = self.pacer.wrap(write_func)
+
+        if self.fec is not None:
+            # Protects the frames before pacing them, so that the pacer
+            # accounts for the parity bytes.
+            read_func = self.fec.wrap_read(read_func, self.max_frame_size)
+            write_func = self.fec.wrap_write(write_func)
+
+        return read_func, write_func
+
+    def __port_failed(self, err: OSError) -> None:
+        """
+        Disconnects the port after an I/O error.
+        """
+
+        with self.window_condition:
+            if not self.port.connected:
+                return
+
+            self.port.connected = False
+            self.counters.port_errors += 1
+
+        if self.port_error_callback is not None:
+            self.port_error_callback(err)
+
+    def __resume_port(self, read_func: ReadFunction, write_func: WriteFunction) -> None:
+        """
+        Connects the port to new read and write functions and sends the
+        frames not acknowledged yet again.
+        """
+
+        # No frame is being written to the previous port.
+        with self.send_lock:
+            with self.window_condition:
+                self.port.read_func = read_func
+                self.port.write_func = write_func
+                self.port.connected = True
+                senders = list(self.senders.values())
+
+                if self.link is not None:
+                    # The other end could not be heard while disconnected.
+                    self.link.last_received = self.clock.time()
+
+        for sender in senders:
+            sender.resume()
+
+    def __tap_write(self, write_func: WriteFunction) -> WriteFunction:
+        """
+        Returns a write function recording when something has last been
+        written, for the keepalive.
+        """
+
+        link = self.link
+        clock = self.clock
+
+        def write(data: bytes) -> Union[int, None]:
+            link.last_sent = clock.time()  # type: ignore
+
+            return write_func(data)
+
+        return write
+
+    def __set_link_state(self, up: bool) -> None:
+        """
+        Changes the state of the link.
+
+        When the link goes down, the frames not acknowledged yet are dropped
+        and the callers blocked in :py:meth:`send` are woken up. When it is
+        up again, the other end is told the sequence number of the next
+        frame before any frame is sent.
+        """
+
+        with self.window_condition:
+            if self.link is None or self.link.up == up:
+                return
+
+            if up:
+                with self.send_lock:
+                    self.port.write(
+                        frame_data(
+                            HDLController.RESET_MAGIC, FRAME_DATA, self.new_seq_no
+                        )
+                    )
+
+            self.link.up = up
+            senders = []
+
+            if not up:
+                senders = list(self.senders.values())
+                self.senders.clear()
+                self.counters.frames_failed += len(senders)
+                self.counters.link_downs += 1
+                self.window_condition.notify_all()
+
+                if self.receiver is not None:
+                    self.receiver.resync()
+
+        for sender in senders:
+            sender.abort()
+
+        if self.link_state_callback is not None:
+            self.link_state_callback(up)
+
     class Sender(Thread):
         """
         Thread used to send HDLC frames.
@@ -178,6 +1033,14 @@ class HDLController:
             seq_no: SequenceNumber,
             timeout: Timeout = Timeout(2.0),
             callback: Union[Callback, None] = None,
+            clock: Union[Clock, None] = None,
+            profiler: Union[Profiler, None] = None,
+            counters: Union[Counters, None] = None,
+            pending_acks: Union[PendingAcks, None] = None,
+            tuner: Union[Tuner, None] = None,
+            max_retries: Union[int, None] = None,
+            set_link_state: Union[LinkStateCallback, None] = None,
+            port: Union[Port, None] = None,
         ):
             super().__init__()
             self.write: WriteFunction = write_func
@@ -186,18 +1049,73 @@ class HDLController:
             self.seq_no: SequenceNumber = seq_no
             self.timeout: Timeout = timeout
             self.callback: Union[Callback, None] = callback
-
-            self.stop_sender: Event = Event()
-            self.stop_timeout: Event = Event()
+            self.clock: Clock = clock if clock is not None else Clock()
+            self.counters: Counters = counters if counters is not None else Counters()
+            self.pending_acks: Union[PendingAcks, None] = pending_acks
+            self.tuner: Union[Tuner, None] = tuner
+            self.max_retries: Union[int, None] = max_retries
+            self.set_link_state: Union[LinkStateCallback, None] = set_link_state
+            self.port: Union[Port, None] = port
+            self.encode: Callable[..., bytes] = frame_data
+            self.frame: Union[bytes, None] = None
+
+            if profiler is not None:
+                self.write = profiler.wrap(PHASE_WRITE, write_func)
+                self.send_lock = profiler.wrap_lock(send_lock)  # type: ignore
+                self.encode = profiler.wrap(PHASE_ENCODE, frame_data)
+
+                if callback is not None:
+                    self.callback = profiler.wrap(PHASE_SEND_CALLBACK, callback)
+
+            # Time of the first transmission and number of transmissions.
+            self.sent_at: float = 0.0
+            self.transmissions: int = 0
+            # Set when the frame is sent again through a new port, which
+            # does not tell anything about the losses on the link.
+            self.resumed: bool = False
+
+            self.stop_sender: Event = self.clock.event()
+            self.stop_timeout: Event = self.clock.event()
             self.next_timeout: Timeout = Timeout(0.0)
 
         def run(self) -> None:
             while not self.stop_sender.is_set():
-                self.stop_timeout.wait(max(0, self.next_timeout - time()))
+                nack_received = self.clock.wait(
+                    self.stop_timeout,
+                    max(0, self.next_timeout - self.clock.time()),
+                )
                 self.stop_timeout.clear()
 
                 if not self.stop_sender.is_set():
-                    self.next_timeout = Timeout(time() + self.timeout)
+                    if self.port is not None and not self.port.connected:
+                        # Waits for the port to be reconnected, which
+                        # resumes the sender at once.
+                        self.next_timeout = Timeout(self.clock.time() + self.timeout)
+                        continue
+
+                    if (
+                        self.max_retries is not None
+                        and self.transmissions > self.max_retries
+                    ):
+                        # The other end is gone: gives up.
+                        if self.set_link_state is not None:
+                            self.set_link_state(False)
+
+                        break
+
+                    timeout = self.timeout
+
+                    if self.tuner is not None:
+                        if self.transmissions and not self.resumed:
+                            self.tuner.frame_lost(
+                                self.clock.time(), timed_out=not nack_received
+                            )
+
+                        timeout = Timeout(self.tuner.timeout)
+
+                    self.resumed = False
+
+                    self.next_timeout = Timeout(self.clock.time() + timeout)
 
                     with self.send_lock:
                         self.__send_data()
@@ -211,6 +1129,15 @@ class HDLController:
             self.stop_timeout.set()
             super().join(timeout)
 
+        def abort(self) -> None:
+            """
+            Stops the current thread without waiting for it, as it can be
+            the calling thread.
+            """
+
+            self.stop_sender.set()
+            self.stop_timeout.set()
+
         def ack_received(self) -> None:
             """
             Informs the sender that the related ACK frame has been received.
@@ -227,15 +1154,44 @@ class HDLController:
 
             self.stop_timeout.set()
 
+        def resume(self) -> None:
+            """
+            Informs the sender that the port has been reconnected. As a
+            consequence, the data frame is being sent at once.
+            """
+
+            self.resumed = True
+            self.stop_timeout.set()
+
         def __send_data(self) -> None:
             """
             Sends a new data frame.
             """
 
+            if self.transmissions == 0:
+                self.sent_at = self.clock.time()
+                self.counters.frames_sent += 1
+            else:
+                self.counters.retransmissions += 1
+
+            self.transmissions += 1
+
             if self.callback is not None:
                 self.callback(self.data)
 
-            self.write(frame_data(self.data, FRAME_DATA, self.seq_no))
+            if self.pending_acks is None:
+                # The frame does not change between transmissions, so it is
+                # only encoded once.
+                if self.frame is None:
+                    self.frame = self.encode(self.data, FRAME_DATA, self.seq_no)
+
+                self.write(self.frame)
+            else:
+                bitmap = self.pending_acks.take()
+                self.counters.acks_piggybacked += bin(bitmap).count("1")
+                self.write(
+                    self.encode(bytes((bitmap,)) + self.data, FRAME_DATA, self.seq_no)
+                )
 
     class Receiver(Thread):
         """
@@ -248,63 +1204,123 @@ class HDLController:
             write_func: WriteFunction,
             send_lock: Lock,
             senders_list: Dict[SequenceNumber, "HDLController.Sender"],
-            frames_received: Queue,
+            frames_received: Union[Queue, FrameRing],
             callback: Union[Callback, None] = None,
             fcs_nack: bool = True,
+            clock: Union[Clock, None] = None,
+            capture: Union[CaptureWriter, None] = None,
+            profiler: Union[Profiler, None] = None,
+            window_condition: Union[Condition, None] = None,
+            counters: Union[Counters, None] = None,
+            ack_callback: Union[AckCallback, None] = None,
+            pending_acks: Union[PendingAcks, None] = None,
+            ack_delay: Timeout = Timeout(0.01),
+            receive_window: Union[int, None] = None,
+            tuner: Union[Tuner, None] = None,
+            frame_records: bool = False,
+            link: Union[LinkState, None] = None,
+            set_link_state: Union[LinkStateCallback, None] = None,
+            keepalive: Union[Timeout, None] = None,
+            max_frame_size: Union[int, None] = None,
+            xid_reply: Union[bytes, None] = None,
+            port: Union[Port, None] = None,
+            resume_port: Union[
+                Callable[[ReadFunction, WriteFunction], None], None
+            ] = None,
         ):
             super().__init__()
             self.read: ReadFunction = read_func
             self.write: WriteFunction = write_func
             self.send_lock: Lock = send_lock
             self.senders: Dict[SequenceNumber, "HDLController.Sender"] = senders_list
-            self.frames_received: Queue = frames_received
+            self.frames_received: Union[Queue, FrameRing] = frames_received
             self.callback: Union[Callback, None] = callback
             self.fcs_nack: bool = fcs_nack
-
-            self.stop_receiver: Event = Event()
+            self.clock: Clock = clock if clock is not None else Clock()
+            self.capture: Union[CaptureWriter, None] = capture
+            self.window_condition: Condition = (
+                window_condition if window_condition is not None else Condition()
+            )
+            self.counters: Counters = counters if counters is not None else Counters()
+            self.ack_callback: Union[AckCallback, None] = ack_callback
+            self.pending_acks: Union[PendingAcks, None] = pending_acks
+            self.ack_delay: Timeout = ack_delay
+            self.tuner: Union[Tuner, None] = tuner
+            self.encode: Callable[..., bytes] = frame_data
+            self.decode: Callable[[bytes], Tuple[bytes, int, int]] = get_data
+
+            if profiler is not None:
+                self.read = profiler.wrap_read(read_func)
+                self.write = profiler.wrap(PHASE_WRITE, write_func)
+                self.send_lock = profiler.wrap_lock(send_lock)  # type: ignore
+                self.encode = profiler.wrap(PHASE_ENCODE, frame_data)
+                self.decode = profiler.wrap(PHASE_DECODE, get_data)
+
+                if callback is not None:
+                    self.callback = profiler.wrap(PHASE_RECEIVE_CALLBACK, callback)
+
+            # Receive window used to recognise duplicates: sequence number of
+            # the oldest frame not received yet, and bitmap of the frames
+            # received out of order. Without receive window, the sequence
+            # number is the one following the last frame received, polled by
+            # the keepalive.
+            self.receive_window: Union[int, None] = receive_window
+            self.rx_base: int = 0
+            self.rx_received: int = 0
+
+            # Bitmap of the sequence numbers for which an NACK has been sent,
+            # only kept when frame records are enabled.
+            self.frame_records: bool = frame_records
+            self.nacked: int = 0
+
+            self.link: Union[LinkState, None] = link
+            self.set_link_state: Union[LinkStateCallback, None] = set_link_state
+            self.keepalive: Union[Timeout, None] = keepalive
+            # Set when the link goes down, as the sequence numbers of the
+            # other end may not follow the ones received before.
+            self.rx_resync: bool = False
+
+            self.scanner: FrameScanner = FrameScanner(max_frame_size)
+            self.xid_reply: Union[bytes, None] = xid_reply
+
+            self.port: Union[Port, None] = port
+            self.resume_port: Union[
+                Callable[[ReadFunction, WriteFunction], None], None
+            ] = resume_port
+            # Read and write functions of the port to reconnect to, swapped
+            # by this thread so that no data is read from the previous port
+            # once the scanning buffer has been cleared.
+            self.rx_port: Union[Tuple[ReadFunction, WriteFunction], None] = None
+
+            self.stop_receiver: Event = self.clock.event()
 
         def run(self):
             while not self.stop_receiver.is_set():
-                try:
-                    data, ftype, seq_no = get_data(self.read())
+                if self.rx_port is not None:
+                    read_func, write_func = self.rx_port
+                    self.rx_port = None
+                    self.scanner.reset()
+                    self.resume_port(read_func, write_func)  # type: ignore
+
+                for frame in self.scanner.feed(self.read()):
+                    self.__process_frame(frame)
+
+                if (
+                    self.pending_acks is not None
+                    and self.pending_acks.bitmap
+                    and self.clock.time() >= self.pending_acks.deadline
+                ):
+                    # No DATA frame has carried the acknowledgements in time.
+                    with self.send_lock:
+                        self.__send_pending_acks()
 
-                    if ftype == FRAME_DATA:
-                        with self.send_lock:
-                            if self.callback is not None:
-                                self.callback(data)
+                if self.keepalive is not None and (
+                    self.port is None or self.port.connected
+                ):
+                    self.__check_keepalive()
 
-                            self.frames_received.put_nowait(data)
-                            self.__send_ack((seq_no + 1) % HDLController.MAX_SEQ_NO)
-                    elif ftype == FRAME_ACK:
-                        seq_no_sent = (seq_no - 1) % HDLController.MAX_SEQ_NO
-                        self.senders[seq_no_sent].ack_received()
-                        del self.senders[seq_no_sent]
-                    elif ftype == FRAME_NACK:
-                        self.senders[seq_no].nack_received()
-                    else:
-                        raise TypeError("Bad frame type received")
-                except MessageError:
-                    # No HDLC frame detected.
-                    pass
-                except KeyError:
-                    # Drops bad (N)ACKs.
-                    pass
-                except Full:
-                    # Drops new data frames when the receive queue is full.
-                    pass
-                except FCSError as err:
-                    # Sends back an NACK if a corrupted frame is received and
-                    # if the FCS NACK option is enabled.
-                    if self.fcs_nack:
-                        with self.send_lock:
-                            self.__send_nack(err.args[0])
-                except TypeError:
-                    # Generally, raised when an HDLC frame with a bad frame
-                    # type is received.
-                    pass
-                finally:
-                    # 200 µs.
-                    sleep(200 / 1000000.0)
+                # 200 µs.
+                self.clock.wait(self.stop_receiver, 200 / 1000000.0)
 
         def join(self, timeout: Union[Timeout, None] = None):
             """
@@ -314,16 +1330,321 @@ class HDLController:
             self.stop_receiver.set()
             super().join(timeout)
 
+        def resync(self) -> None:
+            """
+            Makes the receive window follow the sequence numbers of the next
+            DATA frame received.
+            """
+
+            self.rx_resync = True
+
+        def reconnect(self, read_func: ReadFunction, write_func: WriteFunction) -> None:
+            """
+            Makes the receiver connect the port to new read and write
+            functions before reading again.
+            """
+
+            self.rx_port = (read_func, write_func)
+
+        def __process_frame(self, frame: bytes) -> None:
+            """
+            Decodes and handles one HDLC frame.
+            """
+
+            try:
+                data, ftype, seq_no = self.decode(frame)
+                timestamp = self.clock.time() if self.frame_records else 0.0
+
+                if self.link is not None:
+                    self.link.last_received = self.clock.time()
+
+                    if not self.link.up:
+                        self.set_link_state(True)  # type: ignore
+
+                if self.capture is not None:
+                    self.capture.record(RECORD_FRAME, data, ftype, seq_no)
+
+                if ftype == FRAME_DATA:
+                    if data == HDLController.RESET_MAGIC:
+                        # The other end has dropped the frames it had sent
+                        # before its link went down, and sends the next ones
+                        # from this sequence number.
+                        self.rx_base = seq_no
+                        self.rx_received = 0
+                        self.rx_resync = False
+                        return
+
+                    if self.xid_reply is not None and data.startswith(XID_MAGIC):
+                        xid = decode_xid(data)
+
+                        if xid is not None and not xid[1]:
+                            # The other end has not received our last
+                            # answer, and is still negotiating. Answers are
+                            # never answered, so that both ends stop.
+                            with self.send_lock:
+                                self.write(self.xid_reply)
+
+                        return
+
+                    if self.pending_acks is not None:
+                        if not data:
+                            raise TypeError("DATA frame without ACK bitmap")
+
+                        self.__acks_received(data[0])
+                        data = data[1:]
+
+                    if self.rx_resync:
+                        self.rx_resync = False
+                        self.rx_base = seq_no
+                        self.rx_received = 0
+
+                    if self.receive_window is not None and self.__is_ahead(seq_no):
+                        # The frames before have not all been received yet:
+                        # the other end sends it again once they have.
+                        return
+
+                    if self.receive_window is not None and self.__is_duplicate(seq_no):
+                        # Our ACK has been lost: acknowledges the frame again
+                        # without delivering it twice.
+                        self.counters.duplicates_received += 1
+                        self.counters.duplicate_bytes += len(data)
+
+                        with self.send_lock:
+                            self.__acknowledge(seq_no)
+
+                            if self.frame_records:
+                                self.__deliver(
+                                    FrameRecord(data, timestamp, seq_no, True, True)
+                                )
+
+                        return
+
+                    with self.send_lock:
+                        if self.frame_records:
+                            self.__deliver(
+                                FrameRecord(
+                                    data,
+                                    timestamp,
+                                    seq_no,
+                                    retransmission=self.nacked & (1 << seq_no) != 0,
+                                )
+                            )
+                            self.nacked &= ~(1 << seq_no)
+                        else:
+                            if self.callback is not None:
+                                self.callback(data)
+
+                            self.frames_received.put_nowait(data)
+
+                        self.counters.frames_received += 1
+
+                        if self.receive_window is not None:
+                            self.__mark_received(seq_no)
+                        else:
+                            self.rx_base = (seq_no + 1) % HDLController.MAX_SEQ_NO
+
+                        self.__acknowledge(seq_no)
+                elif ftype == FRAME_ACK:
+                    self.__ack_received(
+                        SequenceNumber((seq_no - 1) % HDLController.MAX_SEQ_NO)
+                    )
+                elif ftype == FRAME_NACK:
+                    self.senders[seq_no].nack_received()
+                    self.counters.nacks_received += 1
+                else:
+                    raise TypeError("Bad frame type received")
+            except MessageError:
+                # No valid HDLC frame detected. The decoder keeps its state
+                # between calls, so it must be cleared before the next frame.
+                get_data_reset()
+            except KeyError:
+                # Drops bad (N)ACKs.
+                pass
+            except Full:
+                # Drops new data frames when the receive queue or the frames
+                # ring is full.
+                pass
+            except FCSError as err:
+                # Sends back an NACK if a corrupted frame is received and
+                # if the FCS NACK option is enabled.
+                self.counters.fcs_errors += 1
+
+                if self.fcs_nack:
+                    with self.send_lock:
+                        self.__send_nack(err.args[0])
+            except TypeError:
+                # Generally, raised when an HDLC frame with a bad frame
+                # type is received.
+                pass
+
+        def __check_keepalive(self) -> None:
+            """
+            Sends a keepalive frame when nothing has been written for a while,
+            and declares the link down when nothing has been received for too
+            long.
+            """
+
+            now = self.clock.time()
+            link: LinkState = self.link  # type: ignore
+
+            if now - link.last_sent >= self.keepalive:  # type: ignore
+                # An NACK only triggers a retransmission on the other end if
+                # the frame expected next is actually waiting for its ACK.
+                with self.send_lock:
+                    self.counters.keepalives_sent += 1
+                    self.write(self.encode("", FRAME_NACK, self.rx_base))
+
+            if (
+                link.up
+                and now - link.last_received
+                >= HDLController.KEEPALIVE_MISSES * self.keepalive  # type: ignore
+            ):
+                self.set_link_state(False)  # type: ignore
+
+        def __deliver(self, frame: Union[bytes, FrameRecord]) -> None:
+            """
+            Gives a frame received to the receive callback and queues it.
+            """
+
+            if self.callback is not None:
+                self.callback(frame)  # type: ignore
+
+            self.frames_received.put_nowait(frame)
+
+        def __ack_received(self, seq_no_sent: SequenceNumber) -> None:
+            """
+            Releases the sender of an acknowledged DATA frame.
+            """
+
+            with self.window_condition:
+                sender = self.senders.pop(seq_no_sent)
+                latency = self.clock.time() - sender.sent_at
+
+                if self.tuner is not None:
+                    # The latency of a frame sent several times is ambiguous.
+                    self.tuner.ack_received(
+                        latency if sender.transmissions == 1 else None
+                    )
+
+                # The window may have grown by more than one room, or by none
+                # if older frames are still waiting for their ACK.
+                self.window_condition.notify_all()
+
+            sender.ack_received()
+            self.counters.frames_acked += 1
+
+            if self.ack_callback is not None:
+                self.ack_callback(sender.data, latency)
+
+        def __acks_received(self, bitmap: int) -> None:
+            """
+            Releases the senders of the DATA frames acknowledged by a bitmap
+            carried in a DATA frame.
+            """
+
+            seq_no = 0
+
+            while bitmap:
+                if bitmap & 1:
+                    try:
+                        self.__ack_received(SequenceNumber(seq_no))
+                    except KeyError:
+                        # Drops bad ACKs without dropping the DATA frame.
+                        pass
+
+                bitmap >>= 1
+                seq_no += 1
+
+        def __is_duplicate(self, seq_no: int) -> bool:
+            """
+            Tells whether a DATA frame has already been received.
+
+            A frame is a duplicate if it has been received out of order and
+            is still in the receive window, or if it is behind the receive
+            window.
+            """
+
+            offset = (seq_no - self.rx_base) % HDLController.MAX_SEQ_NO
+
+            return (
+                offset >= self.receive_window  # type: ignore
+                or self.rx_received & (1 << seq_no) != 0
+            )
+
+        def __is_ahead(self, seq_no: int) -> bool:
+            """
+            Tells whether a DATA frame is beyond the receive window.
+
+            Such a frame has been sent while older ones were still waiting
+            for their ACK, by an end whose sending window is larger than the
+            receive window or does not start at its oldest frame.
+            """
+
+            offset = (seq_no - self.rx_base) % HDLController.MAX_SEQ_NO
+
+            return (
+                self.receive_window  # type: ignore
+                <= offset
+                < HDLController.MAX_SEQ_NO - self.receive_window  # type: ignore
+            )
+
+        def __mark_received(self, seq_no: int) -> None:
+            """
+            Records the reception of a DATA frame and slides the receive
+            window over the frames received in sequence.
+            """
+
+            self.rx_received |= 1 << seq_no
+
+            while self.rx_received & (1 << self.rx_base):
+                self.rx_received &= ~(1 << self.rx_base)
+                self.rx_base = (self.rx_base + 1) % HDLController.MAX_SEQ_NO
+
+        def __acknowledge(self, seq_no: int) -> None:
+            """
+            Acknowledges a DATA frame, either at once or through the pending
+            acknowledgements when they are piggybacked.
+            """
+
+            if self.pending_acks is None:
+                self.__send_ack(SequenceNumber((seq_no + 1) % HDLController.MAX_SEQ_NO))
+            else:
+                if not self.pending_acks.bitmap:
+                    self.pending_acks.deadline = self.clock.time() + self.ack_delay
+
+                self.pending_acks.bitmap |= 1 << seq_no
+
+        def __send_pending_acks(self) -> None:
+            """
+            Sends a standalone ACK frame for each pending acknowledgement.
+            """
+
+            bitmap = self.pending_acks.take()  # type: ignore
+            seq_no = 0
+
+            while bitmap:
+                if bitmap & 1:
+                    self.__send_ack(
+                        SequenceNumber((seq_no + 1) % HDLController.MAX_SEQ_NO)
+                    )
+
+                bitmap >>= 1
+                seq_no += 1
+
         def __send_ack(self, seq_no: SequenceNumber):
             """
             Sends a new ACK frame.
             """
 
-            self.write(frame_data("", FRAME_ACK, seq_no))
+            self.counters.acks_sent += 1
+            self.write(self.encode("", FRAME_ACK, seq_no))
 
         def __send_nack(self, seq_no: SequenceNumber):
             """
             Sends a new NACK frame.
             """
 
-            self.write(frame_data("", FRAME_NACK, seq_no))
+            if self.frame_records:
+                self.nacked |= 1 << seq_no
+
+            self.write(self.encode("", FRAME_NACK, seq_no))
@@ -0,0 +1,305 @@
+"""
+Load generation for capacity testing.
+
+A :py:class:`LoadGenerator` drives an HDLC controller with a configurable
+offered load from several producer threads and reports the throughput, the
+ACK latency, the retransmissions and the window stalls observed.
+"""
+
+from random import Random
+from threading import Event, Lock, Thread
+from typing import Callable, List, NamedTuple, Tuple, Union
+
+from hdlcontroller.clock import Clock
+from hdlcontroller.hdlcontroller import HDLController, LinkDownError, Stats
+from hdlcontroller.profiling import Histogram
+
+ReportCallback = Callable[["LoadReport"], None]
+
+
+class LoadReport(NamedTuple):
+    """
+    Statistics of a load generator over one reporting interval.
+
+    Rates are computed over the interval, latencies are the delays between
+    the first transmission of the frames and their ACK.
+    """
+
+    elapsed: float
+    interval: float
+    frames_offered: int
+    bytes_offered: int
+    frames_acked: int
+    bytes_acked: int
+    frames_per_second: float
+    bytes_per_second: float
+    latency_p50: float
+    latency_p90: float
+    latency_p99: float
+    latency_max: float
+    retransmissions: int
+    window_stalls: int
+    window_stall_time: float
+
+
+def parse_size_range(spec: str) -> Tuple[int, int]:
+    """
+    Parses a payload size given either as ``SIZE`` or as ``MIN-MAX``.
+    """
+
+    try:
+        if "-" in spec:
+            min_size, max_size = (int(size) for size in spec.split("-", 1))
+        else:
+            min_size = max_size = int(spec)
+    except ValueError as err:
+        raise ValueError("Invalid payload size: '{0}'".format(spec)) from err
+
+    if min_size < 1 or max_size < min_size:
+        raise ValueError("Invalid payload size: '{0}'".format(spec))
+
+    return min_size, max_size
+
+
+class LoadGenerator:
+    """
+    Sends frames through an HDLC controller at a configured offered load.
+
+    The load is given either in frames per second (``rate``) or in bytes per
+    second (``byte_rate``). Without any of them, the producers send as fast
+    as the window allows, which saturates the link. The load is evenly shared
+    among the producer threads, each one sending bursts of ``burst`` frames
+    back to back.
+
+    The generator sets the ACK callback of the controller, so it has to be
+    created before starting the controller.
+
+    :param controller: HDLC controller to drive.
+    :param rate: Offered load in frames per second.
+    :param byte_rate: Offered load in payload bytes per second.
+    :param min_size: Minimum payload size in bytes.
+    :param max_size: Maximum payload size in bytes. Sizes are uniformly
+        distributed between the minimum and the maximum. The payloads too
+        large for the ``max_frame_size`` of the controller are not sent.
+    :param burst: Number of frames sent back to back.
+    :param producers: Number of producer threads.
+    :param seed: Seed of the payload generator.
+    :param clock: Clock used to pace the producers. It should be the one of
+        the controller.
+    """
+
+    def __init__(
+        self,
+        controller: HDLController,
+        rate: Union[float, None] = None,
+        byte_rate: Union[float, None] = None,
+        min_size: int = 32,
+        max_size: int = 32,
+        burst: int = 1,
+        producers: int = 1,
+        seed: Union[int, None] = None,
+        clock: Union[Clock, None] = None,
+    ):
+        if rate is not None and byte_rate is not None:
+            raise ValueError("'rate' and 'byte_rate' are mutually exclusive")
+
+        if min_size < 1 or max_size < min_size:
+            raise ValueError("Invalid payload size range")
+
+        max_data_size = HDLController.MAX_DATA_SIZE
+
+        if controller.pending_acks is not None:
+            # Leaves room for the ACK bitmap.
+            max_data_size -= 1
+
+        if max_size > max_data_size:
+            raise ValueError(
+                "Payloads cannot take more than {0} bytes".format(max_data_size)
+            )
+
+        if burst < 1 or producers < 1:
+            raise ValueError("'burst' and 'producers' must be at least 1")
+
+        self.controller: HDLController = controller
+        self.rate: Union[float, None] = rate
+        self.byte_rate: Union[float, None] = byte_rate
+        self.min_size: int = min_size
+        self.max_size: int = max_size
+        self.burst: int = burst
+        self.clock: Clock = clock if clock is not None else Clock()
+
+        rng = Random(seed)
+        # Payloads are slices of one random block, so generating them costs
+        # no more than a copy.
+        self.block: bytes = bytes(rng.getrandbits(8) for _ in range(2 * max_size))
+        self.seeds: List[int] = [rng.getrandbits(64) for _ in range(producers)]
+
+        self.lock: Lock = Lock()
+        self.latencies: Histogram = Histogram()
+        self.frames_offered: int = 0
+        self.bytes_offered: int = 0
+        self.frames_acked: int = 0
+        self.bytes_acked: int = 0
+
+        self.stop_generator: Event = self.clock.event()
+        self.producers: List[Thread] = [
+            Thread(target=self.__produce, args=(seed,), daemon=True)
+            for seed in self.seeds
+        ]
+
+        self.started_at: float = 0.0
+        self.last_report_at: float = 0.0
+        self.last_stats: Stats = controller.get_stats()
+
+        controller.set_ack_callback(self.__ack_received)
+
+    def start(self) -> None:
+        """
+        Starts the producer threads.
+        """
+
+        self.started_at = self.last_report_at = self.clock.time()
+        self.last_stats = self.controller.get_stats()
+
+        for producer in self.producers:
+            producer.start()
+
+    def stop(self, timeout: Union[float, None] = None) -> None:
+        """
+        Stops the producer threads.
+
+        A producer blocked by a full window only stops once the window has
+        room again, so a timeout can be given to wait for each producer.
+        """
+
+        self.stop_generator.set()
+
+        for producer in self.producers:
+            producer.join(timeout)
+
+    def report(self) -> LoadReport:
+        """
+        Returns the statistics since the previous report and starts a new
+        reporting interval.
+        """
+
+        now = self.clock.time()
+        stats = self.controller.get_stats()
+
+        with self.lock:
+            latencies = self.latencies.get_stats()
+            report = LoadReport(
+                now - self.started_at,
+                now - self.last_report_at,
+                self.frames_offered,
+                self.bytes_offered,
+                self.frames_acked,
+                self.bytes_acked,
+                0.0,
+                0.0,
+                latencies.p50 / 1e9,
+                latencies.p90 / 1e9,
+                latencies.p99 / 1e9,
+                latencies.maximum / 1e9,
+                stats.retransmissions - self.last_stats.retransmissions,
+                stats.window_stalls - self.last_stats.window_stalls,
+                stats.window_stall_time - self.last_stats.window_stall_time,
+            )
+
+            self.latencies = Histogram()
+            self.frames_offered = self.bytes_offered = 0
+            self.frames_acked = self.bytes_acked = 0
+
+        self.last_report_at = now
+        self.last_stats = stats
+
+        if report.interval > 0:
+            report = report._replace(
+                frames_per_second=report.frames_acked / report.interval,
+                bytes_per_second=report.bytes_acked / report.interval,
+            )
+
+        return report
+
+    def run(
+        self,
+        duration: Union[float, None] = None,
+        interval: float = 1.0,
+        callback: Union[ReportCallback, None] = None,
+    ) -> None:
+        """
+        Runs the load for the given duration, or until interrupted, and
+        calls ``callback`` with a new report at every interval.
+        """
+
+        self.start()
+
+        try:
+            deadline = None if duration is None else self.started_at + duration
+
+            while deadline is None or self.clock.time() < deadline:
+                wait = interval
+
+                if deadline is not None:
+                    wait = min(wait, deadline - self.clock.time())
+
+                self.clock.sleep(wait)
+                report = self.report()
+
+                if callback is not None:
+                    callback(report)
+        finally:
+            self.stop(timeout=1.0)
+
+    def __produce(self, seed: int) -> None:
+        """
+        Sends bursts of frames at the rate of one producer.
+        """
+
+        rng = Random(seed)
+        nb_producers = len(self.producers)
+        next_burst = self.clock.time()
+
+        while not self.stop_generator.is_set():
+            burst_size = 0
+
+            for _ in range(self.burst):
+                size = rng.randint(self.min_size, self.max_size)
+                offset = rng.randint(0, len(self.block) - size)
+
+                try:
+                    self.controller.send(self.block[offset : offset + size])
+                except LinkDownError:
+                    # Nothing is offered while the link is down.
+                    self.clock.wait(
+                        self.stop_generator, self.controller.get_sending_timeout()
+                    )
+                    break
+                except ValueError:
+                    # Too large for the frames of the link, and counted by
+                    # the controller.
+                    continue
+
+                burst_size += size
+
+                with self.lock:
+                    self.frames_offered += 1
+                    self.bytes_offered += size
+
+            if self.rate is not None:
+                next_burst += self.burst * nb_producers / self.rate
+            elif self.byte_rate is not None:
+                next_burst += burst_size * nb_producers / self.byte_rate
+            else:
+                continue
+
+            delay = next_burst - self.clock.time()
+
+            if delay > 0:
+                self.clock.wait(self.stop_generator, delay)
+
+    def __ack_received(self, data: bytes, latency: float) -> None:
+        with self.lock:
+            self.latencies.add(int(latency * 1e9))
+            self.frames_acked += 1
+            self.bytes_acked += len(data)
@@ -0,0 +1,644 @@
+"""
+Multi-drop links with poll/select scheduling.
+
+On a shared bus such as an RS-485 line, one primary station exchanges frames
+with several secondary stations. The primary controls the access to the bus:
+at each turn, it selects a secondary by sending it its pending frames, the
+last one carrying the poll bit, and the secondary answers with its own
+pending frames, the last one carrying the final bit. A secondary never
+transmits without being polled.
+
+python4yahdlc always sets the address field of the frames to 0xFF and only
+exposes the sequence number of their control field, so the multi-drop
+address and control fields are carried in the first two bytes of the payload
+of yahdlc DATA frames:
+
+* byte 0: address of the secondary station, in both directions;
+* byte 1: ``N(R)`` in bits 0 to 2, the poll/final bit in bit 3, and bit 4 set
+  for information frames, whose ``N(S)`` is the yahdlc sequence number.
+
+Acknowledgements are cumulative and lost frames are sent again from the first
+one not acknowledged (go-back-N) at the next turn of their station, so the
+only timer is the response timeout of the primary.
+"""
+
+from abc import ABC, abstractmethod
+from collections import deque
+from heapq import heappop, heappush
+from queue import Full, Queue
+from threading import Condition, Event, Thread
+from typing import Callable, Deque, Dict, Iterable, List, NamedTuple, Tuple, Union
+
+from yahdlc import (
+    FRAME_DATA,
+    FCSError,
+    MessageError,
+    frame_data,
+    get_data,
+    get_data_reset,
+)
+
+from hdlcontroller.clock import Clock
+from hdlcontroller.framing import FrameScanner
+from hdlcontroller.hdlcontroller import HDLController, ReadFunction, WriteFunction
+
+# Sequence number of the next information frame expected.
+CONTROL_NR_MASK = 0x07
+# Poll bit in the frames of the primary, final bit in the ones of a secondary.
+CONTROL_POLL_FINAL = 0x08
+# Information frame, as opposed to a Receive Ready one.
+CONTROL_INFO = 0x10
+
+MAX_ADDRESS = 0xFE
+# The address and the control field take the first two bytes of the payload.
+MAX_DATA_SIZE = HDLController.MAX_DATA_SIZE - 2
+
+ReceiveCallback = Callable[[int, bytes], None]
+BusFrame = Tuple[int, int, int, bytes]
+
+
+class LinkStats(NamedTuple):
+    """
+    Counters of the link between the primary and one secondary station.
+    """
+
+    polls: int
+    idle_polls: int
+    timeouts: int
+    frames_sent: int
+    retransmissions: int
+    frames_acked: int
+    frames_received: int
+    out_of_sequence: int
+
+
+class LinkCounters:
+    """
+    Mutable counters of a link.
+    """
+
+    __slots__ = LinkStats._fields
+
+    def __init__(self):
+        for field in self.__slots__:
+            setattr(self, field, 0)
+
+    def snapshot(self) -> LinkStats:
+        """
+        Returns the current value of the counters.
+        """
+
+        return LinkStats(*(getattr(self, field) for field in self.__slots__))
+
+
+class Link:
+    """
+    Sequence state of the link between the primary and one secondary
+    station, as seen from one of them.
+
+    It is protected by the condition of the station.
+    """
+
+    __slots__ = (
+        "address",
+        "window",
+        "outgoing",
+        "tx_base",
+        "transmitted",
+        "rx_next",
+        "counters",
+        "idle_polls",
+        "order",
+    )
+
+    def __init__(self, address: int, window: int):
+        self.address: int = address
+        self.window: int = window
+        # Frames not acknowledged yet, the first one having the sequence
+        # number tx_base, and number of them already transmitted once.
+        self.outgoing: Deque[bytes] = deque()
+        self.tx_base: int = 0
+        self.transmitted: int = 0
+        # Sequence number of the next information frame expected.
+        self.rx_next: int = 0
+        self.counters: LinkCounters = LinkCounters()
+        # Scheduling state, only used by the primary station: number of
+        # turns in a row without any traffic, and order of the valid entry
+        # of the link in the schedule.
+        self.idle_polls: int = 0
+        self.order: int = 0
+
+    def encode(self) -> bytes:
+        """
+        Encodes all the outgoing frames, the last one carrying the
+        poll/final bit, or a Receive Ready frame if there are none.
+        """
+
+        control = self.rx_next
+
+        if not self.outgoing:
+            return frame_data(
+                bytes((self.address, control | CONTROL_POLL_FINAL)), FRAME_DATA, 0
+            )
+
+        last = len(self.outgoing) - 1
+        frames = []
+
+        for index, data in enumerate(self.outgoing):
+            frame_control = control | CONTROL_INFO
+
+            if index == last:
+                frame_control |= CONTROL_POLL_FINAL
+
+            frames.append(
+                frame_data(
+                    bytes((self.address, frame_control)) + data,
+                    FRAME_DATA,
+                    (self.tx_base + index) % HDLController.MAX_SEQ_NO,
+                )
+            )
+
+        self.counters.frames_sent += len(self.outgoing) - self.transmitted
+        self.counters.retransmissions += self.transmitted
+        self.transmitted = len(self.outgoing)
+
+        return b"".join(frames)
+
+    def acknowledge(self, rx_next: int) -> int:
+        """
+        Releases the outgoing frames acknowledged by the ``N(R)`` of a
+        received frame, and returns their number.
+        """
+
+        nb_acked = (rx_next - self.tx_base) % HDLController.MAX_SEQ_NO
+
+        if nb_acked > len(self.outgoing):
+            # Bad N(R).
+            return 0
+
+        for _ in range(nb_acked):
+            self.outgoing.popleft()
+
+        self.tx_base = rx_next
+        self.transmitted = max(0, self.transmitted - nb_acked)
+        self.counters.frames_acked += nb_acked
+
+        return nb_acked
+
+
+class Station(ABC):
+    """
+    Common part of the primary and secondary stations of a multi-drop link.
+
+    Frames received in sequence are delivered to the receive callback and to
+    the queue read by :py:meth:`get_data`, along with the address of the
+    secondary station. When the queue is full, the frames are not
+    acknowledged and are sent again later.
+    """
+
+    def __init__(
+        self,
+        read_func: ReadFunction,
+        write_func: WriteFunction,
+        frames_queue_size: int = 0,
+        clock: Union[Clock, None] = None,
+    ):
+        if not callable(read_func):
+            raise TypeError("'read_func' is not callable")
+
+        if not callable(write_func):
+            raise TypeError("'write_func' is not callable")
+
+        self.read: ReadFunction = read_func
+        self.write: WriteFunction = write_func
+        self.clock: Clock = clock if clock is not None else Clock()
+
+        # Protects the links, and is notified when outgoing frames are
+        # acknowledged.
+        self.condition: Condition = Condition()
+        self.frames_received: Queue = Queue(maxsize=frames_queue_size)
+        self.callback: Union[ReceiveCallback, None] = None
+        self.fcs_errors: int = 0
+
+        self.scanner: FrameScanner = FrameScanner()
+        self.stop_station: Event = self.clock.event()
+        self.thread: Union[Thread, None] = None
+
+    def start(self) -> None:
+        """
+        Starts the station's thread.
+        """
+
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        """
+        Stops the station's thread.
+        """
+
+        self.stop_station.set()
+
+        if self.thread is not None:
+            self.thread.join()
+
+    def set_receive_callback(self, callback: ReceiveCallback) -> None:
+        """
+        Sets the receive callback function, called with the address of the
+        secondary station and the data of each frame received.
+
+        This method has to be called before starting the station.
+        """
+
+        if not callable(callback):
+            raise TypeError("'callback' is not callable")
+
+        self.callback = callback
+
+    def get_data(self) -> Tuple[int, bytes]:
+        """
+        Gets the address of the secondary station and the data of the next
+        frame received.
+
+        This method will block until a new frame is available.
+        """
+
+        return self.frames_received.get()
+
+    @abstractmethod
+    def run(self) -> None:
+        """
+        Runs the station until it is stopped.
+        """
+
+    def _queue(self, link: Link, data: bytes) -> None:
+        """
+        Queues a frame on a link, blocking while its window is full.
+        """
+
+        if len(data) > MAX_DATA_SIZE:
+            raise ValueError(
+                "The payload takes {0} bytes, more than {1}".format(
+                    len(data), MAX_DATA_SIZE
+                )
+            )
+
+        with self.condition:
+            self.condition.wait_for(lambda: len(link.outgoing) < link.window)
+            link.outgoing.append(data)
+
+    def _read_frames(self) -> List[BusFrame]:
+        """
+        Reads the bus and returns the address, the control field, the
+        sequence number and the data of the frames received.
+        """
+
+        frames = []
+
+        for frame in self.scanner.feed(self.read()):
+            try:
+                data, ftype, seq_no = get_data(frame)
+            except MessageError:
+                get_data_reset()
+                continue
+            except FCSError:
+                # The frame will be sent again from the next turn on.
+                self.fcs_errors += 1
+                continue
+
+            if ftype == FRAME_DATA and len(data) >= 2:
+                frames.append((data[0], data[1], seq_no, data[2:]))
+
+        return frames
+
+    def _process_frame(
+        self, link: Link, control: int, seq_no: int, data: bytes
+    ) -> bool:
+        """
+        Handles the acknowledgements and the data of a frame received on a
+        link, and returns whether it is an information frame.
+        """
+
+        with self.condition:
+            if link.acknowledge(control & CONTROL_NR_MASK):
+                self.condition.notify_all()
+
+        if not control & CONTROL_INFO:
+            return False
+
+        if seq_no != link.rx_next:
+            link.counters.out_of_sequence += 1
+            return True
+
+        try:
+            self.frames_received.put_nowait((link.address, data))
+        except Full:
+            return True
+
+        link.rx_next = (link.rx_next + 1) % HDLController.MAX_SEQ_NO
+        link.counters.frames_received += 1
+
+        if self.callback is not None:
+            self.callback(link.address, data)
+
+        return True
+
+
+class PrimaryStation(Station):
+    """
+    Primary station of a multi-drop link, polling several secondary stations
+    over one pair of read and write functions.
+
+    Each secondary station has its own sequence numbers and window. The
+    scheduler gives the turns to the stations with some traffic first, in a
+    round-robin fashion. A station whose turn brings no traffic, or which
+    does not answer within ``response_timeout`` seconds, is polled again
+    after ``poll_interval`` seconds, then after twice as long for each
+    further idle turn, up to ``max_poll_interval`` seconds. Sending a frame
+    to an idle station makes it eligible for the next turn at once.
+
+    :param read_func: Function reading from the bus.
+    :param write_func: Function writing to the bus.
+    :param addresses: Addresses of the secondary stations, between 0 and
+        254.
+    :param window: Sending window towards each secondary station.
+    :param response_timeout: Maximum time in seconds to wait for the final
+        frame of a secondary station. It must cover the transmission time of
+        a full window of frames at the bus rate.
+    :param poll_interval: Delay before polling again an idle station.
+    :param max_poll_interval: Maximum delay between two polls of a station.
+    :param frames_queue_size: Queue size for the frames received.
+    :param clock: Clock used for the timers.
+    """
+
+    def __init__(
+        self,
+        read_func: ReadFunction,
+        write_func: WriteFunction,
+        addresses: Iterable[int],
+        window: int = 3,
+        response_timeout: float = 0.05,
+        poll_interval: float = 0.01,
+        max_poll_interval: float = 1.0,
+        frames_queue_size: int = 0,
+        clock: Union[Clock, None] = None,
+    ):
+        super().__init__(read_func, write_func, frames_queue_size, clock)
+
+        addresses = list(addresses)
+
+        if not addresses:
+            raise ValueError("At least one secondary station is needed")
+
+        if len(set(addresses)) != len(addresses) or not all(
+            0 <= address <= MAX_ADDRESS for address in addresses
+        ):
+            raise ValueError(
+                "Addresses must be unique and between 0 and {0}".format(MAX_ADDRESS)
+            )
+
+        if not 1 <= window < HDLController.MAX_SEQ_NO:
+            raise ValueError(
+                "'window' must be between 1 and {0}".format(
+                    HDLController.MAX_SEQ_NO - 1
+                )
+            )
+
+        self.links: Dict[int, Link] = {
+            address: Link(address, window) for address in addresses
+        }
+        self.response_timeout: float = response_timeout
+        self.poll_interval: float = poll_interval
+        self.max_poll_interval: float = max_poll_interval
+
+        # Turns to come, as (due time, order, address) entries. An entry is
+        # stale when its order is not the one of its link anymore.
+        self.schedule: List[Tuple[float, int, int]] = []
+        self.next_order: int = 0
+        self.wakeup: Event = self.clock.event()
+
+        for link in self.links.values():
+            self.__schedule(link, 0.0)
+
+    def stop(self) -> None:
+        self.wakeup.set()
+        super().stop()
+
+    def send(self, address: int, data: bytes) -> None:
+        """
+        Sends a new frame to a secondary station.
+
+        This method will block until a room is available in the window of
+        the station. It can be called from several threads at once. It
+        raises :py:exc:`ValueError` if the payload is larger than
+        ``MAX_DATA_SIZE``.
+        """
+
+        link = self.links.get(address)
+
+        if link is None:
+            raise ValueError("Unknown station address: {0}".format(address))
+
+        self._queue(link, data)
+
+        with self.condition:
+            if link.idle_polls:
+                link.idle_polls = 0
+                self.__schedule(link, self.clock.time())
+                self.wakeup.set()
+
+    def get_stats(self, address: Union[int, None] = None) -> LinkStats:
+        """
+        Returns the counters of the link with a secondary station, or their
+        sum over all the stations if no address is given.
+        """
+
+        if address is not None:
+            return self.links[address].counters.snapshot()
+
+        return LinkStats(
+            *(
+                sum(fields)
+                for fields in zip(
+                    *(link.counters.snapshot() for link in self.links.values())
+                )
+            )
+        )
+
+    def run(self) -> None:
+        while not self.stop_station.is_set():
+            link = self.__next_link()
+
+            if link is not None:
+                self.__poll(link)
+
+    def __schedule(self, link: Link, due: float) -> None:
+        """
+        Schedules the next turn of a station and invalidates the previous
+        one.
+        """
+
+        self.next_order += 1
+        link.order = self.next_order
+        heappush(self.schedule, (due, link.order, link.address))
+
+    def __next_link(self) -> Union[Link, None]:
+        """
+        Returns the link whose turn has come, or waits for the next turn and
+        returns ``None``.
+        """
+
+        with self.condition:
+            while True:
+                due, order, address = self.schedule[0]
+                link = self.links[address]
+
+                if order == link.order:
+                    break
+
+                heappop(self.schedule)
+
+            delay = due - self.clock.time()
+
+            if delay <= 0:
+                heappop(self.schedule)
+                return link
+
+        self.clock.wait(self.wakeup, delay)
+        self.wakeup.clear()
+
+        return None
+
+    def __poll(self, link: Link) -> None:
+        """
+        Selects a secondary station with its pending frames, polls it and
+        handles its answer.
+        """
+
+        with self.condition:
+            frames = link.encode()
+            link.counters.polls += 1
+
+        self.write(frames)
+
+        deadline = self.clock.time() + self.response_timeout
+        traffic = False
+        final = False
+
+        while not final and not self.stop_station.is_set():
+            for address, control, seq_no, data in self._read_frames():
+                if address != link.address:
+                    # Late answer of a station whose turn is over.
+                    continue
+
+                traffic |= self._process_frame(link, control, seq_no, data)
+
+                if control & CONTROL_POLL_FINAL:
+                    final = True
+                    break
+
+            if not final:
+                if self.clock.time() >= deadline:
+                    break
+
+                # 200 µs.
+                self.clock.wait(self.stop_station, 200 / 1000000.0)
+
+        with self.condition:
+            if not final:
+                link.counters.timeouts += 1
+            elif not traffic:
+                link.counters.idle_polls += 1
+
+            if final and (traffic or link.outgoing):
+                link.idle_polls = 0
+                self.__schedule(link, self.clock.time())
+            else:
+                link.idle_polls += 1
+                self.__schedule(
+                    link,
+                    self.clock.time()
+                    + min(
+                        self.poll_interval * 2 ** min(link.idle_polls - 1, 16),
+                        self.max_poll_interval,
+                    ),
+                )
+
+
+class SecondaryStation(Station):
+    """
+    Secondary station of a multi-drop link, answering the polls of the
+    primary station addressed to it.
+
+    :param read_func: Function reading from the bus.
+    :param write_func: Function writing to the bus.
+    :param address: Address of the station, between 0 and 254.
+    :param window: Sending window towards the primary station.
+    :param frames_queue_size: Queue size for the frames received.
+    :param clock: Clock used for the timers.
+    """
+
+    def __init__(
+        self,
+        read_func: ReadFunction,
+        write_func: WriteFunction,
+        address: int,
+        window: int = 3,
+        frames_queue_size: int = 0,
+        clock: Union[Clock, None] = None,
+    ):
+        super().__init__(read_func, write_func, frames_queue_size, clock)
+
+        if not 0 <= address <= MAX_ADDRESS:
+            raise ValueError("'address' must be between 0 and {0}".format(MAX_ADDRESS))
+
+        if not 1 <= window < HDLController.MAX_SEQ_NO:
+            raise ValueError(
+                "'window' must be between 1 and {0}".format(
+                    HDLController.MAX_SEQ_NO - 1
+                )
+            )
+
+        self.link: Link = Link(address, window)
+
+    def send(self, data: bytes) -> None:
+        """
+        Queues a new frame, sent to the primary station at the next poll.
+
+        This method will block until a room is available in the window. It
+        can be called from several threads at once. It raises
+        :py:exc:`ValueError` if the payload is larger than ``MAX_DATA_SIZE``.
+        """
+
+        self._queue(self.link, data)
+
+    def get_stats(self) -> LinkStats:
+        """
+        Returns the counters of the link with the primary station.
+        """
+
+        return self.link.counters.snapshot()
+
+    def run(self) -> None:
+        link = self.link
+
+        while not self.stop_station.is_set():
+            for address, control, seq_no, data in self._read_frames():
+                if address != link.address:
+                    continue
+
+                self._process_frame(link, control, seq_no, data)
+
+                if control & CONTROL_POLL_FINAL:
+                    with self.condition:
+                        link.counters.polls += 1
+
+                        if not link.outgoing:
+                            link.counters.idle_polls += 1
+
+                        frames = link.encode()
+
+                    self.write(frames)
+
+            # 200 µs.
+            self.clock.wait(self.stop_station, 200 / 1000000.0)
@@ -0,0 +1,108 @@
+"""
+Link parameter negotiation.
+
+When both ends of a link enable it, the HDLC controllers exchange their
+capabilities when started, in the spirit of the XID frames of HDLC, and
+settle on the best parameters they both support: the largest window and
+frame size accepted by both ends, and the optional features enabled on both
+sides.
+
+python4yahdlc only exposes DATA, ACK and NACK frames, and drops the payload
+of the latter two, so the capabilities are carried in DATA frames whose
+payload starts with ``XID_MAGIC``. Such frames are never acknowledged nor
+delivered, which means that the application payloads must not start with
+these bytes on a negotiated link.
+
+Each end sends its capabilities at regular intervals, and answers each time
+it receives the ones of the other end, flagging its answer with
+``FLAG_RECEIVED``. It is done once it receives an answer, which it answers
+in turn if it has not answered yet. Answers are never answered otherwise,
+so both ends stop sending capabilities once done. The last answer can be
+lost: the other end then sends its capabilities again, and they are answered
+once the controller is running.
+"""
+
+from struct import Struct
+from typing import NamedTuple, Tuple, Union
+
+XID_MAGIC = b"\xffXID"
+# Magic, flags, window, features and maximum frame size.
+XID = Struct(">4sBBBH")
+
+# Set when the capabilities of the other end have been received.
+FLAG_RECEIVED = 0x01
+
+FEATURE_PIGGYBACK_ACKS = 0x01
+
+# A maximum frame size of zero means that the frame size is not limited.
+NO_MAX_FRAME_SIZE = 0
+
+
+class Capabilities(NamedTuple):
+    """
+    Parameters supported by one end of a link, or settled by both ends.
+    """
+
+    window: int
+    features: int
+    max_frame_size: Union[int, None]
+
+
+def encode_xid(capabilities: Capabilities, received: bool) -> bytes:
+    """
+    Returns the payload announcing the capabilities of a controller, which
+    tells whether the capabilities of the other end have been received.
+    """
+
+    return XID.pack(
+        XID_MAGIC,
+        FLAG_RECEIVED if received else 0,
+        capabilities.window,
+        capabilities.features,
+        (
+            capabilities.max_frame_size
+            if capabilities.max_frame_size is not None
+            else NO_MAX_FRAME_SIZE
+        ),
+    )
+
+
+def decode_xid(data: bytes) -> Union[Tuple[Capabilities, bool], None]:
+    """
+    Returns the capabilities announced by the other end and whether it has
+    received ours, or ``None`` if the payload does not announce
+    capabilities.
+    """
+
+    if len(data) != XID.size or not data.startswith(XID_MAGIC):
+        return None
+
+    _, flags, window, features, max_frame_size = XID.unpack(data)
+
+    return (
+        Capabilities(
+            window,
+            features,
+            max_frame_size if max_frame_size != NO_MAX_FRAME_SIZE else None,
+        ),
+        flags & FLAG_RECEIVED != 0,
+    )
+
+
+def settle(own: Capabilities, other: Capabilities) -> Capabilities:
+    """
+    Returns the best parameters supported by both ends.
+    """
+
+    if own.max_frame_size is None:
+        max_frame_size = other.max_frame_size
+    elif other.max_frame_size is None:
+        max_frame_size = own.max_frame_size
+    else:
+        max_frame_size = min(own.max_frame_size, other.max_frame_size)
+
+    return Capabilities(
+        max(min(own.window, other.window), 1),
+        own.features & other.features,
+        max_frame_size,
+    )
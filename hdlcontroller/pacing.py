@@ -0,0 +1,163 @@
+"""
+Transmit pacing.
+
+A :py:class:`Pacer` smooths the output of an HDLC controller to the rate at
+which the link can drain it. The senders and the receiver write whenever
+they need to, so several frames can reach the write function back to back
+and overrun the small buffers of USB-serial adapters or microcontrollers.
+The pacer delays the writes with a token bucket: the bucket fills at the
+byte rate of the link, up to ``burst`` bytes, and a frame is written once
+the bucket holds enough tokens for it.
+"""
+
+from threading import Lock
+from typing import Callable, NamedTuple, Union
+
+from hdlcontroller.clock import Clock
+from hdlcontroller.profiling import Histogram
+
+WriteFunction = Callable[[bytes], Union[int, None]]
+
+
+class PacerStats(NamedTuple):
+    """
+    Counters of a pacer. Waiting times are in seconds, and percentiles are
+    upper bounds.
+    """
+
+    writes: int
+    bytes_written: int
+    delayed_writes: int
+    wait_time: float
+    wait_p50: float
+    wait_p99: float
+    wait_max: float
+
+
+class Pacer:
+    """
+    Token bucket pacing the writes of an HDLC controller.
+
+    The rate is given either in bytes per second (``byte_rate``) or as the
+    baud rate of a UART (``baudrate``), in which case each byte takes
+    ``bits_per_byte`` bits on the line: 10 for 8N1 framing.
+
+    Frames larger than the bucket are written once the bucket is full, and
+    the next ones wait until the bucket has refilled.
+
+    :param byte_rate: Output rate in bytes per second.
+    :param baudrate: Baud rate of the link.
+    :param bits_per_byte: Number of bits sent on the line for each byte.
+    :param burst: Size of the bucket in bytes, that is the largest amount of
+        data written back to back. It should not exceed the buffer of the
+        other end.
+    :param clock: Clock used to wait. It should be the one of the
+        controller.
+    """
+
+    def __init__(
+        self,
+        byte_rate: Union[float, None] = None,
+        baudrate: Union[int, None] = None,
+        bits_per_byte: int = 10,
+        burst: int = 16,
+        clock: Union[Clock, None] = None,
+    ):
+        if (byte_rate is None) == (baudrate is None):
+            raise ValueError("Either 'byte_rate' or 'baudrate' must be given")
+
+        if byte_rate is None:
+            byte_rate = baudrate / bits_per_byte  # type: ignore
+
+        if byte_rate <= 0:
+            raise ValueError("The rate must be positive")
+
+        if burst < 1:
+            raise ValueError("'burst' must be at least 1")
+
+        self.byte_rate: float = byte_rate
+        self.burst: int = burst
+        self.clock: Clock = clock if clock is not None else Clock()
+
+        # Protects the bucket. It is held while waiting, so the frames are
+        # written in the order they have been given to the pacer.
+        self.lock: Lock = Lock()
+        self.tokens: float = float(burst)
+        self.updated_at: Union[float, None] = None
+
+        self.writes: int = 0
+        self.bytes_written: int = 0
+        self.delayed_writes: int = 0
+        self.waits: Histogram = Histogram()
+
+    def wrap(self, write_func: WriteFunction) -> WriteFunction:
+        """
+        Returns a write function pacing the calls to ``write_func``.
+        """
+
+        pace = self.pace
+
+        def write(data: bytes) -> Union[int, None]:
+            pace(len(data))
+
+            return write_func(data)
+
+        return write
+
+    def pace(self, size: int) -> float:
+        """
+        Blocks until ``size`` bytes can be written, and returns the time
+        waited in seconds.
+        """
+
+        with self.lock:
+            self.__refill()
+
+            needed = min(size, self.burst)
+            wait = 0.0
+
+            if self.tokens < needed:
+                wait = (needed - self.tokens) / self.byte_rate
+                self.clock.sleep(wait)
+                self.__refill()
+                self.delayed_writes += 1
+
+            self.tokens -= size
+            self.writes += 1
+            self.bytes_written += size
+            self.waits.add(int(wait * 1e9))
+
+            return wait
+
+    def get_stats(self) -> PacerStats:
+        """
+        Returns the counters of the pacer.
+        """
+
+        with self.lock:
+            waits = self.waits.get_stats()
+
+            return PacerStats(
+                self.writes,
+                self.bytes_written,
+                self.delayed_writes,
+                waits.total / 1e9,
+                waits.p50 / 1e9,
+                waits.p99 / 1e9,
+                waits.maximum / 1e9,
+            )
+
+    def __refill(self) -> None:
+        """
+        Adds the tokens earned since the last update.
+        """
+
+        now = self.clock.time()
+
+        if self.updated_at is not None:
+            self.tokens = min(
+                float(self.burst),
+                self.tokens + (now - self.updated_at) * self.byte_rate,
+            )
+
+        self.updated_at = now
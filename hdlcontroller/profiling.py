@@ -0,0 +1,305 @@
+"""
+Profiling of the hot paths of the HDLC controller.
+
+When a :py:class:`Profiler` is given to the controller, the duration of each
+phase of the send and receive paths is measured with
+:py:func:`time.perf_counter_ns` and aggregated into per-phase histograms.
+The measurements are done by wrapping the functions and the lock used by
+the senders and the receiver when they are created, so the hot paths are
+left untouched when no profiler is given.
+"""
+
+import json
+from collections import deque
+from os import getpid
+from threading import Lock, get_ident
+from time import perf_counter_ns
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    NamedTuple,
+    TextIO,
+    Tuple,
+    TypeVar,
+    Union,
+)
+
+# Waiting for the lock shared by the senders and the receiver.
+PHASE_LOCK_WAIT = "lock_wait"
+# Running the send callback.
+PHASE_SEND_CALLBACK = "send_callback"
+# Encoding a frame with frame_data.
+PHASE_ENCODE = "encode"
+# Running the write function.
+PHASE_WRITE = "write"
+# Running the read function, when it returns some data.
+PHASE_READ = "read"
+# Decoding a frame with get_data.
+PHASE_DECODE = "decode"
+# Running the receive callback.
+PHASE_RECEIVE_CALLBACK = "receive_callback"
+
+TraceEvent = Tuple[str, int, int, int]
+
+Function = TypeVar("Function", bound=Callable[..., Any])
+
+
+class PhaseStats(NamedTuple):
+    """
+    Summary of the durations of a phase, in nanoseconds.
+
+    Percentiles are upper bounds given by the power-of-two buckets of the
+    histogram.
+    """
+
+    count: int
+    total: int
+    minimum: int
+    maximum: int
+    p50: int
+    p90: int
+    p99: int
+
+    @property
+    def mean(self) -> float:
+        """
+        Mean duration in nanoseconds.
+        """
+
+        return self.total / self.count if self.count else 0.0
+
+
+class Histogram:
+    """
+    Histogram of durations in nanoseconds with power-of-two buckets.
+
+    Bucket ``i`` counts the durations whose bit length is ``i``, that is the
+    ones in ``[2 ** (i - 1), 2 ** i)``.
+    """
+
+    BUCKETS = 64
+
+    def __init__(self):
+        self.buckets: List[int] = [0] * Histogram.BUCKETS
+        self.count: int = 0
+        self.total: int = 0
+        self.minimum: int = 0
+        self.maximum: int = 0
+
+    def add(self, duration: int) -> None:
+        """
+        Adds a duration to the histogram.
+        """
+
+        self.buckets[min(duration.bit_length(), Histogram.BUCKETS - 1)] += 1
+
+        if self.count == 0 or duration < self.minimum:
+            self.minimum = duration
+
+        if duration > self.maximum:
+            self.maximum = duration
+
+        self.count += 1
+        self.total += duration
+
+    def percentile(self, percent: float) -> int:
+        """
+        Returns an upper bound of the given percentile.
+        """
+
+        if self.count == 0:
+            return 0
+
+        threshold = self.count * percent / 100.0
+        cumulated = 0
+
+        for index, nb_durations in enumerate(self.buckets):
+            cumulated += nb_durations
+
+            if cumulated >= threshold:
+                return min((1 << index) - 1, self.maximum)
+
+        return self.maximum
+
+    def get_stats(self) -> PhaseStats:
+        """
+        Returns a summary of the histogram.
+        """
+
+        return PhaseStats(
+            self.count,
+            self.total,
+            self.minimum,
+            self.maximum,
+            self.percentile(50),
+            self.percentile(90),
+            self.percentile(99),
+        )
+
+
+class Profiler:
+    """
+    Collects the durations of the phases of the send and receive paths.
+
+    :param trace: Whether to also keep each measurement as a trace event, to
+        be exported with :py:meth:`write_trace`.
+    :param max_events: Maximum number of trace events kept in memory. The
+        oldest ones are dropped first.
+    """
+
+    def __init__(self, trace: bool = False, max_events: int = 100000):
+        self.trace: bool = trace
+        self.histograms: Dict[str, Histogram] = {}
+        self.events: Deque[TraceEvent] = deque(maxlen=max_events)
+        self.lock: Lock = Lock()
+
+    def record(self, phase: str, start: int, end: int) -> None:
+        """
+        Records one measurement of a phase, with start and end times given
+        by :py:func:`time.perf_counter_ns`.
+        """
+
+        with self.lock:
+            histogram = self.histograms.get(phase)
+
+            if histogram is None:
+                histogram = self.histograms[phase] = Histogram()
+
+            histogram.add(end - start)
+
+        if self.trace:
+            self.events.append((phase, get_ident(), start, end))
+
+    def wrap(self, phase: str, func: Function) -> Function:
+        """
+        Returns a function measuring each call to ``func`` as the given phase.
+        """
+
+        record = self.record
+
+        def timed(*args):
+            start = perf_counter_ns()
+
+            try:
+                return func(*args)
+            finally:
+                record(phase, start, perf_counter_ns())
+
+        return timed  # type: ignore
+
+    def wrap_read(self, read_func: Callable[[], bytes]) -> Callable[[], bytes]:
+        """
+        Returns a read function measuring the calls to ``read_func`` which
+        return some data.
+
+        Empty reads are the receiver polling an idle link and are not
+        recorded.
+        """
+
+        record = self.record
+
+        def timed() -> bytes:
+            start = perf_counter_ns()
+            data = read_func()
+
+            if data:
+                record(PHASE_READ, start, perf_counter_ns())
+
+            return data
+
+        return timed
+
+    def wrap_lock(self, lock: Lock) -> "Profiler.TimedLock":
+        """
+        Returns a lock measuring the time spent waiting to acquire ``lock``.
+        """
+
+        return self.TimedLock(lock, self)
+
+    def get_stats(self) -> Dict[str, PhaseStats]:
+        """
+        Returns a summary of each phase measured so far.
+        """
+
+        with self.lock:
+            return {
+                phase: histogram.get_stats()
+                for phase, histogram in self.histograms.items()
+            }
+
+    def reset(self) -> None:
+        """
+        Drops all the measurements.
+        """
+
+        with self.lock:
+            self.histograms.clear()
+            self.events.clear()
+
+    def write_trace(self, file: Union[str, TextIO]) -> None:
+        """
+        Writes the trace events in the Chrome trace event format, which can
+        be opened with Perfetto or ``chrome://tracing``.
+        """
+
+        if isinstance(file, str):
+            with open(file, "w") as trace_file:
+                self.write_trace(trace_file)
+
+            return
+
+        pid = getpid()
+
+        json.dump(
+            {
+                "displayTimeUnit": "ns",
+                "traceEvents": [
+                    {
+                        "name": phase,
+                        "ph": "X",
+                        "pid": pid,
+                        "tid": tid,
+                        "ts": start / 1000.0,
+                        "dur": (end - start) / 1000.0,
+                    }
+                    for phase, tid, start, end in list(self.events)
+                ],
+            },
+            file,
+        )
+
+    class TimedLock:
+        """
+        Lock wrapper recording the time spent waiting for the lock.
+        """
+
+        def __init__(self, lock: Lock, profiler: "Profiler"):
+            self.lock: Lock = lock
+            self.record = profiler.record
+
+        def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+            """
+            Acquires the wrapped lock.
+            """
+
+            start = perf_counter_ns()
+            acquired = self.lock.acquire(blocking, timeout)
+            self.record(PHASE_LOCK_WAIT, start, perf_counter_ns())
+
+            return acquired
+
+        def release(self) -> None:
+            """
+            Releases the wrapped lock.
+            """
+
+            self.lock.release()
+
+        def __enter__(self) -> bool:
+            return self.acquire()
+
+        def __exit__(self, *_) -> None:
+            self.release()
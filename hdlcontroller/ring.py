@@ -0,0 +1,207 @@
+"""
+Shared-memory ring of received frames.
+
+A :py:class:`FrameRing` lets several worker processes consume the frames
+received by an HDLC controller, so that decoding them is not limited to the
+core running the controller. The frames are copied once into a ring of
+fixed-size slots held in shared memory, and once out of it by the worker
+which takes them, without any pickling nor pipe.
+
+The controller is the only producer. Each slot carries a sequence number
+telling whether it holds a frame to consume or is free to be written, so the
+producer never takes a lock. The consumers only share a lock to claim the
+next slot, which is held for a few instructions, and wait on a semaphore
+counting the frames published.
+
+Shared memory is only available from Python 3.8.
+"""
+
+from multiprocessing import Lock, Semaphore
+from queue import Empty, Full
+from struct import Struct
+from typing import NamedTuple, Union
+
+try:
+    from multiprocessing.shared_memory import SharedMemory
+except ImportError:  # Python 3.7
+    SharedMemory = None
+
+# The header holds the number of frames published, dropped and oversized,
+# only written by the producer, and the number of frames claimed by the
+# consumers.
+COUNTER = Struct("=Q")
+PUBLISHED = 0
+CONSUMED = 8
+DROPPED = 16
+OVERSIZED = 24
+HEADER_SIZE = 64
+# Sequence number and length of the frame.
+SLOT_HEADER = Struct("=QI")
+SLOT_HEADER_SIZE = 16
+
+
+class RingStats(NamedTuple):
+    """
+    Counters of a frame ring.
+    """
+
+    frames_published: int
+    frames_consumed: int
+    frames_dropped: int
+    frames_oversized: int
+
+
+class FrameRing:
+    """
+    Ring of frames in shared memory, written by one HDLC controller and read
+    by any number of processes.
+
+    The ring is given to the controller with its ``frames_ring`` parameter,
+    and to the worker processes as an argument when they are created. Each
+    frame is taken by one worker only. When the ring is full, the frames
+    received are dropped and not acknowledged, so that the other end sends
+    them again later. The frames larger than a slot would never fit, so they
+    are dropped but acknowledged, and only counted.
+
+    :param slots: Number of frames the ring can hold.
+    :param slot_size: Size of the largest frame in bytes. Larger frames are
+        dropped.
+    """
+
+    def __init__(self, slots: int = 1024, slot_size: int = 256):
+        if SharedMemory is None:
+            raise RuntimeError("Shared memory requires Python 3.8 or later")
+
+        if slots < 1:
+            raise ValueError("'slots' must be at least 1")
+
+        if slot_size < 1:
+            raise ValueError("'slot_size' must be at least 1")
+
+        self.slots: int = slots
+        self.slot_size: int = slot_size
+        # Slots are aligned on 8 bytes.
+        self.stride: int = SLOT_HEADER_SIZE + (slot_size + 7) // 8 * 8
+
+        self.shm = SharedMemory(create=True, size=HEADER_SIZE + slots * self.stride)
+        self.claim_lock = Lock()
+        self.available = Semaphore(0)
+        # Position of the next frame written, only known by the producer.
+        self.head: int = 0
+
+        for counter in (PUBLISHED, CONSUMED, DROPPED, OVERSIZED):
+            COUNTER.pack_into(self.shm.buf, counter, 0)
+
+        for position in range(slots):
+            SLOT_HEADER.pack_into(self.shm.buf, self.__offset(position), position, 0)
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        # Only the producer writes, so the workers do not need the head.
+        del state["head"]
+
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self.head = 0
+
+    def put_nowait(self, data: bytes) -> None:
+        """
+        Publishes a frame. Raises :py:exc:`queue.Full` if the ring is full.
+        A frame larger than a slot is dropped and counted instead.
+        """
+
+        buf = self.shm.buf
+
+        if len(data) > self.slot_size:
+            (oversized,) = COUNTER.unpack_from(buf, OVERSIZED)
+            COUNTER.pack_into(buf, OVERSIZED, oversized + 1)
+
+            return
+
+        offset = self.__offset(self.head)
+        sequence, _ = SLOT_HEADER.unpack_from(buf, offset)
+
+        if sequence != self.head:
+            (dropped,) = COUNTER.unpack_from(buf, DROPPED)
+            COUNTER.pack_into(buf, DROPPED, dropped + 1)
+
+            raise Full
+
+        start = offset + SLOT_HEADER_SIZE
+        buf[start : start + len(data)] = data
+        SLOT_HEADER.pack_into(buf, offset, self.head + 1, len(data))
+
+        self.head += 1
+        COUNTER.pack_into(buf, PUBLISHED, self.head)
+        self.available.release()
+
+    def get(self, block: bool = True, timeout: Union[float, None] = None) -> bytes:
+        """
+        Takes the next frame. Raises :py:exc:`queue.Empty` if no frame is
+        available within the timeout, or at once if ``block`` is false.
+        """
+
+        if not self.available.acquire(block, timeout):
+            raise Empty
+
+        buf = self.shm.buf
+
+        with self.claim_lock:
+            (position,) = COUNTER.unpack_from(buf, CONSUMED)
+            COUNTER.pack_into(buf, CONSUMED, position + 1)
+
+        offset = self.__offset(position)
+        _, length = SLOT_HEADER.unpack_from(buf, offset)
+        start = offset + SLOT_HEADER_SIZE
+        data = bytes(buf[start : start + length])
+
+        # Gives the slot back to the producer for its next round.
+        SLOT_HEADER.pack_into(buf, offset, position + self.slots, 0)
+
+        return data
+
+    def get_nowait(self) -> bytes:
+        """
+        Takes the next frame if one is available, and raises
+        :py:exc:`queue.Empty` otherwise.
+        """
+
+        return self.get(block=False)
+
+    def get_stats(self) -> RingStats:
+        """
+        Returns the counters of the ring.
+        """
+
+        buf = self.shm.buf
+
+        return RingStats(
+            *(
+                COUNTER.unpack_from(buf, counter)[0]
+                for counter in (PUBLISHED, CONSUMED, DROPPED, OVERSIZED)
+            )
+        )
+
+    def close(self) -> None:
+        """
+        Detaches the ring from the current process.
+        """
+
+        self.shm.close()
+
+    def unlink(self) -> None:
+        """
+        Frees the shared memory once all the processes have closed the ring.
+        It must be called once, by the process which created the ring.
+        """
+
+        self.shm.unlink()
+
+    def __offset(self, position: int) -> int:
+        """
+        Returns the offset of the slot of a frame.
+        """
+
+        return HEADER_SIZE + (position % self.slots) * self.stride
@@ -0,0 +1,298 @@
+"""
+Multi-link runtime spread over worker processes.
+
+One Python process running many HDLC controllers is limited to one core by
+the GIL: the framing, the FCS checks and the callbacks of all the links take
+turns on it. A :py:class:`LinkRuntime` spreads the links over a pool of
+worker processes instead, each worker opening and running the controllers of
+its own subset of links, so that adding cores adds link capacity. The parent
+process keeps a thin control API to send frames to any link, receive the
+frames of all the links and collect their statistics.
+
+Ports cannot be shared between processes, so each link is described by a
+:py:class:`LinkSpec` whose ``open_port`` callable is called in its worker
+and returns the read and write functions of the link. It must be picklable:
+a :py:class:`SerialPort`, or a function defined at the top level of a module.
+
+The frames received by a link are sent to the parent in batches, to limit
+the cost of the queue between the processes.
+"""
+
+from collections import deque
+from multiprocessing import Pipe, Process
+from multiprocessing import Queue as ProcessQueue
+from multiprocessing.connection import Connection
+from os import cpu_count
+from queue import Queue
+from threading import Event, Lock, Thread
+from typing import Any, Callable, Deque, Dict, List, NamedTuple, Tuple, Union
+
+import serial
+
+from hdlcontroller.hdlcontroller import (
+    HDLController,
+    LinkDownError,
+    ReadFunction,
+    Stats,
+    WriteFunction,
+)
+
+PortOpener = Callable[[], Tuple[ReadFunction, WriteFunction]]
+
+COMMAND_SEND = "send"
+COMMAND_STATS = "stats"
+COMMAND_STOP = "stop"
+
+
+class LinkSpec(NamedTuple):
+    """
+    Description of a link run by a worker process.
+
+    ``options`` are the keyword arguments given to the
+    :py:class:`HDLController <hdlcontroller.hdlcontroller.HDLController>` of
+    the link. They must be picklable, which excludes the clock, capture,
+    profiler, pacer and tuner objects.
+    """
+
+    open_port: PortOpener
+    options: Union[Dict[str, Any], None] = None
+
+
+class SerialPort:
+    """
+    Opens a serial port in the worker process running its link.
+
+    :param device: Serial device to use.
+    :param baudrate: Baud rate of the serial port.
+    """
+
+    def __init__(self, device: str, baudrate: int = 9600):
+        self.device: str = device
+        self.baudrate: int = baudrate
+
+    def __call__(self) -> Tuple[ReadFunction, WriteFunction]:
+        ser = serial.Serial(self.device, self.baudrate, timeout=0)
+
+        def read() -> bytes:
+            return ser.read(ser.in_waiting)
+
+        return read, ser.write
+
+
+class LinkRuntime:
+    """
+    Runs HDLC links in a pool of worker processes.
+
+    The links are spread over the workers in turn. Frames are sent to a link
+    with :py:meth:`send`, which returns as soon as the frame has been handed
+    over to the worker. Frames dropped by a link which is down, or too large
+    for it, are only accounted in its statistics.
+
+    :param links: Links to run, by name.
+    :param processes: Number of worker processes, by default the number of
+        CPUs. There are never more workers than links.
+    :param batch_size: Maximum number of frames received sent to the parent
+        at once.
+    """
+
+    def __init__(
+        self,
+        links: Dict[str, LinkSpec],
+        processes: Union[int, None] = None,
+        batch_size: int = 64,
+    ):
+        if not links:
+            raise ValueError("At least one link must be given")
+
+        if processes is None:
+            processes = cpu_count() or 1
+
+        if processes < 1:
+            raise ValueError("'processes' must be at least 1")
+
+        if batch_size < 1:
+            raise ValueError("'batch_size' must be at least 1")
+
+        processes = min(processes, len(links))
+
+        self.shards: Dict[str, int] = {}
+        shard_links: List[Dict[str, LinkSpec]] = [{} for _ in range(processes)]
+
+        for index, (name, spec) in enumerate(links.items()):
+            self.shards[name] = index % processes
+            shard_links[index % processes][name] = spec
+
+        self.frames_received: ProcessQueue = ProcessQueue()
+        self.pending: Deque[Tuple[str, bytes]] = deque()
+
+        self.connections: List[Connection] = []
+        # Protect the connections, so that a request and its response are
+        # not mixed up with another one.
+        self.locks: List[Lock] = []
+        self.workers: List[Process] = []
+
+        for specs in shard_links:
+            connection, worker_connection = Pipe()
+            self.connections.append(connection)
+            self.locks.append(Lock())
+            self.workers.append(
+                Process(
+                    target=_run_worker,
+                    args=(specs, worker_connection, self.frames_received, batch_size),
+                    daemon=True,
+                )
+            )
+
+    def start(self) -> None:
+        """
+        Starts the worker processes, and returns once all the links have
+        been opened.
+
+        If a port cannot be opened, the runtime is stopped and the error is
+        raised again.
+        """
+
+        for worker in self.workers:
+            worker.start()
+
+        for connection in self.connections:
+            error = connection.recv()
+
+            if error is not None:
+                self.stop()
+                raise error
+
+    def stop(self, timeout: Union[float, None] = None) -> None:
+        """
+        Stops the links and the worker processes.
+        """
+
+        for connection, lock in zip(self.connections, self.locks):
+            with lock:
+                try:
+                    connection.send((COMMAND_STOP,))
+                except OSError:
+                    # The worker has already exited.
+                    pass
+
+        for worker in self.workers:
+            worker.join(timeout)
+
+    def send(self, name: str, data: bytes) -> None:
+        """
+        Sends a new data frame through a link.
+        """
+
+        shard = self.shards[name]
+
+        with self.locks[shard]:
+            self.connections[shard].send((COMMAND_SEND, name, data))
+
+    def get_data(self, timeout: Union[float, None] = None) -> Tuple[str, bytes]:
+        """
+        Gets the next frame received by any link, along with the name of
+        the link.
+
+        This method will block until a new data frame is available. It
+        raises :py:exc:`queue.Empty` if the timeout expires first.
+        """
+
+        if not self.pending:
+            self.pending.extend(self.frames_received.get(timeout=timeout))
+
+        return self.pending.popleft()
+
+    def get_stats(self, name: str) -> Stats:
+        """
+        Returns the counters of the controller of a link.
+        """
+
+        shard = self.shards[name]
+
+        with self.locks[shard]:
+            self.connections[shard].send((COMMAND_STATS, name))
+
+            return self.connections[shard].recv()
+
+
+def _run_worker(
+    specs: Dict[str, LinkSpec],
+    connection: Connection,
+    frames_received: ProcessQueue,
+    batch_size: int,
+) -> None:
+    """
+    Runs the links of a worker process until the parent stops it.
+    """
+
+    controllers: Dict[str, HDLController] = {}
+
+    try:
+        for name, spec in specs.items():
+            read_func, write_func = spec.open_port()
+            options = spec.options if spec.options is not None else {}
+            controllers[name] = HDLController(read_func, write_func, **options)
+    except Exception as err:
+        connection.send(err)
+        return
+
+    stop_worker = Event()
+    frames_to_send: Dict[str, Queue] = {name: Queue() for name in controllers}
+    forwarders: List[Thread] = []
+
+    def send_frames(controller: HDLController, frames: Queue) -> None:
+        while True:
+            data = frames.get()
+
+            if data is None:
+                break
+
+            try:
+                # Blocks while the sending window of the link is full,
+                # without holding up the other links.
+                controller.send(data)
+            except (LinkDownError, ValueError):
+                # Dropped, and counted by the controller, as the parent
+                # does not wait for the frame to be sent.
+                pass
+
+    def forward_frames(name: str, controller: HDLController) -> None:
+        while not stop_worker.is_set():
+            frames = controller.get_data_batch(batch_size, timeout=0.1)
+
+            if frames:
+                frames_received.put([(name, data) for data in frames])
+
+    for name, controller in controllers.items():
+        controller.start()
+
+        Thread(
+            target=send_frames,
+            args=(controller, frames_to_send[name]),
+            daemon=True,
+        ).start()
+
+        forwarder = Thread(target=forward_frames, args=(name, controller))
+        forwarder.start()
+        forwarders.append(forwarder)
+
+    connection.send(None)
+
+    while True:
+        command = connection.recv()
+
+        if command[0] == COMMAND_SEND:
+            frames_to_send[command[1]].put(command[2])
+        elif command[0] == COMMAND_STATS:
+            connection.send(controllers[command[1]].get_stats())
+        else:
+            break
+
+    stop_worker.set()
+
+    for name, controller in controllers.items():
+        frames_to_send[name].put(None)
+        controller.stop()
+
+    for forwarder in forwarders:
+        forwarder.join()
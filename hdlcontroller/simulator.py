@@ -0,0 +1,365 @@
+"""
+Deterministic link simulator.
+
+The simulator provides pairs of read and write functions which can be given
+to :py:class:`HDLController <hdlcontroller.hdlcontroller.HDLController>` in
+place of a real serial port. The impairments of the link (bandwidth, latency,
+jitter, bit errors, burst losses, reordering and fragmentation) are driven by
+a seeded random number generator, so a given seed always reproduces the same
+error profile. A lossless shared bus is also provided to connect the
+stations of a multi-drop link.
+
+Time is read through a time function, which can be the :py:meth:`time
+<hdlcontroller.clock.Clock.time>` method of the clock given to the
+controllers. With a :py:class:`VirtualClock
+<hdlcontroller.clock.VirtualClock>`, long runs complete in a fraction of
+their simulated duration.
+"""
+
+from heapq import heappop, heappush
+from math import log
+from random import Random
+from threading import Lock
+from time import monotonic
+from typing import Callable, List, NamedTuple, Tuple, Union
+
+from hdlcontroller.hdlcontroller import ReadFunction, WriteFunction
+
+TimeFunction = Callable[[], float]
+
+
+class Endpoint(NamedTuple):
+    """
+    One end of a simulated link.
+
+    It can be unpacked straight into the ``read_func`` and ``write_func``
+    parameters of :py:class:`HDLController
+    <hdlcontroller.hdlcontroller.HDLController>`.
+    """
+
+    read: ReadFunction
+    write: WriteFunction
+
+
+class ChannelStats(NamedTuple):
+    """
+    Counters of a simulated channel.
+    """
+
+    writes: int
+    bytes_written: int
+    writes_lost: int
+    writes_reordered: int
+    bits_flipped: int
+    chunks_delivered: int
+
+
+class Channel:
+    """
+    A unidirectional simulated channel.
+
+    Every call to :py:meth:`write` is treated as one transmission unit: it can
+    be lost as a whole (burst losses), delayed past the units written after it
+    (reordering) and have some of its bits flipped (bit errors). It is then
+    split into chunks (fragmentation) which become readable once their
+    delivery time is reached according to ``time_func``.
+
+    :param bandwidth: Link rate in bytes per second, or ``None`` for an
+        infinitely fast link.
+    :param latency: Propagation delay in seconds.
+    :param jitter: Maximum random delay in seconds added to the latency.
+    :param bit_error_rate: Probability for each bit to be flipped.
+    :param burst_loss_rate: Probability for a transmission unit to start a
+        burst of losses.
+    :param mean_burst_length: Average number of consecutive units lost in a
+        burst.
+    :param reorder_rate: Probability for a transmission unit to be delivered
+        after the ones following it.
+    :param reorder_delay: Extra delay in seconds applied to reordered units.
+    :param max_chunk_size: Maximum size in bytes of the delivered chunks, or
+        ``None`` to deliver each unit in one piece.
+    :param seed: Seed of the random number generator.
+    :param time_func: Function returning the current time in seconds.
+    """
+
+    def __init__(
+        self,
+        bandwidth: Union[float, None] = None,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        bit_error_rate: float = 0.0,
+        burst_loss_rate: float = 0.0,
+        mean_burst_length: float = 1.0,
+        reorder_rate: float = 0.0,
+        reorder_delay: float = 0.01,
+        max_chunk_size: Union[int, None] = None,
+        seed: Union[int, None] = None,
+        time_func: TimeFunction = monotonic,
+    ):
+        if bandwidth is not None and bandwidth <= 0:
+            raise ValueError("'bandwidth' must be positive")
+
+        if not 0.0 <= bit_error_rate < 1.0:
+            raise ValueError("'bit_error_rate' must be in [0, 1)")
+
+        if mean_burst_length < 1.0:
+            raise ValueError("'mean_burst_length' must be at least 1")
+
+        if max_chunk_size is not None and max_chunk_size < 1:
+            raise ValueError("'max_chunk_size' must be at least 1")
+
+        self.bandwidth: Union[float, None] = bandwidth
+        self.latency: float = latency
+        self.jitter: float = jitter
+        self.bit_error_rate: float = bit_error_rate
+        self.burst_loss_rate: float = burst_loss_rate
+        self.mean_burst_length: float = mean_burst_length
+        self.reorder_rate: float = reorder_rate
+        self.reorder_delay: float = reorder_delay
+        self.max_chunk_size: Union[int, None] = max_chunk_size
+        self.time: TimeFunction = time_func
+
+        self.rng: Random = Random(seed)
+        self.lock: Lock = Lock()
+
+        # Delivery queue ordered by delivery time, then by emission order.
+        self.pending: List[Tuple[float, int, bytes]] = []
+        self.counter: int = 0
+        self.tx_free_at: float = 0.0
+        self.last_delivery: float = 0.0
+        self.in_burst: bool = False
+
+        self.writes: int = 0
+        self.bytes_written: int = 0
+        self.writes_lost: int = 0
+        self.writes_reordered: int = 0
+        self.bits_flipped: int = 0
+        self.chunks_delivered: int = 0
+
+    def write(self, data: bytes) -> int:
+        """
+        Transmits data over the channel.
+
+        Returns the number of bytes written, like a serial port would do,
+        whatever happens to them afterwards.
+        """
+
+        with self.lock:
+            now = self.time()
+            size = len(data)
+
+            self.writes += 1
+            self.bytes_written += size
+
+            # Serialisation delay: a unit cannot start before the previous one
+            # has been fully transmitted.
+            start = max(now, self.tx_free_at)
+            end = start if self.bandwidth is None else start + size / self.bandwidth
+            self.tx_free_at = end
+
+            if self.__is_lost():
+                self.writes_lost += 1
+                return size
+
+            deliver_at = end + self.latency
+
+            if self.jitter > 0.0:
+                deliver_at += self.rng.uniform(0.0, self.jitter)
+
+            if self.reorder_rate > 0.0 and self.rng.random() < self.reorder_rate:
+                self.writes_reordered += 1
+                deliver_at += self.reorder_delay
+            else:
+                # Jitter alone never reorders a serial stream.
+                deliver_at = max(deliver_at, self.last_delivery)
+                self.last_delivery = deliver_at
+
+            if self.bit_error_rate > 0.0:
+                data = self.__corrupt(data)
+
+            for chunk in self.__fragment(data):
+                heappush(self.pending, (deliver_at, self.counter, chunk))
+                self.counter += 1
+
+            return size
+
+    def read(self) -> bytes:
+        """
+        Returns all the bytes whose delivery time has been reached, or an
+        empty bytes object if there are none.
+        """
+
+        with self.lock:
+            if not self.pending:
+                return b""
+
+            now = self.time()
+            chunks = []
+
+            while self.pending and self.pending[0][0] <= now:
+                chunks.append(heappop(self.pending)[2])
+
+            self.chunks_delivered += len(chunks)
+
+            return b"".join(chunks)
+
+    def in_flight(self) -> int:
+        """
+        Returns the number of chunks not delivered yet.
+        """
+
+        with self.lock:
+            return len(self.pending)
+
+    def next_delivery(self) -> Union[float, None]:
+        """
+        Returns the delivery time of the next chunk, or ``None`` if the
+        channel is empty.
+        """
+
+        with self.lock:
+            return self.pending[0][0] if self.pending else None
+
+    def get_stats(self) -> ChannelStats:
+        """
+        Returns the channel counters.
+        """
+
+        with self.lock:
+            return ChannelStats(
+                self.writes,
+                self.bytes_written,
+                self.writes_lost,
+                self.writes_reordered,
+                self.bits_flipped,
+                self.chunks_delivered,
+            )
+
+    def __is_lost(self) -> bool:
+        """
+        Runs one step of the Gilbert-Elliott loss model.
+        """
+
+        lost = self.in_burst
+
+        if self.in_burst:
+            if self.rng.random() < 1.0 / self.mean_burst_length:
+                self.in_burst = False
+        elif self.burst_loss_rate > 0.0 and self.rng.random() < self.burst_loss_rate:
+            self.in_burst = True
+
+        return lost
+
+    def __corrupt(self, data: bytes) -> bytes:
+        """
+        Flips random bits according to the bit error rate.
+
+        The distance between two errors follows a geometric distribution, so
+        the cost depends on the number of errors rather than on the size of
+        the data.
+        """
+
+        nb_bits = 8 * len(data)
+        log_q = log(1.0 - self.bit_error_rate)
+        position = int(log(1.0 - self.rng.random()) / log_q)
+
+        if position >= nb_bits:
+            return data
+
+        corrupted = bytearray(data)
+
+        while position < nb_bits:
+            corrupted[position >> 3] ^= 1 << (position & 7)
+            self.bits_flipped += 1
+            position += 1 + int(log(1.0 - self.rng.random()) / log_q)
+
+        return bytes(corrupted)
+
+    def __fragment(self, data: bytes) -> List[bytes]:
+        """
+        Splits data into chunks of random sizes.
+        """
+
+        if self.max_chunk_size is None or len(data) <= 1:
+            return [data]
+
+        chunks = []
+        offset = 0
+
+        while offset < len(data):
+            size = self.rng.randint(1, self.max_chunk_size)
+            chunks.append(data[offset : offset + size])
+            offset += size
+
+        return chunks
+
+
+class LinkSimulator:
+    """
+    A full-duplex simulated link made of two channels sharing the same
+    impairment settings.
+
+    Each channel gets its own random number generator derived from ``seed``,
+    so traffic in one direction does not change the error pattern of the
+    other one. The keyword arguments are the ones of :py:class:`Channel`.
+
+    .. code-block:: python
+
+        link = LinkSimulator(bandwidth=11520, bit_error_rate=1e-5, seed=42)
+        primary = HDLController(*link.a)
+        secondary = HDLController(*link.b)
+    """
+
+    def __init__(self, seed: Union[int, None] = None, **kwargs):
+        rng = Random(seed)
+
+        self.a_to_b: Channel = Channel(seed=rng.getrandbits(64), **kwargs)
+        self.b_to_a: Channel = Channel(seed=rng.getrandbits(64), **kwargs)
+
+        self.a: Endpoint = Endpoint(self.b_to_a.read, self.a_to_b.write)
+        self.b: Endpoint = Endpoint(self.a_to_b.read, self.b_to_a.write)
+
+
+class Bus:
+    """
+    A lossless shared bus, such as an RS-485 line, connecting any number of
+    endpoints. Everything written by one endpoint becomes readable by all
+    the other ones at once.
+
+    .. code-block:: python
+
+        bus = Bus()
+        primary = PrimaryStation(*bus.endpoint(), addresses=[1, 2])
+        secondary = SecondaryStation(*bus.endpoint(), address=1)
+    """
+
+    def __init__(self):
+        self.lock: Lock = Lock()
+        self.inboxes: List[bytearray] = []
+
+    def endpoint(self) -> Endpoint:
+        """
+        Connects a new endpoint to the bus.
+        """
+
+        inbox = bytearray()
+
+        with self.lock:
+            self.inboxes.append(inbox)
+
+        def read() -> bytes:
+            with self.lock:
+                data = bytes(inbox)
+                inbox.clear()
+
+            return data
+
+        def write(data: bytes) -> int:
+            with self.lock:
+                for other in self.inboxes:
+                    if other is not inbox:
+                        other += data
+
+            return len(data)
+
+        return Endpoint(read, write)
@@ -0,0 +1,157 @@
+"""
+Automatic tuning of the sending window and timeout.
+
+A :py:class:`Tuner` adjusts the window and the sending timeout of an HDLC
+controller from the frames acknowledged and lost at runtime:
+
+* the window grows by one frame for each window of frames acknowledged, and
+  is halved when a frame has to be sent again (additive increase,
+  multiplicative decrease), at most once per round trip;
+* the sending timeout follows the smoothed ACK latency and its variation, as
+  TCP does for its retransmission timer, and is doubled each time it
+  expires. The latency of the frames sent more than once is ambiguous and is
+  not taken into account.
+"""
+
+from threading import Lock
+from typing import NamedTuple, Union
+
+# Largest window allowed by 3-bit sequence numbers.
+MAX_WINDOW = 7
+
+
+class TunerState(NamedTuple):
+    """
+    Current state of a tuner. Times are in seconds, and the latency fields
+    are ``None`` until a first latency has been measured.
+    """
+
+    window: int
+    timeout: float
+    smoothed_latency: Union[float, None]
+    latency_variation: Union[float, None]
+    acks: int
+    losses: int
+    window_decreases: int
+
+
+class Tuner:
+    """
+    Adjusts the effective window and sending timeout of an HDLC controller
+    within the given bounds.
+
+    The controller starts from its ``window`` and ``sending_timeout``
+    parameters, brought within the bounds.
+
+    :param min_window: Smallest window.
+    :param max_window: Largest window, at most 7.
+    :param min_timeout: Smallest sending timeout in seconds.
+    :param max_timeout: Largest sending timeout in seconds.
+    """
+
+    def __init__(
+        self,
+        min_window: int = 1,
+        max_window: int = MAX_WINDOW,
+        min_timeout: float = 0.5,
+        max_timeout: float = 10.0,
+    ):
+        if not 1 <= min_window <= max_window <= MAX_WINDOW:
+            raise ValueError(
+                "Window bounds must verify 1 <= min <= max <= {0}".format(MAX_WINDOW)
+            )
+
+        if not 0 < min_timeout <= max_timeout:
+            raise ValueError("Timeout bounds must verify 0 < min <= max")
+
+        self.min_window: int = min_window
+        self.max_window: int = max_window
+        self.min_timeout: float = min_timeout
+        self.max_timeout: float = max_timeout
+
+        self.lock: Lock = Lock()
+        # The window is kept as a float so that it can grow by a fraction of
+        # frame at each ACK.
+        self.cwnd: float = float(max_window)
+        self.window: int = max_window
+        self.timeout: float = max_timeout
+        self.srtt: Union[float, None] = None
+        self.rttvar: Union[float, None] = None
+        # No decrease before this time, so that the losses of one window
+        # only halve it once.
+        self.next_decrease: float = 0.0
+
+        self.acks: int = 0
+        self.losses: int = 0
+        self.window_decreases: int = 0
+
+    def configure(self, window: int, timeout: float) -> None:
+        """
+        Sets the initial window and sending timeout.
+        """
+
+        with self.lock:
+            self.cwnd = float(min(max(window, self.min_window), self.max_window))
+            self.window = int(self.cwnd)
+            self.timeout = min(max(timeout, self.min_timeout), self.max_timeout)
+
+    def ack_received(self, latency: Union[float, None]) -> None:
+        """
+        Takes an acknowledged frame into account, along with its ACK latency
+        if it has only been sent once.
+        """
+
+        with self.lock:
+            self.acks += 1
+
+            if latency is not None:
+                if self.srtt is None or self.rttvar is None:
+                    self.srtt = latency
+                    self.rttvar = latency / 2
+                else:
+                    self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - latency)
+                    self.srtt = 0.875 * self.srtt + 0.125 * latency
+
+                self.timeout = min(
+                    max(self.srtt + 4 * self.rttvar, self.min_timeout),
+                    self.max_timeout,
+                )
+
+            self.cwnd = min(self.cwnd + 1 / self.cwnd, float(self.max_window))
+            self.window = int(self.cwnd)
+
+    def frame_lost(self, now: float, timed_out: bool) -> None:
+        """
+        Takes into account a frame sent again, either because its sending
+        timeout expired or because an NACK has been received.
+        """
+
+        with self.lock:
+            self.losses += 1
+
+            if timed_out:
+                self.timeout = min(2 * self.timeout, self.max_timeout)
+
+            if now >= self.next_decrease:
+                self.cwnd = max(self.cwnd / 2, float(self.min_window))
+                self.window = int(self.cwnd)
+                self.window_decreases += 1
+                self.next_decrease = now + (
+                    self.srtt if self.srtt is not None else self.timeout
+                )
+
+    def get_state(self) -> TunerState:
+        """
+        Returns the current state of the tuner.
+        """
+
+        with self.lock:
+            return TunerState(
+                self.window,
+                self.timeout,
+                self.srtt,
+                self.rttvar,
+                self.acks,
+                self.losses,
+                self.window_decreases,
+            )
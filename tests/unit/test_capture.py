@@ -0,0 +1,147 @@
+"""
+Unit tests for the wire capture and replay.
+"""
+
+import unittest
+from io import BytesIO
+
+from yahdlc import FRAME_ACK, FRAME_DATA, frame_data
+
+from hdlcontroller.capture import (
+    RECORD_FRAME,
+    RECORD_READ,
+    RECORD_WRITE,
+    CaptureReplayer,
+    CaptureWriter,
+    read_capture,
+)
+from hdlcontroller.clock import VirtualClock
+from hdlcontroller.hdlcontroller import HDLController
+
+
+class TestCapture(unittest.TestCase):
+    """
+    Tests the capture writer and reader.
+    """
+
+    def test_round_trip(self):
+        """
+        Records are read back as they have been written.
+        """
+
+        clock = VirtualClock(start=1.0)
+        file = BytesIO()
+        writer = CaptureWriter(file, clock=clock)
+
+        writer.record(RECORD_READ, b"abc")
+        clock.advance(0.5)
+        writer.record(RECORD_FRAME, b"test", FRAME_DATA, 3)
+        writer.close()
+
+        file.seek(0)
+        records = list(read_capture(file))
+
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[0].timestamp, 1.0)
+        self.assertEqual(records[0].kind, RECORD_READ)
+        self.assertEqual(records[0].data, b"abc")
+        self.assertEqual(records[1].timestamp, 1.5)
+        self.assertEqual(records[1].kind, RECORD_FRAME)
+        self.assertEqual(records[1].frame_type, FRAME_DATA)
+        self.assertEqual(records[1].seq_no, 3)
+        self.assertEqual(records[1].data, b"test")
+
+    def test_bad_file(self):
+        """
+        Reading a file which is not a capture fails.
+        """
+
+        with self.assertRaises(ValueError):
+            list(read_capture(BytesIO(b"not a capture file")))
+
+    def test_controller_capture(self):
+        """
+        The traffic of a controller is recorded.
+        """
+
+        def read_func() -> bytes:
+            return frame_data("test", FRAME_DATA, 0)
+
+        def write_func(_: bytes) -> None:
+            pass
+
+        file = BytesIO()
+        writer = CaptureWriter(file)
+        hdlc_c = HDLController(read_func, write_func, capture=writer)
+
+        hdlc_c.start()
+        self.assertEqual(hdlc_c.get_data(), b"test")
+        hdlc_c.stop()
+        writer.close()
+
+        file.seek(0)
+        kinds = {record.kind: record for record in read_capture(file)}
+
+        self.assertEqual(kinds[RECORD_READ].data, read_func())
+        self.assertEqual(kinds[RECORD_FRAME].data, b"test")
+        self.assertEqual(kinds[RECORD_WRITE].data, frame_data("", FRAME_ACK, 1))
+
+
+class TestCaptureReplayer(unittest.TestCase):
+    """
+    Tests the capture replayer.
+    """
+
+    def make_capture(self) -> BytesIO:
+        """
+        Returns a capture of two frames read one second apart.
+        """
+
+        clock = VirtualClock()
+        file = BytesIO()
+        writer = CaptureWriter(file, clock=clock)
+
+        writer.record(RECORD_READ, frame_data("test_1", FRAME_DATA, 0))
+        writer.record(RECORD_WRITE, frame_data("", FRAME_ACK, 1))
+        clock.advance(1.0)
+        writer.record(RECORD_READ, frame_data("test_2", FRAME_DATA, 1))
+        writer.close()
+
+        file.seek(0)
+
+        return file
+
+    def test_original_speed(self):
+        """
+        Chunks are replayed at their original time offsets.
+        """
+
+        clock = VirtualClock(start=10.0)
+        replayer = CaptureReplayer(self.make_capture(), clock=clock)
+
+        self.assertEqual(replayer.read(), frame_data("test_1", FRAME_DATA, 0))
+        clock.advance(0.5)
+        self.assertEqual(replayer.read(), b"")
+        clock.advance(0.5)
+        self.assertEqual(replayer.read(), frame_data("test_2", FRAME_DATA, 1))
+        self.assertFalse(replayer.finished.is_set())
+        self.assertEqual(replayer.read(), b"")
+        self.assertTrue(replayer.finished.is_set())
+
+    def test_replay_through_controller(self):
+        """
+        Frames of a capture replayed at maximum speed are received again.
+        """
+
+        def write_func(_: bytes) -> None:
+            pass
+
+        replayer = CaptureReplayer(self.make_capture(), max_speed=True)
+        hdlc_c = HDLController(replayer.read, write_func)
+
+        hdlc_c.start()
+        self.assertTrue(replayer.finished.wait(1.0))
+        hdlc_c.stop()
+
+        self.assertEqual(hdlc_c.get_data(), b"test_1")
+        self.assertEqual(hdlc_c.get_data(), b"test_2")
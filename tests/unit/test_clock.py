@@ -0,0 +1,94 @@
+"""
+Unit tests for the clocks.
+"""
+
+import unittest
+from threading import Thread
+
+from hdlcontroller.clock import Clock, VirtualClock
+
+
+class TestClock(unittest.TestCase):
+    """
+    Tests the real-time clock.
+    """
+
+    def test_monotonic(self):
+        """
+        The time never goes backward.
+        """
+
+        clock = Clock()
+        before = clock.time()
+
+        clock.sleep(0.001)
+
+        self.assertGreater(clock.time(), before)
+
+    def test_wait_set_event(self):
+        """
+        Waiting on an event already set returns at once.
+        """
+
+        clock = Clock()
+        event = clock.event()
+        event.set()
+
+        self.assertTrue(clock.wait(event, 10.0))
+
+
+class TestVirtualClock(unittest.TestCase):
+    """
+    Tests the virtual clock.
+    """
+
+    def test_advance(self):
+        """
+        The time only moves forward when told to.
+        """
+
+        clock = VirtualClock(start=10.0)
+
+        self.assertEqual(clock.time(), 10.0)
+        clock.advance(2.5)
+        self.assertEqual(clock.time(), 12.5)
+
+    def test_wait_timeout(self):
+        """
+        A thread waiting on the clock is released when its deadline is
+        reached.
+        """
+
+        clock = VirtualClock()
+        event = clock.event()
+        results = []
+
+        thread = Thread(target=lambda: results.append(clock.wait(event, 5.0)))
+        thread.start()
+
+        self.assertTrue(clock.wait_for_waiters(1))
+        clock.advance(4.0)
+        self.assertTrue(clock.wait_for_waiters(1))
+        self.assertEqual(results, [])
+
+        clock.advance(1.0)
+        thread.join(1.0)
+        self.assertEqual(results, [False])
+
+    def test_wait_event_set(self):
+        """
+        A thread waiting on the clock is released when its event is set.
+        """
+
+        clock = VirtualClock()
+        event = clock.event()
+        results = []
+
+        thread = Thread(target=lambda: results.append(clock.wait(event, 5.0)))
+        thread.start()
+
+        self.assertTrue(clock.wait_for_waiters(1))
+        event.set()
+        thread.join(1.0)
+        self.assertEqual(results, [True])
+        self.assertEqual(clock.time(), 0.0)
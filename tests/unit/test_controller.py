@@ -3,11 +3,13 @@ Unit tests for the HDLC controller.
 """
 
 import unittest
+from threading import Thread
 from time import sleep
 
 from yahdlc import FRAME_ACK, FRAME_DATA, FRAME_NACK, frame_data
 
-from hdlcontroller.hdlcontroller import HDLController, Timeout
+from hdlcontroller.clock import VirtualClock
+from hdlcontroller.hdlcontroller import HDLController, LinkDownError, Timeout
 
 
 class TestHDLCController(unittest.TestCase):
@@ -144,7 +146,8 @@ class TestHDLCController(unittest.TestCase):
         def write_func(data: bytes) -> None:
             write_func.data = data
 
-        hdlc_c = HDLController(read_func, write_func)
+        clock = VirtualClock()
+        hdlc_c = HDLController(read_func, write_func, clock=clock)
 
         write_func.data = None
         hdlc_c.send(b"test")
@@ -154,6 +157,8 @@ class TestHDLCController(unittest.TestCase):
         self.assertEqual(hdlc_c.get_senders_number(), 1)
 
         write_func.data = None
+        self.assertTrue(clock.wait_for_waiters(1))
+        clock.advance(2.0)
         while write_func.data is None:
             pass
         self.assertEqual(write_func.data, frame_data("test", FRAME_DATA, 0))
@@ -172,7 +177,10 @@ class TestHDLCController(unittest.TestCase):
         def write_func(data: bytes) -> None:
             write_func.data = data
 
-        hdlc_c = HDLController(read_func, write_func, sending_timeout=Timeout(5.0))
+        clock = VirtualClock()
+        hdlc_c = HDLController(
+            read_func, write_func, sending_timeout=Timeout(5.0), clock=clock
+        )
 
         write_func.data = None
         hdlc_c.send(b"test_1")
@@ -181,7 +189,8 @@ class TestHDLCController(unittest.TestCase):
         self.assertEqual(write_func.data, frame_data("test_1", FRAME_DATA, 0))
         self.assertEqual(hdlc_c.get_senders_number(), 1)
 
-        sleep(1)
+        self.assertTrue(clock.wait_for_waiters(1))
+        clock.advance(1.0)
 
         write_func.data = None
         hdlc_c.send(b"test_2")
@@ -190,7 +199,8 @@ class TestHDLCController(unittest.TestCase):
         self.assertEqual(write_func.data, frame_data("test_2", FRAME_DATA, 1))
         self.assertEqual(hdlc_c.get_senders_number(), 2)
 
-        sleep(1)
+        self.assertTrue(clock.wait_for_waiters(2))
+        clock.advance(1.0)
 
         write_func.data = None
         hdlc_c.send(b"test_3")
@@ -200,18 +210,24 @@ class TestHDLCController(unittest.TestCase):
         self.assertEqual(hdlc_c.get_senders_number(), 3)
 
         write_func.data = None
+        self.assertTrue(clock.wait_for_waiters(3))
+        clock.advance(3.0)
         while write_func.data is None:
             pass
         self.assertEqual(write_func.data, frame_data("test_1", FRAME_DATA, 0))
         self.assertEqual(hdlc_c.get_senders_number(), 3)
 
         write_func.data = None
+        self.assertTrue(clock.wait_for_waiters(3))
+        clock.advance(1.0)
         while write_func.data is None:
             pass
         self.assertEqual(write_func.data, frame_data("test_2", FRAME_DATA, 1))
         self.assertEqual(hdlc_c.get_senders_number(), 3)
 
         write_func.data = None
+        self.assertTrue(clock.wait_for_waiters(3))
+        clock.advance(1.0)
         while write_func.data is None:
             pass
         self.assertEqual(write_func.data, frame_data("test_3", FRAME_DATA, 2))
@@ -219,6 +235,254 @@ class TestHDLCController(unittest.TestCase):
 
         hdlc_c.stop()
 
+    def test_send_frame_and_reach_max_retries(self):
+        """
+        Tests that the link goes down once a frame has been sent again too
+        many times, and is up again when a frame is received.
+        """
+
+        def read_func() -> bytes:
+            if not read_func.frames:
+                return b""
+
+            return read_func.frames.pop(0)
+
+        def write_func(data: bytes) -> None:
+            write_func.frames.append(data)
+
+        def link_state_callback(up: bool) -> None:
+            link_state_callback.states.append(up)
+
+        read_func.frames = []
+        write_func.frames = []
+        link_state_callback.states = []
+
+        clock = VirtualClock()
+        hdlc_c = HDLController(read_func, write_func, clock=clock, max_retries=1)
+        hdlc_c.set_link_state_callback(link_state_callback)
+
+        hdlc_c.send(b"test")
+        self.assertTrue(clock.wait_for_waiters(1))
+        clock.advance(2.0)
+        self.assertTrue(clock.wait_for_waiters(1))
+        clock.advance(2.0)
+        while hdlc_c.is_link_up():
+            pass
+
+        self.assertEqual(link_state_callback.states, [False])
+        self.assertEqual(hdlc_c.get_senders_number(), 0)
+        self.assertEqual(hdlc_c.get_stats().retransmissions, 1)
+        self.assertEqual(hdlc_c.get_stats().frames_failed, 1)
+        self.assertEqual(hdlc_c.get_stats().link_downs, 1)
+
+        with self.assertRaises(LinkDownError):
+            hdlc_c.send(b"test")
+
+        read_func.frames = [frame_data("test", FRAME_DATA, 5)]
+        write_func.frames = []
+        hdlc_c.start()
+        self.assertEqual(hdlc_c.get_data(), b"test")
+        self.assertTrue(hdlc_c.is_link_up())
+        self.assertEqual(link_state_callback.states, [False, True])
+        # The other end is told to expect the next sequence number before
+        # the frame received is acknowledged.
+        while len(write_func.frames) < 2:
+            pass
+        self.assertEqual(
+            write_func.frames[:2],
+            [
+                frame_data(HDLController.RESET_MAGIC, FRAME_DATA, 1),
+                frame_data("", FRAME_ACK, 6),
+            ],
+        )
+
+        hdlc_c.stop()
+
+    def test_keepalive(self):
+        """
+        Tests that keepalive frames are sent on an idle link, and that the
+        link goes down when the other end stays silent.
+        """
+
+        def read_func() -> bytes:
+            return b""
+
+        def write_func(data: bytes) -> None:
+            write_func.data = data
+
+        def link_state_callback(up: bool) -> None:
+            link_state_callback.states.append(up)
+
+        link_state_callback.states = []
+
+        clock = VirtualClock()
+        hdlc_c = HDLController(
+            read_func, write_func, clock=clock, keepalive=Timeout(0.15)
+        )
+        hdlc_c.set_link_state_callback(link_state_callback)
+
+        write_func.data = None
+        hdlc_c.start()
+        self.assertTrue(clock.wait_for_waiters(1))
+        clock.advance(0.1)
+        self.assertTrue(clock.wait_for_waiters(1))
+        self.assertEqual(write_func.data, None)
+
+        clock.advance(0.1)
+        while write_func.data is None:
+            pass
+        self.assertEqual(write_func.data, frame_data("", FRAME_NACK, 0))
+        self.assertEqual(hdlc_c.get_stats().keepalives_sent, 1)
+        self.assertTrue(hdlc_c.is_link_up())
+
+        clock.advance(0.3)
+        while hdlc_c.is_link_up():
+            pass
+        self.assertEqual(link_state_callback.states, [False])
+
+        hdlc_c.stop()
+
+    def test_keepalive_polls_next_frame(self):
+        """
+        Tests that the keepalive frames poll the frame following the last
+        one received, without receive window.
+        """
+
+        def read_func() -> bytes:
+            if not read_func.frames:
+                return b""
+
+            return read_func.frames.pop(0)
+
+        def write_func(data: bytes) -> None:
+            write_func.data = data
+
+        read_func.frames = [frame_data("test", FRAME_DATA, 2)]
+        write_func.data = None
+
+        clock = VirtualClock()
+        hdlc_c = HDLController(
+            read_func, write_func, clock=clock, keepalive=Timeout(0.15)
+        )
+
+        hdlc_c.start()
+        self.assertEqual(hdlc_c.get_data(), b"test")
+        while write_func.data is None:
+            pass
+        self.assertEqual(write_func.data, frame_data("", FRAME_ACK, 3))
+
+        self.assertTrue(clock.wait_for_waiters(1))
+        clock.advance(0.2)
+        while write_func.data == frame_data("", FRAME_ACK, 3):
+            pass
+        self.assertEqual(write_func.data, frame_data("", FRAME_NACK, 3))
+        self.assertEqual(hdlc_c.get_stats().keepalives_sent, 1)
+
+        hdlc_c.stop()
+
+    def test_reconnect(self):
+        """
+        Tests that the frames not acknowledged yet are kept when the port
+        fails, and sent again at once through the new port.
+        """
+
+        def read_func() -> bytes:
+            return b""
+
+        def write_func(data: bytes) -> None:
+            raise OSError("Device gone")
+
+        def port_error_callback(err: OSError) -> None:
+            port_error_callback.errors.append(err)
+
+        def new_read_func() -> bytes:
+            if not new_read_func.frames:
+                return b""
+
+            return new_read_func.frames.pop(0)
+
+        def new_write_func(data: bytes) -> None:
+            new_write_func.frames.append(data)
+
+        port_error_callback.errors = []
+        new_read_func.frames = []
+        new_write_func.frames = []
+
+        hdlc_c = HDLController(read_func, write_func, sending_timeout=Timeout(10.0))
+        hdlc_c.set_port_error_callback(port_error_callback)
+        hdlc_c.start()
+
+        hdlc_c.send(b"test_0")
+        while hdlc_c.is_connected():
+            pass
+        hdlc_c.send(b"test_1")
+
+        self.assertEqual(len(port_error_callback.errors), 1)
+        self.assertEqual(hdlc_c.get_senders_number(), 2)
+
+        hdlc_c.reconnect(new_read_func, new_write_func)
+        while len(new_write_func.frames) < 2:
+            pass
+
+        self.assertTrue(hdlc_c.is_connected())
+        self.assertEqual(
+            sorted(new_write_func.frames),
+            sorted(
+                [
+                    frame_data("test_0", FRAME_DATA, 0),
+                    frame_data("test_1", FRAME_DATA, 1),
+                ]
+            ),
+        )
+
+        new_read_func.frames = [
+            frame_data("", FRAME_ACK, 1) + frame_data("", FRAME_ACK, 2)
+        ]
+        while hdlc_c.get_senders_number() > 0:
+            pass
+
+        stats = hdlc_c.get_stats()
+        self.assertEqual(stats.frames_sent, 2)
+        self.assertEqual(stats.retransmissions, 1)
+        self.assertEqual(stats.frames_acked, 2)
+        self.assertEqual(stats.port_errors, 1)
+
+        hdlc_c.stop()
+
+    def test_send_frame_larger_than_max_frame_size(self):
+        """
+        Tests that frames which could be larger than the maximum frame size
+        are refused.
+        """
+
+        def read_func() -> bytes:
+            return b""
+
+        def write_func(data: bytes) -> None:
+            write_func.data = data
+
+        hdlc_c = HDLController(read_func, write_func, max_frame_size=16)
+
+        with self.assertRaises(ValueError):
+            hdlc_c.send(b"\x7e" * 5)
+
+        with self.assertRaises(ValueError):
+            hdlc_c.send("\x7e" * 5)
+
+        with self.assertRaises(ValueError):
+            hdlc_c.send(b"x" * (HDLController.MAX_DATA_SIZE + 1))
+
+        self.assertEqual(hdlc_c.get_senders_number(), 0)
+        self.assertEqual(hdlc_c.get_stats().frames_rejected, 3)
+
+        write_func.data = None
+        hdlc_c.send(b"test")
+        while write_func.data is None:
+            pass
+        self.assertEqual(write_func.data, frame_data("test", FRAME_DATA, 0))
+
+        hdlc_c.stop()
+
     def test_send_frame_and_receive_ack(self):
         """
         Tests the reception of an ACK frame after having sent a DATA one.
@@ -245,6 +509,43 @@ class TestHDLCController(unittest.TestCase):
 
         hdlc_c.stop()
 
+    def test_send_frame_and_receive_ack_stats(self):
+        """
+        Tests the ACK callback and the counters once a DATA frame has been
+        acknowledged.
+        """
+
+        def read_func() -> bytes:
+            return frame_data("", FRAME_ACK, 1)
+
+        def write_func(_: bytes) -> None:
+            pass
+
+        def ack_callback(data: bytes, latency: float) -> None:
+            ack_callback.acks.append((data, latency))
+
+        ack_callback.acks = []
+
+        hdlc_c = HDLController(read_func, write_func)
+        hdlc_c.set_ack_callback(ack_callback)
+
+        hdlc_c.send(b"test")
+        hdlc_c.start()
+
+        while hdlc_c.get_stats().frames_acked == 0 or not ack_callback.acks:
+            pass
+
+        self.assertEqual(len(ack_callback.acks), 1)
+        self.assertEqual(ack_callback.acks[0][0], b"test")
+        self.assertGreaterEqual(ack_callback.acks[0][1], 0.0)
+
+        stats = hdlc_c.get_stats()
+        self.assertEqual(stats.frames_sent, 1)
+        self.assertEqual(stats.frames_acked, 1)
+        self.assertEqual(stats.retransmissions, 0)
+
+        hdlc_c.stop()
+
     def test_send_frame_and_receive_bad_ack(self):
         """
         Tests the reception of an invalid ACK frame after having sent a DATA
@@ -341,6 +642,233 @@ class TestHDLCController(unittest.TestCase):
 
         hdlc_c.stop()
 
+    def test_receive_duplicate_frame(self):
+        """
+        Tests that a retransmitted DATA frame is acknowledged again but only
+        delivered once.
+        """
+
+        def read_func() -> bytes:
+            if not read_func.frames:
+                return b""
+
+            return read_func.frames.pop(0)
+
+        def write_func(data: bytes) -> None:
+            write_func.acks.append(data)
+
+        read_func.frames = [
+            frame_data("test_0", FRAME_DATA, 0),
+            frame_data("test_0", FRAME_DATA, 0),
+            frame_data("test_1", FRAME_DATA, 1),
+        ]
+        write_func.acks = []
+
+        hdlc_c = HDLController(read_func, write_func, receive_window=4)
+
+        hdlc_c.start()
+        self.assertEqual(hdlc_c.get_data(), b"test_0")
+        self.assertEqual(hdlc_c.get_data(), b"test_1")
+        while len(write_func.acks) < 3:
+            sleep(0.01)
+        self.assertEqual(
+            write_func.acks,
+            [
+                frame_data("", FRAME_ACK, 1),
+                frame_data("", FRAME_ACK, 1),
+                frame_data("", FRAME_ACK, 2),
+            ],
+        )
+
+        stats = hdlc_c.get_stats()
+        self.assertEqual(stats.frames_received, 2)
+        self.assertEqual(stats.duplicates_received, 1)
+        self.assertEqual(stats.duplicate_bytes, 6)
+
+        hdlc_c.stop()
+
+    def test_receive_frames_beyond_receive_window(self):
+        """
+        Tests that DATA frames beyond the receive window are neither
+        delivered nor acknowledged, and are accepted once the window has
+        moved.
+        """
+
+        def read_func() -> bytes:
+            if not read_func.frames:
+                return b""
+
+            return read_func.frames.pop(0)
+
+        def write_func(data: bytes) -> None:
+            write_func.acks.append(data)
+
+        read_func.frames = [
+            frame_data("test_{0}".format(seq_no), FRAME_DATA, seq_no)
+            for seq_no in (1, 2, 3, 4, 0, 3, 4)
+        ]
+        write_func.acks = []
+
+        hdlc_c = HDLController(read_func, write_func, receive_window=3)
+
+        hdlc_c.start()
+        for seq_no in (1, 2, 0, 3, 4):
+            self.assertEqual(hdlc_c.get_data(), "test_{0}".format(seq_no).encode())
+        while len(write_func.acks) < 5:
+            sleep(0.01)
+        self.assertEqual(
+            write_func.acks,
+            [frame_data("", FRAME_ACK, seq_no) for seq_no in (2, 3, 1, 4, 5)],
+        )
+        self.assertEqual(hdlc_c.get_stats().duplicates_received, 0)
+
+        hdlc_c.stop()
+
+    def test_receive_window_reset(self):
+        """
+        Tests that the receive window follows the sequence number of a reset
+        frame, sent by the other end once it has dropped its frames.
+        """
+
+        def read_func() -> bytes:
+            if not read_func.frames:
+                return b""
+
+            return read_func.frames.pop(0)
+
+        def write_func(data: bytes) -> None:
+            write_func.acks.append(data)
+
+        read_func.frames = [
+            frame_data(HDLController.RESET_MAGIC, FRAME_DATA, 3),
+            frame_data("test", FRAME_DATA, 3),
+        ]
+        write_func.acks = []
+
+        hdlc_c = HDLController(read_func, write_func, receive_window=3)
+
+        hdlc_c.start()
+        self.assertEqual(hdlc_c.get_data(), b"test")
+        while not write_func.acks:
+            pass
+        self.assertEqual(write_func.acks, [frame_data("", FRAME_ACK, 4)])
+        self.assertEqual(hdlc_c.get_stats().frames_received, 1)
+
+        hdlc_c.stop()
+
+    def test_send_window_starts_at_oldest_frame(self):
+        """
+        Tests that a new frame is not sent while the frame sent a window
+        earlier has not been acknowledged, even if the others have.
+        """
+
+        def read_func() -> bytes:
+            if not read_func.frames:
+                return b""
+
+            return read_func.frames.pop(0)
+
+        def write_func(data: bytes) -> None:
+            write_func.frames.append(data)
+
+        read_func.frames = []
+        write_func.frames = []
+
+        hdlc_c = HDLController(read_func, write_func, window=3)
+        hdlc_c.start()
+
+        for i in range(3):
+            hdlc_c.send("test_{0}".format(i).encode())
+
+        read_func.frames = [frame_data("", FRAME_ACK, 2), frame_data("", FRAME_ACK, 3)]
+        while hdlc_c.get_senders_number() > 1:
+            sleep(0.01)
+
+        thread = Thread(target=hdlc_c.send, args=(b"test_3",))
+        thread.start()
+        sleep(0.1)
+        self.assertTrue(thread.is_alive())
+        self.assertEqual(len(write_func.frames), 3)
+
+        read_func.frames = [frame_data("", FRAME_ACK, 1)]
+        thread.join()
+        while len(write_func.frames) < 4:
+            sleep(0.01)
+        self.assertEqual(write_func.frames[3], frame_data("test_3", FRAME_DATA, 3))
+
+        hdlc_c.stop()
+
+    def test_bad_receive_window(self):
+        """
+        Tests that a receive window larger than half of the sequence number
+        space is refused.
+        """
+
+        def read_func() -> bytes:
+            return b""
+
+        def write_func(_: bytes) -> None:
+            pass
+
+        with self.assertRaises(ValueError):
+            HDLController(read_func, write_func, receive_window=5)
+
+    def test_receive_frame_records(self):
+        """
+        Tests that frame records carry the receive timestamp, the sequence
+        number and the duplicate and retransmission flags.
+        """
+
+        def read_func() -> bytes:
+            if not read_func.frames:
+                return b""
+
+            return read_func.frames.pop(0)
+
+        def write_func(_: bytes) -> None:
+            pass
+
+        corrupted = bytearray(frame_data("test_1", FRAME_DATA, 1))
+        corrupted[7] ^= 0x01
+        read_func.frames = [
+            frame_data("test_0", FRAME_DATA, 0),
+            frame_data("test_0", FRAME_DATA, 0),
+            bytes(corrupted),
+            frame_data("test_1", FRAME_DATA, 1),
+        ]
+
+        clock = VirtualClock(start=42.0)
+        hdlc_c = HDLController(
+            read_func, write_func, clock=clock, receive_window=4, frame_records=True
+        )
+
+        hdlc_c.start()
+
+        record = hdlc_c.get_frame()
+        self.assertEqual(record.data, b"test_0")
+        self.assertEqual(record.timestamp, 42.0)
+        self.assertEqual(record.seq_no, 0)
+        self.assertFalse(record.duplicate)
+        self.assertFalse(record.retransmission)
+
+        for _ in range(3):
+            self.assertTrue(clock.wait_for_waiters(1))
+            clock.advance(0.001)
+
+        record = hdlc_c.get_frame()
+        self.assertEqual(record.data, b"test_0")
+        self.assertTrue(record.duplicate)
+        self.assertTrue(record.retransmission)
+
+        record = hdlc_c.get_frame()
+        self.assertEqual(record.data, b"test_1")
+        self.assertEqual(record.seq_no, 1)
+        self.assertFalse(record.duplicate)
+        self.assertTrue(record.retransmission)
+        self.assertGreater(record.timestamp, 42.0)
+
+        hdlc_c.stop()
+
     def test_receive_one_corrupted_frame_and_send_back_nack(self):
         """
         Tests the reception of a corrupted DATA frame and the emission of an
@@ -387,3 +915,93 @@ class TestHDLCController(unittest.TestCase):
         self.assertEqual(write_func.data, None)
 
         hdlc_c.stop()
+
+    def test_receive_piggybacked_ack(self):
+        """
+        Tests the reception of a DATA frame acknowledging a sent one with
+        piggybacked ACKs enabled.
+        """
+
+        def read_func() -> bytes:
+            # Acknowledges the DATA frame with the sequence number 0.
+            return frame_data(b"\x01test", FRAME_DATA, 0)
+
+        def write_func(data: bytes) -> None:
+            write_func.data = data
+
+        hdlc_c = HDLController(read_func, write_func, piggyback_acks=True)
+
+        write_func.data = None
+        hdlc_c.send(b"test")
+        while write_func.data is None:
+            pass
+        self.assertEqual(write_func.data, frame_data(b"\x00test", FRAME_DATA, 0))
+
+        hdlc_c.start()
+        self.assertEqual(hdlc_c.get_data(), b"test")
+        sleep(1)
+        self.assertEqual(hdlc_c.get_senders_number(), 0)
+
+        hdlc_c.stop()
+
+    def test_send_text_frame_with_piggybacked_acks(self):
+        """
+        Tests that a text frame is sent with piggybacked ACKs enabled.
+        """
+
+        def read_func() -> bytes:
+            return b""
+
+        def write_func(data: bytes) -> None:
+            write_func.data = data
+
+        hdlc_c = HDLController(read_func, write_func, piggyback_acks=True)
+
+        write_func.data = None
+        hdlc_c.send("test")
+        while write_func.data is None:
+            pass
+        self.assertEqual(write_func.data, frame_data(b"\x00test", FRAME_DATA, 0))
+
+        hdlc_c.stop()
+
+    def test_receive_one_frame_and_delay_ack(self):
+        """
+        Tests that a standalone ACK frame is sent after the ACK delay when
+        there is no DATA frame to carry it.
+        """
+
+        def read_func() -> bytes:
+            if read_func.sent:
+                return b""
+
+            read_func.sent = True
+            return frame_data(b"\x00test", FRAME_DATA, 2)
+
+        def write_func(data: bytes) -> None:
+            write_func.data = data
+
+        read_func.sent = False
+
+        clock = VirtualClock()
+        hdlc_c = HDLController(
+            read_func,
+            write_func,
+            clock=clock,
+            piggyback_acks=True,
+            ack_delay=Timeout(0.1),
+        )
+
+        write_func.data = None
+        hdlc_c.start()
+        self.assertEqual(hdlc_c.get_data(), b"test")
+        self.assertTrue(clock.wait_for_waiters(1))
+        self.assertEqual(write_func.data, None)
+
+        clock.advance(0.1)
+        while write_func.data is None:
+            pass
+        self.assertEqual(write_func.data, frame_data("", FRAME_ACK, 3))
+        self.assertEqual(hdlc_c.get_stats().acks_sent, 1)
+
+        hdlc_c.stop()
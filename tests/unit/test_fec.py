@@ -0,0 +1,189 @@
+"""
+Unit tests for the forward error correction.
+"""
+
+import unittest
+from random import Random
+
+from yahdlc import FRAME_DATA, frame_data
+
+from hdlcontroller.fec import (
+    FEC,
+    UncorrectableError,
+    protected_size,
+    rs_decode,
+    rs_encode,
+)
+from hdlcontroller.hdlcontroller import HDLController
+from hdlcontroller.simulator import LinkSimulator
+
+
+def corrupt(data: bytes, positions, rng: Random) -> bytes:
+    """
+    Corrupts the bytes at the given positions without creating nor removing
+    any flag or escape sequence.
+    """
+
+    corrupted = bytearray(data)
+
+    for position in positions:
+        while corrupted[position] in (0x7D, 0x7E) or corrupted[position - 1] == 0x7D:
+            position += 1
+
+        value = rng.randrange(256)
+
+        while value in (0x7D, 0x7E) or value == corrupted[position]:
+            value = rng.randrange(256)
+
+        corrupted[position] = value
+
+    return bytes(corrupted)
+
+
+class TestReedSolomon(unittest.TestCase):
+    """
+    Tests the Reed-Solomon codec.
+    """
+
+    def test_correct_errors(self):
+        """
+        Tests that up to half as many errors as parity bytes are corrected,
+        wherever they are.
+        """
+
+        rng = Random(1)
+
+        for parity in (2, 8, 32):
+            for _ in range(50):
+                data = bytes(rng.randrange(256) for _ in range(rng.randint(1, 100)))
+                block = bytearray(rs_encode(data, parity))
+                errors = rng.randint(0, parity // 2)
+
+                for position in rng.sample(range(len(block)), errors):
+                    block[position] ^= rng.randint(1, 255)
+
+                self.assertEqual(rs_decode(bytes(block), parity), (data, errors))
+
+    def test_too_many_errors(self):
+        """
+        Tests that a block with too many errors is detected.
+        """
+
+        block = bytearray(rs_encode(b"test" * 10, 4))
+
+        for position in (0, 10, 20):
+            block[position] ^= 0xFF
+
+        with self.assertRaises(UncorrectableError):
+            rs_decode(bytes(block), 4)
+
+
+class TestFEC(unittest.TestCase):
+    """
+    Tests the FEC layer.
+    """
+
+    def test_bad_parameters(self):
+        """
+        Tests that bad parities are refused.
+        """
+
+        with self.assertRaises(ValueError):
+            FEC(parity=0)
+
+        with self.assertRaises(ValueError):
+            FEC(min_parity=8, max_parity=4)
+
+        with self.assertRaises(ValueError):
+            FEC(max_parity=65)
+
+    def test_correct_frame(self):
+        """
+        Tests that a frame spanning several blocks is corrected.
+        """
+
+        rng = Random(2)
+        fec = FEC(parity=4)
+        frame = frame_data(bytes(range(256)) * 2, FRAME_DATA, 3)
+        protected = fec.encode(frame)
+
+        self.assertEqual(fec.decode(protected), frame)
+        self.assertEqual(fec.decode(corrupt(protected, (10, 20, 300, 500), rng)), frame)
+
+        stats = fec.get_stats()
+        self.assertEqual(stats.frames_encoded, 1)
+        self.assertEqual(stats.frames_decoded, 2)
+        self.assertEqual(stats.frames_corrected, 1)
+        self.assertEqual(stats.bytes_corrected, 4)
+        self.assertEqual(stats.frames_uncorrectable, 0)
+
+    def test_bounded_read(self):
+        """
+        Tests that the protected frames which cannot hold a frame of the
+        maximum frame size are dropped, and the others corrected.
+        """
+
+        frame = frame_data(b"\x7e" * 50, FRAME_DATA, 0)
+        protected = FEC(parity=64).encode(frame)
+        self.assertLessEqual(len(protected), protected_size(len(frame)))
+
+        reads = [protected, FEC(parity=4).encode(frame_data(b"x" * 500, FRAME_DATA, 1))]
+        read = FEC().wrap_read(lambda: reads.pop(0), max_frame_size=len(frame))
+
+        self.assertEqual(read(), frame)
+        self.assertEqual(read(), b"")
+
+    def test_adaptive_parity(self):
+        """
+        Tests that the parity is doubled when a frame cannot be corrected,
+        and brought down when the frames received are clean.
+        """
+
+        rng = Random(3)
+        fec = FEC(parity=4, adaptive=True, adapt_interval=4)
+        protected = FEC(parity=4).encode(frame_data("test" * 10, FRAME_DATA, 0))
+
+        fec.decode(corrupt(protected, (5, 10, 15), rng))
+        self.assertEqual(fec.get_stats().frames_uncorrectable, 1)
+        self.assertEqual(fec.get_stats().parity, 8)
+
+        for _ in range(4):
+            fec.decode(corrupt(protected, (5,), rng))
+
+        self.assertEqual(fec.get_stats().parity, 6)
+
+        for _ in range(8):
+            fec.decode(protected)
+
+        self.assertEqual(fec.get_stats().parity, 2)
+
+    def test_controllers_over_noisy_link(self):
+        """
+        Tests that corrupted frames are delivered without being sent again.
+        """
+
+        rng = Random(4)
+        link = LinkSimulator(seed=1)
+
+        def noisy_write(data: bytes) -> int:
+            return link.a.write(corrupt(data, (len(data) // 2,), rng))
+
+        hdlc_a = HDLController(link.a.read, noisy_write, fec=FEC(parity=4))
+        fec_b = FEC(parity=4)
+        hdlc_b = HDLController(*link.b, fec=fec_b)
+
+        hdlc_a.start()
+        hdlc_b.start()
+
+        for i in range(10):
+            hdlc_a.send("test_{0}".format(i).encode())
+
+        for i in range(10):
+            self.assertEqual(hdlc_b.get_data(), "test_{0}".format(i).encode())
+
+        hdlc_a.stop()
+        hdlc_b.stop()
+
+        self.assertEqual(hdlc_b.get_stats().fcs_errors, 0)
+        self.assertEqual(hdlc_a.get_stats().retransmissions, 0)
+        self.assertEqual(fec_b.get_stats().frames_corrected, 10)
@@ -0,0 +1,87 @@
+"""
+Unit tests for the HDLC framing helpers.
+"""
+
+import unittest
+
+from yahdlc import FRAME_DATA, frame_data
+
+from hdlcontroller.framing import FrameScanner
+
+
+class TestFrameScanner(unittest.TestCase):
+    """
+    Tests the frame scanner.
+    """
+
+    def test_one_frame(self):
+        """
+        Feeds one complete frame.
+        """
+
+        frame = frame_data("test", FRAME_DATA, 0)
+        scanner = FrameScanner()
+
+        self.assertEqual(scanner.feed(frame), [frame])
+
+    def test_split_frame(self):
+        """
+        Feeds one frame split byte by byte.
+        """
+
+        frame = frame_data("test", FRAME_DATA, 0)
+        scanner = FrameScanner()
+        frames = []
+
+        for i in range(len(frame)):
+            frames += scanner.feed(frame[i : i + 1])
+
+        self.assertEqual(frames, [frame])
+
+    def test_several_frames_in_one_chunk(self):
+        """
+        Feeds several frames at once, with and without shared flags.
+        """
+
+        frame_1 = frame_data("test_1", FRAME_DATA, 1)
+        frame_2 = frame_data("test_2", FRAME_DATA, 2)
+        scanner = FrameScanner()
+
+        self.assertEqual(scanner.feed(frame_1 + frame_2), [frame_1, frame_2])
+        self.assertEqual(
+            scanner.feed(frame_1 + frame_2[1:]),
+            [frame_1, frame_2],
+        )
+
+    def test_garbage(self):
+        """
+        Feeds data without any flag sequence.
+        """
+
+        scanner = FrameScanner()
+
+        self.assertEqual(scanner.feed(b"test"), [])
+        self.assertEqual(len(scanner.buffer), 0)
+
+    def test_max_frame_size(self):
+        """
+        Feeds frames larger than the maximum frame size, complete and split
+        across several reads.
+        """
+
+        small = frame_data("test", FRAME_DATA, 0)
+        large = frame_data("test" * 8, FRAME_DATA, 1)
+        scanner = FrameScanner(max_frame_size=len(small))
+
+        self.assertEqual(scanner.feed(large + small), [small])
+        self.assertEqual(scanner.oversized_frames, 1)
+
+        for i in range(0, len(large), 4):
+            self.assertEqual(scanner.feed(large[i : i + 4]), [])
+            self.assertLessEqual(len(scanner.buffer), len(small))
+
+        self.assertEqual(scanner.feed(small), [small])
+        self.assertEqual(scanner.oversized_frames, 2)
+
+        with self.assertRaises(ValueError):
+            FrameScanner(max_frame_size=5)
@@ -0,0 +1,124 @@
+"""
+Unit tests for the gateway.
+"""
+
+import unittest
+from socket import SOCK_DGRAM, socket
+
+from hdlcontroller.gateway import LENGTH, Gateway, parse_endpoint
+from hdlcontroller.hdlcontroller import HDLController
+from hdlcontroller.simulator import LinkSimulator
+
+
+class TestGateway(unittest.TestCase):
+    """
+    Tests the forwarding of frames between an HDLC link and a socket.
+    """
+
+    def setUp(self):
+        link = LinkSimulator()
+        self.local = HDLController(*link.a, frames_queue_size=16)
+        self.remote = HDLController(*link.b)
+        self.local.start()
+        self.remote.start()
+
+    def tearDown(self):
+        self.local.stop()
+        self.remote.stop()
+
+    def test_bad_protocol(self):
+        """
+        Tests that an unknown protocol is refused.
+        """
+
+        with self.assertRaises(ValueError):
+            Gateway(self.local, "127.0.0.1", 1, protocol="sctp")
+
+    def test_parse_endpoint(self):
+        """
+        Tests the parsing of the endpoints.
+        """
+
+        self.assertEqual(parse_endpoint("localhost:5000"), ("localhost", 5000))
+        self.assertEqual(parse_endpoint(":5000"), ("127.0.0.1", 5000))
+
+        with self.assertRaises(ValueError):
+            parse_endpoint("localhost")
+
+    def test_udp(self):
+        """
+        Tests that each frame is forwarded as one datagram, in both
+        directions.
+        """
+
+        endpoint = socket(type=SOCK_DGRAM)
+        endpoint.bind(("127.0.0.1", 0))
+        endpoint.settimeout(5.0)
+
+        gateway = Gateway(self.local, *endpoint.getsockname())
+        gateway.start()
+
+        self.remote.send(b"test_1")
+        self.remote.send(b"test_2")
+        self.assertEqual(endpoint.recv(1024), b"test_1")
+        data, address = endpoint.recvfrom(1024)
+        self.assertEqual(data, b"test_2")
+
+        # Too large for a frame.
+        endpoint.sendto(b"x" * 1024, address)
+        endpoint.sendto(b"test_3", address)
+        self.assertEqual(self.remote.get_data(), b"test_3")
+
+        gateway.stop(timeout=1.0)
+        endpoint.close()
+
+        stats = gateway.get_stats()
+        self.assertEqual(stats.frames_to_socket, 2)
+        self.assertEqual(stats.frames_to_serial, 1)
+        self.assertEqual(stats.frames_dropped, 1)
+        self.assertEqual(stats.connections, 1)
+
+    def test_tcp(self):
+        """
+        Tests that the frames are forwarded with a length prefix over a
+        persistent TCP connection, in both directions.
+        """
+
+        server = socket()
+        server.bind(("127.0.0.1", 0))
+        server.listen(1)
+        server.settimeout(5.0)
+
+        gateway = Gateway(self.local, *server.getsockname(), protocol="tcp")
+        gateway.start()
+
+        connection, _ = server.accept()
+        connection.settimeout(5.0)
+
+        for i in range(3):
+            self.remote.send("test_{0}".format(i).encode())
+
+        expected = b"".join(
+            LENGTH.pack(6) + "test_{0}".format(i).encode() for i in range(3)
+        )
+        received = b""
+
+        while len(received) < len(expected):
+            received += connection.recv(1024)
+
+        self.assertEqual(received, expected)
+
+        # A message split across two segments is reassembled.
+        message = LENGTH.pack(6) + b"test_3"
+        connection.sendall(message[:3])
+        connection.sendall(message[3:])
+        self.assertEqual(self.remote.get_data(), b"test_3")
+
+        gateway.stop(timeout=1.0)
+        connection.close()
+        server.close()
+
+        stats = gateway.get_stats()
+        self.assertEqual(stats.frames_to_socket, 3)
+        self.assertEqual(stats.frames_to_serial, 1)
+        self.assertEqual(stats.connections, 1)
@@ -0,0 +1,106 @@
+"""
+Unit tests for the load generator.
+"""
+
+import unittest
+
+from hdlcontroller.hdlcontroller import HDLController
+from hdlcontroller.load import LoadGenerator, parse_size_range
+from hdlcontroller.simulator import LinkSimulator
+
+
+class TestLoadGenerator(unittest.TestCase):
+    """
+    Tests the load generator.
+    """
+
+    def setUp(self):
+        link = LinkSimulator(bandwidth=100000, latency=0.001, seed=1)
+        self.hdlc_a = HDLController(*link.a)
+        self.hdlc_b = HDLController(*link.b)
+
+    def tearDown(self):
+        self.hdlc_a.stop()
+        self.hdlc_b.stop()
+
+    def test_parse_size_range(self):
+        """
+        Payload sizes are given as a fixed size or a range.
+        """
+
+        self.assertEqual(parse_size_range("32"), (32, 32))
+        self.assertEqual(parse_size_range("16-256"), (16, 256))
+
+        for spec in ("0", "256-16", "abc"):
+            with self.assertRaises(ValueError):
+                parse_size_range(spec)
+
+    def test_bad_sizes(self):
+        """
+        Payloads larger than the frames of the controller are refused.
+        """
+
+        with self.assertRaises(ValueError):
+            LoadGenerator(self.hdlc_a, max_size=HDLController.MAX_DATA_SIZE + 1)
+
+        hdlc_c = HDLController(*LinkSimulator().a, piggyback_acks=True)
+
+        with self.assertRaises(ValueError):
+            LoadGenerator(hdlc_c, max_size=HDLController.MAX_DATA_SIZE)
+
+    def test_frames_too_large(self):
+        """
+        Producers skip the payloads too large for ``max_frame_size``.
+        """
+
+        link = LinkSimulator(bandwidth=100000, latency=0.001, seed=1)
+        hdlc_a = HDLController(*link.a, max_frame_size=48)
+        hdlc_b = HDLController(*link.b)
+        generator = LoadGenerator(hdlc_a, min_size=8, max_size=64, seed=1)
+        reports = []
+
+        hdlc_a.start()
+        hdlc_b.start()
+        generator.run(duration=0.2, interval=0.1, callback=reports.append)
+        hdlc_a.stop()
+        hdlc_b.stop()
+
+        self.assertGreater(sum(report.frames_acked for report in reports), 0)
+        self.assertGreater(hdlc_a.get_stats().frames_rejected, 0)
+
+    def test_max_load(self):
+        """
+        Saturating the link gets frames acknowledged and reported.
+        """
+
+        generator = LoadGenerator(
+            self.hdlc_a, min_size=8, max_size=64, producers=2, seed=1
+        )
+        reports = []
+
+        self.hdlc_a.start()
+        self.hdlc_b.start()
+        generator.run(duration=0.3, interval=0.1, callback=reports.append)
+
+        self.assertGreaterEqual(len(reports), 3)
+        self.assertGreater(sum(report.frames_acked for report in reports), 0)
+        self.assertGreater(reports[-1].latency_p99, 0.0)
+        self.assertGreater(reports[-1].window_stalls, 0)
+        self.assertEqual(self.hdlc_a.get_stats().retransmissions, 0)
+
+    def test_rate(self):
+        """
+        The offered load follows the configured rate.
+        """
+
+        generator = LoadGenerator(self.hdlc_a, rate=50, burst=2, seed=1)
+        reports = []
+
+        self.hdlc_a.start()
+        self.hdlc_b.start()
+        generator.run(duration=0.4, interval=0.4, callback=reports.append)
+
+        offered = sum(report.frames_offered for report in reports)
+
+        self.assertGreaterEqual(offered, 14)
+        self.assertLessEqual(offered, 26)
@@ -0,0 +1,160 @@
+"""
+Unit tests for the multi-drop stations.
+"""
+
+import unittest
+from time import sleep
+
+from hdlcontroller.multidrop import MAX_DATA_SIZE, PrimaryStation, SecondaryStation
+from hdlcontroller.simulator import Bus
+
+
+class TestMultiDrop(unittest.TestCase):
+    """
+    Tests the primary and secondary stations of a multi-drop link.
+    """
+
+    def test_bad_parameters(self):
+        """
+        Tests that bad addresses and windows are refused.
+        """
+
+        bus = Bus()
+
+        with self.assertRaises(ValueError):
+            PrimaryStation(*bus.endpoint(), addresses=[])
+
+        with self.assertRaises(ValueError):
+            PrimaryStation(*bus.endpoint(), addresses=[1, 1])
+
+        with self.assertRaises(ValueError):
+            PrimaryStation(*bus.endpoint(), addresses=[0xFF])
+
+        with self.assertRaises(ValueError):
+            PrimaryStation(*bus.endpoint(), addresses=[1], window=8)
+
+        with self.assertRaises(ValueError):
+            SecondaryStation(*bus.endpoint(), address=0xFF)
+
+    def test_payload_too_large(self):
+        """
+        Tests that the payloads which would not fit in a frame along with
+        the address and the control field are refused.
+        """
+
+        bus = Bus()
+        primary = PrimaryStation(*bus.endpoint(), addresses=[1])
+        secondary = SecondaryStation(*bus.endpoint(), address=1)
+
+        with self.assertRaises(ValueError):
+            primary.send(1, b"x" * (MAX_DATA_SIZE + 1))
+
+        with self.assertRaises(ValueError):
+            secondary.send(b"x" * (MAX_DATA_SIZE + 1))
+
+        primary.send(1, b"x" * MAX_DATA_SIZE)
+        self.assertEqual(len(primary.links[1].outgoing), 1)
+
+    def test_exchange_with_two_secondaries(self):
+        """
+        Tests that each secondary station only gets the frames addressed to
+        it, and that the primary station knows where its frames come from.
+        """
+
+        bus = Bus()
+        primary = PrimaryStation(*bus.endpoint(), addresses=[1, 2])
+        secondaries = {
+            address: SecondaryStation(*bus.endpoint(), address=address)
+            for address in (1, 2)
+        }
+
+        primary.start()
+        for secondary in secondaries.values():
+            secondary.start()
+
+        for i in range(5):
+            primary.send(1, "to_1_{0}".format(i).encode())
+            primary.send(2, "to_2_{0}".format(i).encode())
+            secondaries[2].send("from_2_{0}".format(i).encode())
+
+        for i in range(5):
+            self.assertEqual(
+                secondaries[1].get_data(), (1, "to_1_{0}".format(i).encode())
+            )
+            self.assertEqual(
+                secondaries[2].get_data(), (2, "to_2_{0}".format(i).encode())
+            )
+            self.assertEqual(primary.get_data(), (2, "from_2_{0}".format(i).encode()))
+
+        self.assertTrue(secondaries[1].frames_received.empty())
+        self.assertTrue(primary.frames_received.empty())
+
+        primary.stop()
+        for secondary in secondaries.values():
+            secondary.stop()
+
+        self.assertEqual(primary.get_stats(1).frames_received, 0)
+        self.assertEqual(primary.get_stats(2).frames_received, 5)
+        self.assertEqual(secondaries[1].get_stats().frames_received, 5)
+        self.assertEqual(primary.get_stats().frames_sent, 10)
+
+    def test_lost_answer_is_sent_again(self):
+        """
+        Tests that the frames of a lost answer are sent again at the next
+        poll and delivered once.
+        """
+
+        bus = Bus()
+        primary = PrimaryStation(*bus.endpoint(), addresses=[1], response_timeout=0.02)
+        read, write = bus.endpoint()
+
+        def lossy_write(data: bytes) -> int:
+            if not lossy_write.dropped:
+                lossy_write.dropped = True
+                return len(data)
+
+            return write(data)
+
+        lossy_write.dropped = False
+        secondary = SecondaryStation(read, lossy_write, address=1)
+
+        secondary.send(b"test_1")
+        secondary.send(b"test_2")
+
+        primary.start()
+        secondary.start()
+
+        self.assertEqual(primary.get_data(), (1, b"test_1"))
+        self.assertEqual(primary.get_data(), (1, b"test_2"))
+
+        primary.stop()
+        secondary.stop()
+
+        self.assertTrue(primary.frames_received.empty())
+        self.assertGreaterEqual(primary.get_stats(1).timeouts, 1)
+        self.assertGreaterEqual(secondary.get_stats().retransmissions, 2)
+
+    def test_idle_station_is_polled_less_often(self):
+        """
+        Tests that a station which does not answer is polled less and less
+        often.
+        """
+
+        bus = Bus()
+        primary = PrimaryStation(
+            *bus.endpoint(),
+            addresses=[1],
+            response_timeout=0.005,
+            poll_interval=0.005,
+            max_poll_interval=0.1,
+        )
+
+        primary.start()
+        sleep(0.3)
+        primary.stop()
+
+        # Without the back-off, the station would be polled 60 times.
+        stats = primary.get_stats(1)
+        self.assertGreaterEqual(stats.polls, 2)
+        self.assertLessEqual(stats.polls, 10)
+        self.assertEqual(stats.timeouts, stats.polls)
@@ -0,0 +1,192 @@
+"""
+Unit tests for the link parameter negotiation.
+"""
+
+import unittest
+from threading import Thread
+from time import sleep
+
+from yahdlc import get_data
+
+from hdlcontroller.hdlcontroller import HDLController, Timeout
+from hdlcontroller.negotiation import (
+    FEATURE_PIGGYBACK_ACKS,
+    Capabilities,
+    decode_xid,
+    encode_xid,
+    settle,
+)
+from hdlcontroller.simulator import LinkSimulator
+from hdlcontroller.tuning import Tuner
+
+
+class TestNegotiation(unittest.TestCase):
+    """
+    Tests the negotiation of the link parameters.
+    """
+
+    def test_encode_and_decode(self):
+        """
+        Tests that capabilities are decoded as they have been encoded, and
+        that other payloads are not taken for capabilities.
+        """
+
+        capabilities = Capabilities(7, FEATURE_PIGGYBACK_ACKS, None)
+
+        self.assertEqual(
+            decode_xid(encode_xid(capabilities, True)), (capabilities, True)
+        )
+        self.assertEqual(
+            decode_xid(encode_xid(Capabilities(3, 0, 256), False)),
+            (Capabilities(3, 0, 256), False),
+        )
+        self.assertIsNone(decode_xid(b"test"))
+
+    def test_settle(self):
+        """
+        Tests that the best parameters supported by both ends are settled.
+        """
+
+        self.assertEqual(
+            settle(
+                Capabilities(7, FEATURE_PIGGYBACK_ACKS, None),
+                Capabilities(3, 0, 256),
+            ),
+            Capabilities(3, 0, 256),
+        )
+        self.assertEqual(
+            settle(
+                Capabilities(5, FEATURE_PIGGYBACK_ACKS, 512),
+                Capabilities(7, FEATURE_PIGGYBACK_ACKS, 1024),
+            ),
+            Capabilities(5, FEATURE_PIGGYBACK_ACKS, 512),
+        )
+
+    def test_controllers_negotiate(self):
+        """
+        Tests that two controllers settle on the same parameters and then
+        exchange frames, even when the last capabilities sent are lost.
+        """
+
+        link = LinkSimulator(seed=1)
+
+        def write_a(data: bytes) -> int:
+            payload, _, _ = get_data(data)
+
+            if not write_a.dropped and payload.startswith(b"\xffXID\x01"):
+                write_a.dropped = True
+                return len(data)
+
+            return link.a.write(data)
+
+        write_a.dropped = False
+
+        hdlc_a = HDLController(
+            link.a.read,
+            write_a,
+            window=7,
+            piggyback_acks=True,
+            sending_timeout=Timeout(0.5),
+            negotiate=True,
+        )
+        hdlc_b = HDLController(
+            *link.b,
+            window=3,
+            max_frame_size=64,
+            sending_timeout=Timeout(0.5),
+            negotiate=True,
+        )
+
+        thread = Thread(target=hdlc_b.start)
+        thread.start()
+        hdlc_a.start()
+        thread.join()
+
+        self.assertTrue(write_a.dropped)
+        self.assertEqual(hdlc_a.get_capabilities(), Capabilities(3, 0, 64))
+        self.assertEqual(hdlc_b.get_capabilities(), Capabilities(3, 0, 64))
+        self.assertEqual(hdlc_a.get_window(), 3)
+        self.assertIsNone(hdlc_a.pending_acks)
+
+        hdlc_a.send(b"test_a")
+        hdlc_b.send(b"test_b")
+        self.assertEqual(hdlc_b.get_data(), b"test_a")
+        self.assertEqual(hdlc_a.get_data(), b"test_b")
+
+        hdlc_a.stop()
+        hdlc_b.stop()
+
+    def test_concurrent_start(self):
+        """
+        Tests that both ends stop sending their capabilities once two
+        controllers started at the same time have negotiated.
+        """
+
+        link = LinkSimulator(seed=1)
+        xids = []
+
+        def counting(write_func):
+            def write(data: bytes) -> int:
+                payload, _, _ = get_data(data)
+
+                if payload.startswith(b"\xffXID"):
+                    xids.append(data)
+
+                return write_func(data)
+
+            return write
+
+        hdlc_a = HDLController(link.a.read, counting(link.a.write), negotiate=True)
+        hdlc_b = HDLController(link.b.read, counting(link.b.write), negotiate=True)
+
+        thread = Thread(target=hdlc_b.start)
+        thread.start()
+        hdlc_a.start()
+        thread.join()
+
+        started = len(xids)
+        sleep(0.2)
+        # Only the capabilities already on their way can still be answered.
+        self.assertLessEqual(len(xids) - started, 2)
+
+        hdlc_a.stop()
+        hdlc_b.stop()
+
+    def test_tuner_window(self):
+        """
+        Tests that the largest window of a tuner is negotiated rather than
+        its initial window.
+        """
+
+        link = LinkSimulator(seed=1)
+        tuner = Tuner(max_window=7)
+        hdlc_a = HDLController(*link.a, window=2, tuner=tuner, negotiate=True)
+        hdlc_b = HDLController(*link.b, window=5, negotiate=True)
+
+        thread = Thread(target=hdlc_b.start)
+        thread.start()
+        hdlc_a.start()
+        thread.join()
+
+        self.assertEqual(hdlc_a.get_capabilities().window, 5)
+        self.assertEqual(hdlc_b.get_window(), 5)
+        self.assertEqual(hdlc_a.get_window(), 2)
+        self.assertEqual(tuner.max_window, 5)
+
+        hdlc_a.stop()
+        hdlc_b.stop()
+
+    def test_no_answer(self):
+        """
+        Tests that the negotiation fails when the other end does not answer.
+        """
+
+        hdlc_c = HDLController(
+            lambda: b"",
+            lambda data: len(data),
+            negotiate=True,
+            negotiation_timeout=Timeout(0.01),
+        )
+
+        with self.assertRaises(TimeoutError):
+            hdlc_c.start()
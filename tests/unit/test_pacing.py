@@ -0,0 +1,115 @@
+"""
+Unit tests for the transmit pacer.
+"""
+
+import unittest
+from time import sleep
+
+from hdlcontroller.clock import Clock
+from hdlcontroller.hdlcontroller import HDLController
+from hdlcontroller.pacing import Pacer
+
+
+class SteppingClock(Clock):
+    """
+    Clock whose time only moves forward when sleeping.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def time(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += seconds
+
+
+class TestPacer(unittest.TestCase):
+    """
+    Tests the token bucket of the pacer.
+    """
+
+    def test_bad_parameters(self):
+        """
+        Tests that exactly one rate has to be given.
+        """
+
+        with self.assertRaises(ValueError):
+            Pacer()
+
+        with self.assertRaises(ValueError):
+            Pacer(byte_rate=100, baudrate=9600)
+
+        with self.assertRaises(ValueError):
+            Pacer(byte_rate=0)
+
+    def test_rate_from_baudrate(self):
+        """
+        Tests that a byte takes 10 bits on the line by default.
+        """
+
+        self.assertEqual(Pacer(baudrate=9600).byte_rate, 960)
+        self.assertEqual(Pacer(baudrate=9600, bits_per_byte=11).byte_rate, 9600 / 11)
+
+    def test_burst_then_pacing(self):
+        """
+        Tests that a burst goes through at once and that the next writes are
+        spaced at the byte rate.
+        """
+
+        clock = SteppingClock()
+        pacer = Pacer(byte_rate=1000, burst=100, clock=clock)
+        written = []
+        write = pacer.wrap(lambda data: written.append((clock.time(), data)))
+
+        write(b"a" * 50)
+        write(b"b" * 50)
+        write(b"c" * 50)
+        write(b"d" * 50)
+
+        self.assertEqual([timestamp for timestamp, _ in written], [0.0, 0.0, 0.05, 0.1])
+        self.assertEqual(written[3][1], b"d" * 50)
+
+        stats = pacer.get_stats()
+        self.assertEqual(stats.writes, 4)
+        self.assertEqual(stats.bytes_written, 200)
+        self.assertEqual(stats.delayed_writes, 2)
+        self.assertAlmostEqual(stats.wait_time, 0.1)
+
+    def test_frame_larger_than_burst(self):
+        """
+        Tests that a frame larger than the bucket waits for a full bucket and
+        delays the next one.
+        """
+
+        clock = SteppingClock()
+        pacer = Pacer(byte_rate=1000, burst=10, clock=clock)
+
+        self.assertEqual(pacer.pace(100), 0.0)
+        self.assertAlmostEqual(pacer.pace(10), 0.1)
+
+    def test_controller_writes_are_paced(self):
+        """
+        Tests that the frames of a controller go through its pacer.
+        """
+
+        def read_func() -> bytes:
+            return b""
+
+        def write_func(data: bytes) -> None:
+            write_func.data = data
+
+        write_func.data = None
+        pacer = Pacer(byte_rate=1000000)
+        hdlc_c = HDLController(read_func, write_func, pacer=pacer)
+
+        hdlc_c.start()
+        hdlc_c.send(b"test")
+        while write_func.data is None:
+            sleep(0.01)
+        hdlc_c.stop()
+
+        stats = pacer.get_stats()
+        self.assertEqual(stats.writes, 1)
+        self.assertEqual(stats.bytes_written, len(write_func.data))
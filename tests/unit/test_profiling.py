@@ -0,0 +1,125 @@
+"""
+Unit tests for the profiling hooks.
+"""
+
+import json
+import unittest
+from io import StringIO
+
+from yahdlc import FRAME_ACK, FRAME_DATA, frame_data
+
+from hdlcontroller.hdlcontroller import HDLController
+from hdlcontroller.profiling import (
+    PHASE_DECODE,
+    PHASE_ENCODE,
+    PHASE_LOCK_WAIT,
+    PHASE_READ,
+    PHASE_RECEIVE_CALLBACK,
+    PHASE_SEND_CALLBACK,
+    PHASE_WRITE,
+    Histogram,
+    Profiler,
+)
+
+
+class TestHistogram(unittest.TestCase):
+    """
+    Tests the duration histogram.
+    """
+
+    def test_stats(self):
+        """
+        The summary of a histogram bounds the durations added.
+        """
+
+        histogram = Histogram()
+
+        for duration in range(1, 101):
+            histogram.add(duration)
+
+        stats = histogram.get_stats()
+
+        self.assertEqual(stats.count, 100)
+        self.assertEqual(stats.minimum, 1)
+        self.assertEqual(stats.maximum, 100)
+        self.assertEqual(stats.mean, 50.5)
+        self.assertGreaterEqual(stats.p50, 50)
+        self.assertLess(stats.p50, 100)
+        self.assertEqual(stats.p99, 100)
+
+    def test_empty(self):
+        """
+        An empty histogram has null statistics.
+        """
+
+        self.assertEqual(Histogram().get_stats().p99, 0)
+
+
+class TestProfiler(unittest.TestCase):
+    """
+    Tests the profiler.
+    """
+
+    def test_controller_phases(self):
+        """
+        The phases of the send and receive paths are measured.
+        """
+
+        def read_func() -> bytes:
+            if read_func.data is None:
+                read_func.data = frame_data("", FRAME_ACK, 1)
+                return frame_data("test", FRAME_DATA, 0)
+
+            return b""
+
+        def write_func(_: bytes) -> None:
+            pass
+
+        def callback(_: bytes) -> None:
+            pass
+
+        read_func.data = None
+
+        profiler = Profiler()
+        hdlc_c = HDLController(read_func, write_func, profiler=profiler)
+        hdlc_c.set_send_callback(callback)
+        hdlc_c.set_receive_callback(callback)
+
+        hdlc_c.start()
+        hdlc_c.send(b"test")
+        self.assertEqual(hdlc_c.get_data(), b"test")
+        hdlc_c.stop()
+
+        stats = profiler.get_stats()
+
+        for phase in (
+            PHASE_LOCK_WAIT,
+            PHASE_SEND_CALLBACK,
+            PHASE_ENCODE,
+            PHASE_WRITE,
+            PHASE_READ,
+            PHASE_DECODE,
+            PHASE_RECEIVE_CALLBACK,
+        ):
+            self.assertGreater(stats[phase].count, 0, phase)
+
+        # One data frame read, the empty reads are not recorded.
+        self.assertEqual(stats[PHASE_READ].count, 1)
+
+    def test_trace(self):
+        """
+        Trace events are written in the Chrome trace event format.
+        """
+
+        profiler = Profiler(trace=True)
+        profiler.record(PHASE_ENCODE, 1000, 3000)
+
+        file = StringIO()
+        profiler.write_trace(file)
+        events = json.loads(file.getvalue())["traceEvents"]
+
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0]["name"], PHASE_ENCODE)
+        self.assertEqual(events[0]["ph"], "X")
+        self.assertEqual(events[0]["ts"], 1.0)
+        self.assertEqual(events[0]["dur"], 2.0)
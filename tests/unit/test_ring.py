@@ -0,0 +1,179 @@
+"""
+Unit tests for the shared-memory frame ring.
+"""
+
+import unittest
+from multiprocessing import Process
+from multiprocessing import Queue as ProcessQueue
+from queue import Empty, Full
+
+from yahdlc import FRAME_ACK, FRAME_DATA, frame_data
+
+from hdlcontroller.hdlcontroller import HDLController
+from hdlcontroller.ring import FrameRing, SharedMemory
+
+
+def consume(ring: FrameRing, results: ProcessQueue) -> None:
+    """
+    Worker process forwarding the frames taken from the ring until an empty
+    frame is received.
+    """
+
+    while True:
+        data = ring.get(timeout=5.0)
+
+        if not data:
+            break
+
+        results.put(data)
+
+    ring.close()
+
+
+@unittest.skipIf(SharedMemory is None, "Shared memory requires Python 3.8")
+class TestFrameRing(unittest.TestCase):
+    """
+    Tests the frame ring.
+    """
+
+    def test_bad_parameters(self):
+        """
+        Tests that empty rings and slots are refused.
+        """
+
+        with self.assertRaises(ValueError):
+            FrameRing(slots=0)
+
+        with self.assertRaises(ValueError):
+            FrameRing(slot_size=0)
+
+    def test_full_ring(self):
+        """
+        Tests that frames are dropped when the ring is full, that frames
+        larger than a slot are dropped without raising, and that slots are
+        reused once consumed.
+        """
+
+        ring = FrameRing(slots=2, slot_size=8)
+
+        with self.assertRaises(Empty):
+            ring.get_nowait()
+
+        ring.put_nowait(b"test_1")
+        ring.put_nowait(b"test_2")
+
+        with self.assertRaises(Full):
+            ring.put_nowait(b"test_3")
+
+        self.assertEqual(ring.get_nowait(), b"test_1")
+
+        ring.put_nowait(b"too_large")
+
+        ring.put_nowait(b"test_3")
+        self.assertEqual(ring.get_nowait(), b"test_2")
+        self.assertEqual(ring.get(timeout=0.1), b"test_3")
+
+        with self.assertRaises(Empty):
+            ring.get(timeout=0.01)
+
+        self.assertEqual(ring.get_stats(), (3, 3, 1, 1))
+
+        ring.close()
+        ring.unlink()
+
+    def test_fan_out_to_worker_processes(self):
+        """
+        Tests that the frames received by a controller are taken once each
+        by several worker processes.
+        """
+
+        def read_func() -> bytes:
+            if read_func.i >= 100:
+                return b""
+
+            data = frame_data(
+                "test_{0}".format(read_func.i), FRAME_DATA, read_func.i % 8
+            )
+            read_func.i += 1
+            return data
+
+        def write_func(_: bytes) -> None:
+            pass
+
+        read_func.i = 0
+        ring = FrameRing(slots=128, slot_size=16)
+        results = ProcessQueue()
+        workers = [Process(target=consume, args=(ring, results)) for _ in range(2)]
+
+        for worker in workers:
+            worker.start()
+
+        hdlc_c = HDLController(read_func, write_func, frames_ring=ring)
+        hdlc_c.start()
+
+        received = sorted(results.get(timeout=5.0) for _ in range(100))
+        self.assertEqual(
+            received, sorted("test_{0}".format(i).encode() for i in range(100))
+        )
+
+        hdlc_c.stop()
+
+        for _ in workers:
+            ring.put_nowait(b"")
+
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(ring.get_stats().frames_consumed, 102)
+
+        ring.close()
+        ring.unlink()
+
+    def test_oversized_frame_acknowledged(self):
+        """
+        Tests that a frame larger than a slot is acknowledged, so that the
+        other end does not send it again.
+        """
+
+        def read_func() -> bytes:
+            if read_func.sent:
+                return b""
+
+            read_func.sent = True
+            return frame_data("too_large", FRAME_DATA, 0)
+
+        def write_func(data: bytes) -> None:
+            write_func.data = data
+
+        read_func.sent = False
+        write_func.data = None
+        ring = FrameRing(slots=2, slot_size=4)
+
+        hdlc_c = HDLController(read_func, write_func, frames_ring=ring)
+        hdlc_c.start()
+        while write_func.data is None:
+            pass
+        hdlc_c.stop()
+
+        self.assertEqual(write_func.data, frame_data("", FRAME_ACK, 1))
+        self.assertEqual(ring.get_stats(), (0, 0, 0, 1))
+
+        ring.close()
+        ring.unlink()
+
+    def test_frame_records_refused(self):
+        """
+        Tests that frame records cannot be published into a ring, nor frames
+        larger than its slots.
+        """
+
+        ring = FrameRing()
+
+        with self.assertRaises(ValueError):
+            HDLController(bytes, len, frames_ring=ring, frame_records=True)
+
+        with self.assertRaises(ValueError):
+            HDLController(bytes, len, frames_ring=ring, max_frame_size=512)
+
+        ring.close()
+        ring.unlink()
@@ -0,0 +1,124 @@
+"""
+Unit tests for the multi-link runtime.
+"""
+
+import unittest
+from collections import deque
+from typing import Tuple
+
+from hdlcontroller.hdlcontroller import HDLController, ReadFunction, WriteFunction
+from hdlcontroller.runtime import LinkRuntime, LinkSpec
+
+
+def open_loopback() -> Tuple[ReadFunction, WriteFunction]:
+    """
+    Opens a port whose writes are read back, so that the controller of the
+    link acknowledges its own frames.
+    """
+
+    frames = deque()
+
+    def read() -> bytes:
+        try:
+            return frames.popleft()
+        except IndexError:
+            return b""
+
+    def write(data: bytes) -> int:
+        frames.append(data)
+        return len(data)
+
+    return read, write
+
+
+def open_missing_port() -> Tuple[ReadFunction, WriteFunction]:
+    """
+    Fails to open a port.
+    """
+
+    raise FileNotFoundError("No such port")
+
+
+class TestLinkRuntime(unittest.TestCase):
+    """
+    Tests the multi-link runtime.
+    """
+
+    def test_bad_parameters(self):
+        """
+        Tests that runtimes without links or workers are refused.
+        """
+
+        with self.assertRaises(ValueError):
+            LinkRuntime({})
+
+        with self.assertRaises(ValueError):
+            LinkRuntime({"link": LinkSpec(open_loopback)}, processes=0)
+
+    def test_links_in_two_processes(self):
+        """
+        Tests that the frames sent to each link are received from it, and
+        that the statistics of each link are collected.
+        """
+
+        names = ["link_{0}".format(i) for i in range(3)]
+        runtime = LinkRuntime(
+            {name: LinkSpec(open_loopback, {"window": 7}) for name in names},
+            processes=2,
+        )
+
+        self.assertEqual(len(runtime.workers), 2)
+        runtime.start()
+
+        for i in range(5):
+            for name in names:
+                runtime.send(name, "{0}_{1}".format(name, i).encode())
+
+        received = {name: [] for name in names}
+
+        for _ in range(15):
+            name, data = runtime.get_data(timeout=5.0)
+            received[name].append(data)
+
+        for name in names:
+            self.assertEqual(
+                received[name],
+                ["{0}_{1}".format(name, i).encode() for i in range(5)],
+            )
+            self.assertEqual(runtime.get_stats(name).frames_received, 5)
+
+        runtime.stop()
+
+    def test_frame_too_large(self):
+        """
+        Tests that a frame too large for its link is counted, and that the
+        link keeps sending the next frames.
+        """
+
+        runtime = LinkRuntime({"link": LinkSpec(open_loopback)})
+        runtime.start()
+
+        runtime.send("link", b"x" * (HDLController.MAX_DATA_SIZE + 1))
+        runtime.send("link", b"test")
+
+        self.assertEqual(runtime.get_data(timeout=5.0), ("link", b"test"))
+        self.assertEqual(runtime.get_stats("link").frames_rejected, 1)
+
+        runtime.stop()
+
+    def test_port_not_opened(self):
+        """
+        Tests that an error raised while opening a port in a worker is
+        raised again by the parent.
+        """
+
+        runtime = LinkRuntime(
+            {
+                "link_0": LinkSpec(open_loopback),
+                "link_1": LinkSpec(open_missing_port),
+            },
+            processes=2,
+        )
+
+        with self.assertRaises(FileNotFoundError):
+            runtime.start()
@@ -0,0 +1,252 @@
+"""
+Unit tests for the link simulator.
+"""
+
+import unittest
+from time import sleep
+
+from hdlcontroller.clock import VirtualClock
+from hdlcontroller.hdlcontroller import HDLController, Timeout
+from hdlcontroller.simulator import Channel, LinkSimulator
+
+
+class VirtualTime:
+    """
+    Time source only moving forward when told to.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestChannel(unittest.TestCase):
+    """
+    Tests the simulated channel.
+    """
+
+    def test_perfect_channel(self):
+        """
+        Data written on a channel without impairments is readable at once.
+        """
+
+        channel = Channel(time_func=VirtualTime())
+
+        self.assertEqual(channel.write(b"test"), 4)
+        self.assertEqual(channel.read(), b"test")
+        self.assertEqual(channel.read(), b"")
+
+    def test_latency_and_bandwidth(self):
+        """
+        Data is only delivered after its serialisation and propagation delays.
+        """
+
+        clock = VirtualTime()
+        channel = Channel(bandwidth=100, latency=0.5, time_func=clock)
+
+        channel.write(b"0123456789")
+        channel.write(b"0123456789")
+
+        clock.now = 0.59
+        self.assertEqual(channel.read(), b"")
+        clock.now = 0.6
+        self.assertEqual(channel.read(), b"0123456789")
+        clock.now = 0.7
+        self.assertEqual(channel.read(), b"0123456789")
+
+    def test_fragmentation(self):
+        """
+        Fragmented data is delivered in several chunks but is left intact.
+        """
+
+        channel = Channel(max_chunk_size=3, seed=1, time_func=VirtualTime())
+
+        channel.write(b"0123456789")
+
+        self.assertGreaterEqual(channel.in_flight(), 4)
+        self.assertEqual(channel.read(), b"0123456789")
+
+    def test_bit_errors(self):
+        """
+        Bit errors are reported by the counters and change the data.
+        """
+
+        channel = Channel(bit_error_rate=0.01, seed=1, time_func=VirtualTime())
+        data = bytes(1000)
+
+        channel.write(data)
+        received = channel.read()
+        flipped = sum(bin(byte).count("1") for byte in received)
+
+        self.assertEqual(flipped, channel.get_stats().bits_flipped)
+        self.assertGreater(flipped, 40)
+        self.assertLess(flipped, 120)
+
+    def test_burst_losses(self):
+        """
+        Lost units are never delivered.
+        """
+
+        channel = Channel(
+            burst_loss_rate=0.1,
+            mean_burst_length=3,
+            seed=1,
+            time_func=VirtualTime(),
+        )
+
+        for _ in range(1000):
+            channel.write(b"x")
+
+        stats = channel.get_stats()
+
+        self.assertGreater(stats.writes_lost, 0)
+        self.assertEqual(len(channel.read()), 1000 - stats.writes_lost)
+
+    def test_reordering(self):
+        """
+        Reordered units are delivered after the ones following them.
+        """
+
+        clock = VirtualTime()
+        channel = Channel(reorder_rate=0.5, reorder_delay=1.0, seed=3, time_func=clock)
+
+        for i in range(10):
+            channel.write(bytes([i]))
+
+        clock.now = 2.0
+        received = channel.read()
+
+        self.assertEqual(sorted(received), list(range(10)))
+        self.assertNotEqual(list(received), list(range(10)))
+
+    def test_same_seed_same_profile(self):
+        """
+        Two channels with the same seed impair data the same way.
+        """
+
+        def run(seed: int) -> bytes:
+            channel = Channel(
+                bit_error_rate=0.001,
+                burst_loss_rate=0.05,
+                seed=seed,
+                time_func=VirtualTime(),
+            )
+
+            for i in range(100):
+                channel.write(bytes([i]) * 50)
+
+            return channel.read()
+
+        self.assertEqual(run(7), run(7))
+        self.assertNotEqual(run(7), run(8))
+
+
+class TestLinkSimulator(unittest.TestCase):
+    """
+    Tests the full-duplex simulated link.
+    """
+
+    def test_endpoints(self):
+        """
+        What is written on one end is read on the other one.
+        """
+
+        link = LinkSimulator(time_func=VirtualTime())
+
+        link.a.write(b"ping")
+        link.b.write(b"pong")
+
+        self.assertEqual(link.b.read(), b"ping")
+        self.assertEqual(link.a.read(), b"pong")
+
+    def test_controllers_over_fragmented_link(self):
+        """
+        Two HDLC controllers exchange frames over a fragmented link.
+        """
+
+        link = LinkSimulator(max_chunk_size=3, seed=1)
+        hdlc_a = HDLController(*link.a)
+        hdlc_b = HDLController(*link.b)
+
+        hdlc_a.start()
+        hdlc_b.start()
+
+        try:
+            hdlc_a.send(b"test_1")
+            hdlc_a.send(b"test_2")
+
+            self.assertEqual(hdlc_b.get_data(), b"test_1")
+            self.assertEqual(hdlc_b.get_data(), b"test_2")
+
+            while hdlc_a.get_senders_number() > 0:
+                sleep(0.01)
+        finally:
+            hdlc_a.stop()
+            hdlc_b.stop()
+
+    def test_retransmission_on_virtual_clock(self):
+        """
+        A lost frame is retransmitted after the sending timeout without
+        waiting for it in real time.
+        """
+
+        clock = VirtualClock()
+        link = LinkSimulator(latency=0.1, time_func=clock.time)
+        hdlc_a = HDLController(*link.a, sending_timeout=Timeout(5.0), clock=clock)
+        hdlc_b = HDLController(*link.b, clock=clock)
+
+        # Loses the first transmission only.
+        link.a_to_b.in_burst = True
+
+        hdlc_a.start()
+        hdlc_b.start()
+
+        try:
+            hdlc_a.send(b"test")
+
+            while hdlc_a.get_senders_number() > 0:
+                # Lets both receivers poll the link before each step.
+                self.assertTrue(clock.wait_for_waiters(2))
+                clock.advance(0.05)
+
+            self.assertEqual(hdlc_b.get_data(), b"test")
+            self.assertEqual(link.a_to_b.get_stats().writes, 2)
+            self.assertGreaterEqual(clock.time(), 5.2)
+        finally:
+            hdlc_a.stop()
+            hdlc_b.stop()
+
+    def test_request_response_with_piggybacked_acks(self):
+        """
+        Responses carry the acknowledgements of the requests.
+        """
+
+        link = LinkSimulator(latency=0.001, seed=1)
+        hdlc_a = HDLController(*link.a, piggyback_acks=True, ack_delay=Timeout(0.05))
+        hdlc_b = HDLController(*link.b, piggyback_acks=True, ack_delay=Timeout(0.05))
+
+        hdlc_a.start()
+        hdlc_b.start()
+
+        try:
+            for i in range(5):
+                hdlc_a.send(b"request")
+                self.assertEqual(hdlc_b.get_data(), b"request")
+                hdlc_b.send(b"response")
+                self.assertEqual(hdlc_a.get_data(), b"response")
+
+            while hdlc_a.get_senders_number() + hdlc_b.get_senders_number() > 0:
+                sleep(0.01)
+
+            stats_a = hdlc_a.get_stats()
+            stats_b = hdlc_b.get_stats()
+
+            # Every request is acknowledged by its response.
+            self.assertEqual(stats_b.acks_piggybacked, 5)
+            self.assertEqual(stats_a.frames_acked, 5)
+            self.assertEqual(stats_a.retransmissions + stats_b.retransmissions, 0)
+        finally:
+            hdlc_a.stop()
+            hdlc_b.stop()
@@ -0,0 +1,146 @@
+"""
+Unit tests for the automatic tuning of the window and the timeout.
+"""
+
+import unittest
+
+from hdlcontroller.clock import VirtualClock
+from hdlcontroller.hdlcontroller import HDLController, Timeout
+from hdlcontroller.simulator import LinkSimulator
+from hdlcontroller.tuning import Tuner
+
+
+class TestTuner(unittest.TestCase):
+    """
+    Tests the AIMD window and the adaptive timeout.
+    """
+
+    def test_bad_bounds(self):
+        """
+        Tests that inconsistent bounds are refused.
+        """
+
+        with self.assertRaises(ValueError):
+            Tuner(min_window=0)
+
+        with self.assertRaises(ValueError):
+            Tuner(max_window=8)
+
+        with self.assertRaises(ValueError):
+            Tuner(min_timeout=2.0, max_timeout=1.0)
+
+    def test_initial_values_within_bounds(self):
+        """
+        Tests that the initial values are brought within the bounds.
+        """
+
+        tuner = Tuner(min_window=2, max_window=5, min_timeout=0.5, max_timeout=4.0)
+
+        tuner.configure(7, 0.1)
+        self.assertEqual(tuner.window, 5)
+        self.assertEqual(tuner.timeout, 0.5)
+
+    def test_additive_increase(self):
+        """
+        Tests that the window grows by one frame per window acknowledged, up
+        to its upper bound.
+        """
+
+        tuner = Tuner(max_window=3)
+        tuner.configure(1, 2.0)
+
+        tuner.ack_received(0.1)
+        self.assertEqual(tuner.window, 2)
+        tuner.ack_received(0.1)
+        tuner.ack_received(0.1)
+        self.assertEqual(tuner.window, 2)
+        tuner.ack_received(0.1)
+        self.assertEqual(tuner.window, 3)
+
+        for _ in range(10):
+            tuner.ack_received(0.1)
+
+        self.assertEqual(tuner.window, 3)
+
+    def test_multiplicative_decrease(self):
+        """
+        Tests that the window is halved once for the losses of one round
+        trip.
+        """
+
+        tuner = Tuner()
+        tuner.configure(6, 2.0)
+        tuner.ack_received(0.1)
+
+        tuner.frame_lost(10.0, timed_out=False)
+        self.assertEqual(tuner.window, 3)
+        tuner.frame_lost(10.05, timed_out=False)
+        self.assertEqual(tuner.window, 3)
+        tuner.frame_lost(10.2, timed_out=False)
+        self.assertEqual(tuner.window, 1)
+
+        state = tuner.get_state()
+        self.assertEqual(state.losses, 3)
+        self.assertEqual(state.window_decreases, 2)
+
+    def test_adaptive_timeout(self):
+        """
+        Tests that the timeout follows the latency and backs off when it
+        expires.
+        """
+
+        tuner = Tuner(min_timeout=0.01, max_timeout=1.0)
+        tuner.configure(3, 1.0)
+
+        tuner.ack_received(0.1)
+        self.assertAlmostEqual(tuner.timeout, 0.3)
+
+        for _ in range(50):
+            tuner.ack_received(0.1)
+
+        self.assertAlmostEqual(tuner.get_state().smoothed_latency, 0.1)
+        self.assertLess(tuner.timeout, 0.11)
+
+        timeout = tuner.timeout
+        tuner.frame_lost(0.0, timed_out=True)
+        self.assertAlmostEqual(tuner.timeout, 2 * timeout)
+
+        # NACKs do not mean that the timeout is too short.
+        tuner.frame_lost(0.0, timed_out=False)
+        self.assertAlmostEqual(tuner.timeout, 2 * timeout)
+
+    def test_controller_window_grows(self):
+        """
+        Tests that the effective window of a controller grows as its frames
+        are acknowledged.
+        """
+
+        clock = VirtualClock()
+        link = LinkSimulator(latency=0.01, time_func=clock.time)
+        tuner = Tuner()
+        sender = HDLController(
+            *link.a, window=1, sending_timeout=Timeout(2.0), clock=clock, tuner=tuner
+        )
+        receiver = HDLController(*link.b, clock=clock)
+
+        self.assertEqual(sender.get_window(), 1)
+        self.assertEqual(sender.get_sending_timeout(), 2.0)
+
+        sender.start()
+        receiver.start()
+
+        for i in range(4):
+            sender.send("test_{0}".format(i).encode())
+
+            while sender.get_senders_number():
+                # Lets both receivers poll the link before each step.
+                self.assertTrue(clock.wait_for_waiters(2))
+                clock.advance(0.005)
+
+            self.assertEqual(receiver.get_data(), "test_{0}".format(i).encode())
+
+        sender.stop()
+        receiver.stop()
+
+        self.assertEqual(sender.get_window(), 3)
+        self.assertLess(sender.get_sending_timeout(), 2.0)